@@ -1,10 +1,48 @@
 import os
 import logging
 from dotenv import load_dotenv
-from flask import Flask, render_template, request, jsonify
-from supabase import create_client, Client
+from flask import Flask, render_template, request, jsonify, g, has_request_context, Response, stream_with_context
+from flask.json.provider import DefaultJSONProvider
+from werkzeug.http import http_date
+from supabase import create_client, Client, ClientOptions
+import httpx
 import json
-from datetime import datetime
+import csv
+import codecs
+import io
+import decimal
+import base64
+import hashlib
+import gzip
+import tempfile
+import zipfile
+import fcntl
+import re
+import unicodedata
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+import contextvars
+from concurrent.futures.process import BrokenProcessPool
+import bisect
+import threading
+import time
+from collections import Counter, OrderedDict, deque, namedtuple
+from operator import itemgetter
+import numpy as np
+try:
+    import brotli
+except ImportError:
+    brotli = None
+try:
+    import orjson
+except ImportError:
+    orjson = None
+try:
+    import openpyxl
+except ImportError:
+    openpyxl = None
+from datetime import datetime, date, timedelta, timezone
+from functools import wraps
 from calendar import monthrange 
 
 # =========================================================
@@ -20,17 +58,525 @@ SUPABASE_KEY: str = os.environ.get("SUPABASE_KEY")
 if not SUPABASE_URL or not SUPABASE_KEY:
     raise ValueError("As variáveis SUPABASE_URL e SUPABASE_KEY devem ser configuradas no arquivo .env")
 
-supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
+
+# =========================================================
+# CONTAGEM DE CHAMADAS AO SUPABASE (por requisição)
+# =========================================================
+
+def registrar_chamada_supabase(tabela):
+    """Contabiliza uma ida ao PostgREST na requisição Flask corrente."""
+    if has_request_context():
+        if 'chamadas_supabase' not in g:
+            g.chamadas_supabase = []
+        g.chamadas_supabase.append(tabela)
+
+def _tabela_da_url(caminho):
+    # /rest/v1/<tabela> ou /rest/v1/rpc/<funcao>
+    partes = caminho.split('/rest/v1/', 1)
+    return partes[1] if len(partes) == 2 else caminho
+
+def _hook_requisicao_supabase(http_request):
+    http_request.extensions['inicio_metricas'] = time.perf_counter()
+    registrar_chamada_supabase(_tabela_da_url(http_request.url.path))
+
+# =========================================================
+# MÉTRICAS (formato texto do Prometheus, agregadas entre workers)
+# =========================================================
+
+METRICAS_DIR = os.environ.get("METRICAS_DIR", os.path.join(tempfile.gettempdir(), "gestao_metricas"))
+# Cada worker grava seu retrato em METRICAS_DIR/<pid>.json no máximo a cada N segundos
+METRICAS_INTERVALO_SEGUNDOS = float(os.environ.get("METRICAS_INTERVALO_SEGUNDOS", "5"))
+
+BALDES_LATENCIA = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+BALDES_BYTES = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+BALDES_LINHAS = (0, 1, 10, 100, 1000, 10000, 100000)
+
+# nome -> (tipo, descrição, baldes dos histogramas)
+DESCRICAO_METRICAS = {
+    'gestao_http_requisicoes_total': ('counter', 'Requisições HTTP atendidas.', None),
+    'gestao_http_duracao_segundos': ('histogram', 'Tempo até a resposta (cabeçalhos) por rota.', BALDES_LATENCIA),
+    'gestao_http_resposta_bytes': ('histogram', 'Tamanho do corpo das respostas com Content-Length (exclui streaming).', BALDES_BYTES),
+    'gestao_supabase_chamadas_total': ('counter', 'Chamadas ao PostgREST por tabela ou função.', None),
+    'gestao_supabase_duracao_segundos': ('histogram', 'Latência das chamadas ao PostgREST (até os cabeçalhos).', BALDES_LATENCIA),
+    'gestao_supabase_linhas': ('histogram', 'Linhas devolvidas pelo PostgREST (Content-Range).', BALDES_LINHAS),
+    'gestao_supabase_conexoes': ('gauge', 'Conexões do pool HTTP do Supabase.', None),
+}
+
+def _escapar_rotulo(valor):
+    return str(valor).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _formatar_rotulos(rotulos, extra=()):
+    itens = list(rotulos) + list(extra)
+    if not itens:
+        return ''
+    return '{' + ','.join(f'{k}="{_escapar_rotulo(v)}"' for k, v in itens) + '}'
+
+def _formatar_numero(valor):
+    return repr(float(valor)) if isinstance(valor, float) and not valor.is_integer() else str(int(valor))
+
+class Metricas:
+    """Contadores, gauges e histogramas do processo.
+
+    As séries ficam num dicionário (nome, rótulos) -> valor; nos histogramas o
+    valor é [contagem por balde..., contagem acima do último, soma]. Como o
+    gunicorn tem vários workers e o /metrics cai em um só, cada worker grava
+    periodicamente um retrato em METRICAS_DIR e a exportação soma os retratos
+    dos processos vivos.
+    """
+
+    def __init__(self, diretorio, intervalo):
+        self._diretorio = diretorio
+        self._intervalo = intervalo
+        self._lock = threading.Lock()
+        self._series = {}
+        self._ultima_gravacao = 0.0
+        if hasattr(os, 'register_at_fork'):
+            os.register_at_fork(after_in_child=self._reiniciar_apos_fork)
+
+    def _reiniciar_apos_fork(self):
+        self._lock = threading.Lock()
+        self._series = {}
+        self._ultima_gravacao = 0.0
+
+    def contar(self, nome, rotulos, valor=1):
+        chave = (nome, tuple(sorted(rotulos.items())))
+        with self._lock:
+            self._series[chave] = self._series.get(chave, 0) + valor
+
+    def definir(self, nome, rotulos, valor):
+        with self._lock:
+            self._series[(nome, tuple(sorted(rotulos.items())))] = valor
+
+    def observar(self, nome, rotulos, valor):
+        baldes = DESCRICAO_METRICAS[nome][2]
+        chave = (nome, tuple(sorted(rotulos.items())))
+        posicao = bisect.bisect_left(baldes, valor)
+        with self._lock:
+            serie = self._series.get(chave)
+            if serie is None:
+                serie = self._series[chave] = [0] * (len(baldes) + 2)
+            serie[posicao] += 1
+            serie[-1] += valor
+
+    def _retrato(self):
+        with self._lock:
+            return [[nome, [list(r) for r in rotulos], list(v) if isinstance(v, list) else v]
+                    for (nome, rotulos), v in self._series.items()]
+
+    def gravar(self, forcar=False):
+        """Grava o retrato deste processo (atômico), respeitando o intervalo mínimo."""
+        agora = time.monotonic()
+        if not forcar and agora - self._ultima_gravacao < self._intervalo:
+            return
+        self._ultima_gravacao = agora
+        try:
+            os.makedirs(self._diretorio, exist_ok=True)
+            destino = os.path.join(self._diretorio, f"{os.getpid()}.json")
+            temporario = f"{destino}.{threading.get_ident()}.tmp"
+            with open(temporario, 'w') as f:
+                json.dump(self._retrato(), f)
+            os.replace(temporario, destino)
+        except OSError as e:
+            logging.warning(f"[METRICAS] Falha ao gravar retrato: {e}")
+
+    def _retratos_dos_outros(self):
+        if not os.path.isdir(self._diretorio):
+            return []
+        retratos = []
+        for nome_arquivo in os.listdir(self._diretorio):
+            pid_str, _, extensao = nome_arquivo.partition('.')
+            if extensao != 'json' or not pid_str.isdigit() or int(pid_str) == os.getpid():
+                continue
+            caminho = os.path.join(self._diretorio, nome_arquivo)
+            try:
+                os.kill(int(pid_str), 0)
+            except ProcessLookupError:
+                # Worker que já morreu: o retrato sai da soma
+                try:
+                    os.remove(caminho)
+                except OSError:
+                    pass
+                continue
+            except PermissionError:
+                pass
+            try:
+                with open(caminho) as f:
+                    retratos.append(json.load(f))
+            except (OSError, ValueError):
+                continue
+        return retratos
+
+    def exportar(self):
+        """Texto no formato de exposição do Prometheus (0.0.4), somando todos os workers."""
+        somadas = {}
+        for retrato in [self._retrato()] + self._retratos_dos_outros():
+            for nome, rotulos, valor in retrato:
+                chave = (nome, tuple(tuple(r) for r in rotulos))
+                atual = somadas.get(chave)
+                if atual is None:
+                    somadas[chave] = list(valor) if isinstance(valor, list) else valor
+                elif isinstance(valor, list):
+                    somadas[chave] = [a + b for a, b in zip(atual, valor)]
+                else:
+                    somadas[chave] = atual + valor
+
+        linhas = []
+        for nome, (tipo, descricao, baldes) in DESCRICAO_METRICAS.items():
+            series = sorted((r, v) for (n, r), v in somadas.items() if n == nome)
+            if not series:
+                continue
+            linhas.append(f"# HELP {nome} {descricao}")
+            linhas.append(f"# TYPE {nome} {tipo}")
+            for rotulos, valor in series:
+                if tipo != 'histogram':
+                    linhas.append(f"{nome}{_formatar_rotulos(rotulos)} {_formatar_numero(valor)}")
+                    continue
+                acumulado = 0
+                for limite, quantidade in zip(list(baldes) + ['+Inf'], valor[:-1]):
+                    acumulado += quantidade
+                    le = limite if limite == '+Inf' else _formatar_numero(limite)
+                    linhas.append(f"{nome}_bucket{_formatar_rotulos(rotulos, [('le', le)])} {acumulado}")
+                linhas.append(f"{nome}_sum{_formatar_rotulos(rotulos)} {_formatar_numero(valor[-1])}")
+                linhas.append(f"{nome}_count{_formatar_rotulos(rotulos)} {acumulado}")
+        return '\n'.join(linhas) + '\n'
+
+metricas = Metricas(METRICAS_DIR, METRICAS_INTERVALO_SEGUNDOS)
+
+def _linhas_content_range(valor):
+    # "0-24/3573", "0-24/*" ou "*/0" (nenhuma linha)
+    if not valor:
+        return None
+    intervalo = valor.split('/', 1)[0]
+    if intervalo == '*':
+        return 0
+    inicio, _, fim = intervalo.partition('-')
+    try:
+        return int(fim) - int(inicio) + 1
+    except ValueError:
+        return None
+
+def registrar_resposta_supabase(http_response):
+    """Contabiliza uma resposta do PostgREST (tabela, status, latência e linhas)."""
+    http_request = http_response.request
+    tabela = _tabela_da_url(http_request.url.path)
+    metricas.contar('gestao_supabase_chamadas_total', {
+        'tabela': tabela, 'metodo': http_request.method, 'status': str(http_response.status_code)})
+    inicio = http_request.extensions.get('inicio_metricas')
+    if inicio is not None:
+        metricas.observar('gestao_supabase_duracao_segundos', {'tabela': tabela}, time.perf_counter() - inicio)
+    linhas = _linhas_content_range(http_response.headers.get('content-range'))
+    if linhas is not None:
+        metricas.observar('gestao_supabase_linhas', {'tabela': tabela}, linhas)
+
+# =========================================================
+# CLIENTE SUPABASE (um pool de conexões por processo)
+# =========================================================
+
+SUPABASE_MAX_CONEXOES = int(os.environ.get("SUPABASE_MAX_CONEXOES", "20"))
+SUPABASE_CONEXOES_OCIOSAS = int(os.environ.get("SUPABASE_CONEXOES_OCIOSAS", "10"))
+# O padrão do httpx (5s) descarta a conexão ociosa e a próxima requisição paga um novo handshake TLS
+SUPABASE_KEEPALIVE_SEGUNDOS = float(os.environ.get("SUPABASE_KEEPALIVE_SEGUNDOS", "120"))
+SUPABASE_TIMEOUT_SEGUNDOS = float(os.environ.get("SUPABASE_TIMEOUT_SEGUNDOS", "120"))
+SUPABASE_TIMEOUT_CONEXAO_SEGUNDOS = float(os.environ.get("SUPABASE_TIMEOUT_CONEXAO_SEGUNDOS", "10"))
+# Intervalo do "ping" que mantém a conexão aquecida quando o worker fica sem tráfego (0 desativa)
+SUPABASE_AQUECIMENTO_SEGUNDOS = float(os.environ.get("SUPABASE_AQUECIMENTO_SEGUNDOS", "60"))
+
+def limites_pool_supabase(max_conexoes=None):
+    max_conexoes = max_conexoes or SUPABASE_MAX_CONEXOES
+    return httpx.Limits(
+        max_connections=max_conexoes,
+        max_keepalive_connections=min(SUPABASE_CONEXOES_OCIOSAS, max_conexoes),
+        keepalive_expiry=SUPABASE_KEEPALIVE_SEGUNDOS,
+    )
+
+def timeout_supabase():
+    return httpx.Timeout(SUPABASE_TIMEOUT_SEGUNDOS, connect=SUPABASE_TIMEOUT_CONEXAO_SEGUNDOS)
+
+class ClienteSupabasePorProcesso:
+    """Client do Supabase criado sob demanda em cada processo, com pool HTTP configurado.
+
+    O gunicorn importa o app no master e faz fork dos workers: um cliente criado
+    na importação teria o pool (e os sockets TLS) compartilhado entre processos.
+    Aqui o cliente só é criado no primeiro uso dentro do worker; após um fork o
+    filho descarta a referência herdada (sem fechá-la, os sockets são do pai) e
+    cria o seu. Os demais atributos são repassados ao Client, então
+    `supabase.table(...)` continua funcionando como antes.
+    """
+
+    def __init__(self, url, chave):
+        self._url = url
+        self._chave = chave
+        self._lock = threading.Lock()
+        self._cliente = None
+        self._http = None
+        self._pid = None
+        self._criado_em = None
+        self._ultimo_uso = 0.0
+        self._contadores = Counter()
+        if hasattr(os, 'register_at_fork'):
+            os.register_at_fork(after_in_child=self._descartar_apos_fork)
+
+    def _descartar_apos_fork(self):
+        self._lock = threading.Lock()
+        self._cliente = None
+        self._http = None
+        self._contadores = Counter()
+
+    def _criar(self):
+        self._http = httpx.Client(
+            http2=True,
+            follow_redirects=True,
+            timeout=timeout_supabase(),
+            limits=limites_pool_supabase(),
+            event_hooks={'request': [self._hook_requisicao], 'response': [registrar_resposta_supabase]},
+        )
+        self._pid = os.getpid()
+        self._criado_em = datetime.now()
+        self._cliente = create_client(self._url, self._chave, options=ClientOptions(httpx_client=self._http))
+        if SUPABASE_AQUECIMENTO_SEGUNDOS > 0:
+            threading.Thread(target=self._laco_aquecimento, name='aquecimento-supabase', daemon=True).start()
+        logging.info(f"[SUPABASE] Pool criado no processo {self._pid} (até {SUPABASE_MAX_CONEXOES} conexões)")
+
+    def cliente(self):
+        if self._cliente is None:
+            with self._lock:
+                if self._cliente is None:
+                    self._criar()
+        return self._cliente
+
+    def __getattr__(self, nome):
+        return getattr(self.cliente(), nome)
+
+    def _hook_requisicao(self, http_request):
+        _hook_requisicao_supabase(http_request)
+        self._ultimo_uso = time.monotonic()
+        self._contadores['requisicoes'] += 1
+        # Eventos do httpcore: contam as conexões realmente novas (TCP + TLS)
+        http_request.extensions['trace'] = self._rastrear
+
+    def _rastrear(self, evento, info):
+        if evento == 'connection.connect_tcp.complete':
+            self._contadores['conexoes_abertas'] += 1
+        elif evento == 'connection.start_tls.complete':
+            self._contadores['handshakes_tls'] += 1
+
+    def aquecer(self):
+        """Abre (ou renova) uma conexão do pool com uma consulta mínima."""
+        try:
+            self.cliente().table('d_salas').select('id').limit(1).execute()
+            self._contadores['aquecimentos'] += 1
+        except Exception as e:
+            logging.warning(f"[SUPABASE] Falha ao aquecer conexão: {e}")
+
+    def _laco_aquecimento(self):
+        cliente = self._cliente
+        while self._cliente is cliente:
+            time.sleep(SUPABASE_AQUECIMENTO_SEGUNDOS)
+            if time.monotonic() - self._ultimo_uso >= SUPABASE_AQUECIMENTO_SEGUNDOS:
+                self.aquecer()
+
+    def estatisticas(self):
+        """Situação do pool deste processo (para diagnóstico e métricas)."""
+        conexoes = []
+        if self._http is not None:
+            pool = getattr(self._http._transport, '_pool', None)
+            conexoes = list(getattr(pool, 'connections', []))
+        ociosas = sum(1 for c in conexoes if c.is_idle())
+        return {
+            "pid": os.getpid(),
+            "criado_em": self._criado_em.isoformat() if self._criado_em and self._pid == os.getpid() else None,
+            "conexoes": len(conexoes),
+            "conexoes_ociosas": ociosas,
+            "conexoes_em_uso": len(conexoes) - ociosas,
+            "max_conexoes": SUPABASE_MAX_CONEXOES,
+            "keepalive_segundos": SUPABASE_KEEPALIVE_SEGUNDOS,
+            "requisicoes": self._contadores['requisicoes'],
+            "conexoes_abertas": self._contadores['conexoes_abertas'],
+            "handshakes_tls": self._contadores['handshakes_tls'],
+            "aquecimentos": self._contadores['aquecimentos'],
+        }
+
+supabase: Client = ClienteSupabasePorProcesso(SUPABASE_URL, SUPABASE_KEY)
+
+def coletar_metricas_pool():
+    estatisticas = getattr(supabase, 'estatisticas', None)
+    if estatisticas is None or getattr(supabase, '_cliente', None) is None:
+        return
+    dados = estatisticas()
+    metricas.definir('gestao_supabase_conexoes', {'estado': 'ociosa'}, dados['conexoes_ociosas'])
+    metricas.definir('gestao_supabase_conexoes', {'estado': 'em_uso'}, dados['conexoes_em_uso'])
 
 app = Flask(__name__, template_folder='templates')
 
 
 # =========================================================
-# LOG DE REQUISIÇÕES (para debug)
+# SERIALIZAÇÃO JSON (orjson, quando disponível)
+# =========================================================
+
+def _json_padrao(o):
+    # Tipos que o orjson não serializa sozinho (ou serializaria diferente do provider do Flask)
+    if isinstance(o, date):  # datetime/date em data HTTP (RFC 822), como o Flask; o orjson usaria ISO 8601
+        return http_date(o)
+    if isinstance(o, decimal.Decimal):
+        return str(o)
+    if isinstance(o, (set, frozenset)):
+        return list(o)
+    if hasattr(o, 'item'):  # escalares NumPy fora de arrays
+        return o.item()
+    if hasattr(o, '__html__'):
+        return str(o.__html__())
+    raise TypeError(f"Objeto do tipo {type(o).__name__} não é serializável em JSON")
+
+class ProvedorJsonRapido(DefaultJSONProvider):
+    """Provider JSON do Flask sobre o orjson (chaves ordenadas, datas como no Flask).
+
+    Mantém a interface do DefaultJSONProvider, então jsonify e request.json
+    continuam iguais; se o orjson recusar algum valor (ex.: inteiro maior que
+    64 bits), cai no serializador padrão.
+    """
+
+    OPCOES = (orjson.OPT_SORT_KEYS | orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+              | orjson.OPT_PASSTHROUGH_DATETIME) if orjson else 0
+
+    def dumps_bytes(self, obj):
+        try:
+            return orjson.dumps(obj, default=_json_padrao, option=self.OPCOES)
+        except (orjson.JSONEncodeError, TypeError):
+            return super().dumps(obj).encode()
+
+    def dumps(self, obj, **kwargs):
+        if kwargs:
+            return super().dumps(obj, **kwargs)
+        return self.dumps_bytes(obj).decode()
+
+    def loads(self, s, **kwargs):
+        if kwargs:
+            return super().loads(s, **kwargs)
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        if self._app.debug:
+            return super().response(obj)
+        # Bytes direto para o corpo, sem passar por str
+        return self._app.response_class(self.dumps_bytes(obj) + b"\n", mimetype=self.mimetype)
+
+# orjson é opcional: sem ele o app usa o provider padrão do Flask
+if orjson is not None:
+    app.json = ProvedorJsonRapido(app)
+
+
+# =========================================================
+# LOG E MÉTRICAS DE REQUISIÇÕES
 # =========================================================
 @app.before_request
 def log_request():
-    print(f"[LOG] Rota acessada: {request.path}")
+    g.inicio_requisicao = time.perf_counter()
+    logging.debug(f"[LOG] Rota acessada: {request.path}")
+
+@app.after_request
+def registrar_metricas_requisicao(response):
+    inicio = g.get('inicio_requisicao')
+    if inicio is None:
+        return response
+    # Rota pelo padrão (/api/ocorrencias/<ocorrencia_id>), não pela URL, para não explodir as séries
+    rota = request.url_rule.rule if request.url_rule else 'desconhecida'
+    metricas.contar('gestao_http_requisicoes_total', {'rota': rota, 'metodo': request.method, 'status': str(response.status_code)})
+    metricas.observar('gestao_http_duracao_segundos', {'rota': rota, 'metodo': request.method}, time.perf_counter() - inicio)
+    # Só quando o tamanho já é conhecido: ler um gerador aqui anularia o streaming
+    if response.content_length is not None:
+        metricas.observar('gestao_http_resposta_bytes', {'rota': rota}, response.content_length)
+    coletar_metricas_pool()
+    metricas.gravar()
+    return response
+
+@app.route('/metrics')
+def exportar_metricas():
+    coletar_metricas_pool()
+    metricas.gravar(forcar=True)
+    return Response(metricas.exportar(), mimetype='text/plain; version=0.0.4')
+
+@app.after_request
+def informar_chamadas_supabase(response):
+    # Permite verificar que cada rota faz um número fixo de chamadas (O(1)), independente do nº de linhas
+    response.headers['X-Supabase-Chamadas'] = str(len(g.get('chamadas_supabase', [])))
+    return response
+
+
+# =========================================================
+# COMPRESSÃO DE RESPOSTAS (gzip / brotli)
+# =========================================================
+
+COMPRESSAO_MINIMO_BYTES = int(os.environ.get("COMPRESSAO_MINIMO_BYTES", "1024"))
+COMPRESSAO_NIVEL_GZIP = int(os.environ.get("COMPRESSAO_NIVEL_GZIP", "6"))
+COMPRESSAO_QUALIDADE_BROTLI = int(os.environ.get("COMPRESSAO_QUALIDADE_BROTLI", "5"))
+# Limite da memória usada pelos corpos já comprimidos (por worker)
+COMPRESSAO_CACHE_BYTES = int(os.environ.get("COMPRESSAO_CACHE_BYTES", str(32 * 1024 * 1024)))
+TIPOS_COMPRIMIVEIS = ('application/json', 'text/html', 'text/plain', 'text/csv', 'application/x-ndjson')
+
+# brotli é opcional: sem o pacote, só gzip é oferecido
+CODIFICACOES = ('br', 'gzip') if brotli is not None else ('gzip',)
+
+class CacheCompressao:
+    """LRU de corpos comprimidos, indexado pelo hash do corpo original e pela codificação.
+
+    Respostas que se repetem (relatório estatístico em memória, listas
+    versionadas, páginas) são comprimidas uma única vez; o hash custa bem menos
+    que a compressão.
+    """
+
+    def __init__(self, limite_bytes):
+        self.limite_bytes = limite_bytes
+        self._lock = threading.Lock()
+        self._itens = OrderedDict()
+        self._bytes = 0
+
+    def comprimir(self, dados, codificacao):
+        chave = (hashlib.sha1(dados).digest(), codificacao)
+        with self._lock:
+            comprimido = self._itens.get(chave)
+            if comprimido is not None:
+                self._itens.move_to_end(chave)
+                return comprimido
+        if codificacao == 'br':
+            comprimido = brotli.compress(dados, quality=COMPRESSAO_QUALIDADE_BROTLI)
+        else:
+            comprimido = gzip.compress(dados, compresslevel=COMPRESSAO_NIVEL_GZIP, mtime=0)
+        if len(comprimido) <= self.limite_bytes:
+            with self._lock:
+                if chave not in self._itens:
+                    self._itens[chave] = comprimido
+                    self._bytes += len(comprimido)
+                while self._bytes > self.limite_bytes:
+                    _, antigo = self._itens.popitem(last=False)
+                    self._bytes -= len(antigo)
+        return comprimido
+
+cache_compressao = CacheCompressao(COMPRESSAO_CACHE_BYTES)
+
+def comprimir_corpo(dados, accept_encoding):
+    """Retorna (corpo, codificação) conforme o Accept-Encoding; codificação None = sem compressão."""
+    if len(dados) < COMPRESSAO_MINIMO_BYTES:
+        return dados, None
+    codificacao = accept_encoding.best_match(CODIFICACOES)
+    if codificacao is None:
+        return dados, None
+    return cache_compressao.comprimir(dados, codificacao), codificacao
+
+@app.after_request
+def comprimir_resposta(response):
+    if response.mimetype not in TIPOS_COMPRIMIVEIS:
+        return response
+    response.vary.add('Accept-Encoding')
+    # Streaming e arquivos seguem como estão: comprimir exigiria ler tudo antes de enviar
+    if (response.status_code != 200 or response.is_streamed or response.direct_passthrough
+            or 'Content-Encoding' in response.headers):
+        return response
+    corpo, codificacao = comprimir_corpo(response.get_data(), request.accept_encodings)
+    if codificacao:
+        response.set_data(corpo)
+        response.headers['Content-Encoding'] = codificacao
+    return response
 
 # =========================================================
 # FUNÇÕES AUXILIARES
@@ -45,6 +591,50 @@ def handle_supabase_response(response):
         return response.get("data") or []
     return []
 
+def buscar_todas(consulta, tamanho_pagina=1000):
+    """Lê todas as linhas de uma consulta, em páginas de `range` (o PostgREST corta em 1000).
+
+    `consulta` é uma função que devolve a query já filtrada e com ordem estável.
+    """
+    linhas = []
+    inicio = 0
+    while True:
+        pagina = handle_supabase_response(consulta().range(inicio, inicio + tamanho_pagina - 1).execute())
+        linhas.extend(pagina)
+        if len(pagina) < tamanho_pagina:
+            return linhas
+        inicio += tamanho_pagina
+
+# Funções do banco (supabase/migrations) ainda não criadas no projeto: nome -> próxima tentativa (monotonic)
+RPC_NOVA_TENTATIVA_SEGUNDOS = int(os.environ.get("RPC_NOVA_TENTATIVA_SEGUNDOS", "600"))
+_rpc_ausentes = {}
+
+def chamar_rpc_opcional(funcao, parametros, migracao, alternativa):
+    """Chama uma função criada por uma migração; retorna None se ela não existe no banco.
+
+    Sem a função (PGRST202), o chamador segue pelo caminho antigo (`alternativa`,
+    descrito no aviso do log) e ela volta a ser tentada a cada
+    RPC_NOVA_TENTATIVA_SEGUNDOS: aplicar a migração passa a valer sem reiniciar
+    os workers.
+    """
+    if time.monotonic() < _rpc_ausentes.get(funcao, 0):
+        return None
+    try:
+        resposta = supabase.rpc(funcao, parametros).execute()
+    except Exception as e:
+        if getattr(e, 'code', None) != 'PGRST202':  # função inexistente no schema
+            raise
+        logging.warning(f"Função {funcao} não encontrada no banco; usando {alternativa} e tentando de novo em "
+                        f"{RPC_NOVA_TENTATIVA_SEGUNDOS}s. Aplique supabase/migrations/{migracao}")
+        _rpc_ausentes[funcao] = time.monotonic() + RPC_NOVA_TENTATIVA_SEGUNDOS
+        return None
+    _rpc_ausentes.pop(funcao, None)
+    return resposta
+
+def rpc_ausente(funcao):
+    """Se a última chamada a `funcao` encontrou o banco sem ela."""
+    return funcao in _rpc_ausentes
+
 def formatar_data_hora(data_str):
     if not data_str:
         return 'N/A'
@@ -83,6 +673,1367 @@ def calcular_dias_resposta(dt_abertura, dt_fechamento_str):
 DEFAULT_AUTOTEXT = "ATENDIMENTO NÃO SOLICITADO PELO RESPONSÁVEL DA OCORRÊNCIA"
 
 
+# =========================================================
+# CACHE DE DIMENSÕES (d_salas, d_funcionarios, d_disciplinas)
+# =========================================================
+
+DIMENSOES_TTL_SEGUNDOS = int(os.environ.get("DIMENSOES_TTL_SEGUNDOS", "300"))
+
+class CacheDimensoes:
+    """Mantém em memória as tabelas de dimensão pequenas, carregadas em lote.
+
+    Cada tabela é baixada com uma única consulta e expira após o TTL. As rotas de
+    escrita chamam `invalidar` para que a próxima leitura recarregue os dados.
+    """
+
+    COLUNAS = {
+        'd_salas': 'id, sala, nivel_ensino',
+        'd_funcionarios': 'id, nome, funcao, is_tutor, email',
+        'd_disciplinas': 'id, nome',
+    }
+
+    def __init__(self, ttl):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._tabelas = {}  # tabela -> (expira_em, {id_str: linha})
+
+    def linhas(self, tabela):
+        """Retorna {id (str): linha} da tabela, recarregando se expirada."""
+        entrada = self._tabelas.get(tabela)
+        if entrada and entrada[0] > time.monotonic():
+            return entrada[1]
+        with self._lock:
+            entrada = self._tabelas.get(tabela)
+            if entrada and entrada[0] > time.monotonic():
+                return entrada[1]
+            resp = supabase.table(tabela).select(self.COLUNAS[tabela]).execute()
+            linhas = {str(r['id']): r for r in handle_supabase_response(resp)}
+            self._tabelas[tabela] = (time.monotonic() + self.ttl, linhas)
+            logging.info(f"[CACHE] {tabela} carregada ({len(linhas)} registros)")
+            return linhas
+
+    def campo(self, tabela, registro_id, campo='nome', padrao=None):
+        """Busca um campo de um registro pelo id, sem ida ao Supabase se o cache estiver válido."""
+        if registro_id is None or registro_id == '':
+            return padrao
+        linha = self.linhas(tabela).get(str(registro_id))
+        if not linha:
+            return padrao
+        return linha.get(campo, padrao)
+
+    def tutores(self):
+        """Retorna {id (str): nome} dos funcionários marcados como tutor."""
+        return {
+            f_id: f['nome']
+            for f_id, f in self.linhas('d_funcionarios').items()
+            if _to_bool(f.get('is_tutor'))
+        }
+
+    def invalidar(self, *tabelas):
+        with self._lock:
+            for tabela in tabelas:
+                self._tabelas.pop(tabela, None)
+
+cache_dimensoes = CacheDimensoes(DIMENSOES_TTL_SEGUNDOS)
+
+def _invalidar_cache(*tabelas):
+    """Ponto único de invalidação chamado pelas rotas de escrita com as tabelas alteradas.
+
+    Tabelas que não estão em cache são simplesmente ignoradas. A versão de cada
+    tabela também avança, o que muda o ETag das rotas de referência.
+    """
+    cache_dimensoes.invalidar(*tabelas)
+    versoes_tabelas.avancar(*tabelas)
+
+
+# =========================================================
+# VERSÕES DOS DADOS DE REFERÊNCIA (ETag / GET condicional)
+# =========================================================
+
+VERSOES_DIR = os.environ.get("VERSOES_DIR", os.path.join(tempfile.gettempdir(), "gestao_versoes"))
+# Alterações feitas fora do app (painel do Supabase) aparecem em no máximo esse tempo
+VERSOES_VALIDADE_SEGUNDOS = int(os.environ.get("VERSOES_VALIDADE_SEGUNDOS", str(DIMENSOES_TTL_SEGUNDOS)))
+
+class VersoesTabelas:
+    """Versão de cada tabela, compartilhada entre os workers por arquivos em VERSOES_DIR.
+
+    Cada arquivo guarda um token aleatório, trocado (os.replace) a cada escrita
+    pelo app; assim o ETag gerado num worker vale nos outros. O token é relido
+    só quando o arquivo muda (inode/mtime).
+    """
+
+    def __init__(self, diretorio, validade):
+        self.diretorio = diretorio
+        self.validade = validade
+        self._lidos = {}  # tabela -> ((inode, mtime_ns), token, mtime)
+
+    def _caminho(self, tabela):
+        return os.path.join(self.diretorio, f"{tabela}.versao")
+
+    def _gravar(self, tabela):
+        os.makedirs(self.diretorio, exist_ok=True)
+        destino = self._caminho(tabela)
+        temporario = f"{destino}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(temporario, 'w') as f:
+            f.write(os.urandom(8).hex())
+        os.replace(temporario, destino)
+
+    def versao(self, tabela):
+        """Retorna (token, mtime) da versão atual da tabela."""
+        caminho = self._caminho(tabela)
+        try:
+            info = os.stat(caminho)
+        except FileNotFoundError:
+            self._gravar(tabela)
+            info = os.stat(caminho)
+        assinatura = (info.st_ino, info.st_mtime_ns)
+        lido = self._lidos.get(tabela)
+        if lido and lido[0] == assinatura:
+            return lido[1], lido[2]
+        with open(caminho) as f:
+            token = f.read().strip()
+        self._lidos[tabela] = (assinatura, token, info.st_mtime)
+        return token, info.st_mtime
+
+    def avancar(self, *tabelas):
+        for tabela in tabelas:
+            try:
+                self._gravar(tabela)
+            except OSError as e:
+                logging.warning(f"[VERSÕES] Falha ao avançar versão de {tabela}: {e}")
+
+    def etag_e_modificacao(self, tabelas, variante=''):
+        """ETag da combinação das tabelas (+ variante da URL) e a data da última mudança."""
+        # A janela de validade entra no ETag: sem ela, alterações externas nunca o mudariam
+        janela = int(time.time() // self.validade) if self.validade > 0 else 0
+        versoes = [self.versao(t) for t in tabelas]
+        bruto = '|'.join([variante, str(janela)] + [token for token, _ in versoes])
+        modificado = max([janela * self.validade] + [mtime for _, mtime in versoes])
+        return hashlib.sha1(bruto.encode()).hexdigest()[:20], datetime.fromtimestamp(int(modificado), tz=timezone.utc)
+
+versoes_tabelas = VersoesTabelas(VERSOES_DIR, VERSOES_VALIDADE_SEGUNDOS)
+
+# Corpos já serializados das rotas versionadas, por ETag (por worker)
+VERSIONADAS_CACHE_ITENS = int(os.environ.get("VERSIONADAS_CACHE_ITENS", "256"))
+_corpos_versionados = OrderedDict()  # etag -> (bytes, mimetype)
+_corpos_versionados_lock = threading.Lock()
+
+def _corpo_versionado(etag):
+    with _corpos_versionados_lock:
+        corpo = _corpos_versionados.get(etag)
+        if corpo is not None:
+            _corpos_versionados.move_to_end(etag)
+        return corpo
+
+def _guardar_corpo_versionado(etag, resposta):
+    with _corpos_versionados_lock:
+        _corpos_versionados[etag] = (resposta.get_data(), resposta.mimetype)
+        while len(_corpos_versionados) > VERSIONADAS_CACHE_ITENS:
+            _corpos_versionados.popitem(last=False)
+
+def versionado(*tabelas):
+    """Decorador de rota GET de referência: ETag/Last-Modified pela versão das tabelas.
+
+    Se o navegador já tem a versão atual (If-None-Match / If-Modified-Since), a
+    rota nem é executada — responde 304 sem consultar o Supabase. Para os demais,
+    o corpo já serializado da mesma versão é reaproveitado enquanto ela valer.
+    """
+    def decorador(funcao):
+        @wraps(funcao)
+        def rota(*args, **kwargs):
+            try:
+                etag, modificado = versoes_tabelas.etag_e_modificacao(tabelas, request.full_path)
+            except OSError as e:
+                logging.warning(f"[VERSÕES] Sem ETag para {request.path}: {e}")
+                return funcao(*args, **kwargs)
+            if request.if_none_match:
+                atual = request.if_none_match.contains_weak(etag)
+            else:
+                atual = request.if_modified_since is not None and request.if_modified_since >= modificado
+            guardado = None if atual else _corpo_versionado(etag)
+            if atual:
+                resposta = Response(status=304)
+            elif guardado is not None:
+                resposta = Response(guardado[0], mimetype=guardado[1])
+            else:
+                resposta = app.make_response(funcao(*args, **kwargs))
+                if resposta.status_code != 200:
+                    return resposta
+                _guardar_corpo_versionado(etag, resposta)
+            resposta.set_etag(etag, weak=True)
+            resposta.last_modified = modificado
+            # Sempre revalida: o 304 é barato e evita servir versão antiga
+            resposta.headers['Cache-Control'] = 'no-cache'
+            return resposta
+        return rota
+    return decorador
+
+
+# =========================================================
+# LEITURAS RELACIONAIS (recursos embutidos do PostgREST)
+# =========================================================
+
+class Leitura:
+    """Leitura declarativa de uma tabela com junções resolvidas no servidor.
+
+    `juncoes` mapeia o nome do campo de saída para (coluna_fk, campo_referenciado)
+    e vira `alias:coluna_fk(campo)` no select, de modo que cada leitura lógica é
+    sempre uma única requisição ao PostgREST, qualquer que seja o nº de linhas.
+    """
+
+    def __init__(self, tabela, colunas, juncoes=None):
+        self.tabela = tabela
+        self.colunas = colunas
+        self.juncoes = juncoes or {}
+        embutidos = [f"{alias}:{fk}({campo})" for alias, (fk, campo) in self.juncoes.items()]
+        self.select = ", ".join([colunas] + embutidos) if embutidos else colunas
+
+    def consulta(self, cliente=None):
+        """Retorna o query builder já com o select montado, pronto para filtros.
+
+        `cliente` permite usar o AsyncClient do modo ASGI; o padrão é o cliente global.
+        """
+        return (cliente or supabase).table(self.tabela).select(self.select)
+
+    def achatar(self, linha):
+        """Substitui cada recurso embutido ({'nome': ...}) pelo valor do campo referenciado."""
+        if not isinstance(linha, dict):
+            return linha
+        for alias, (_, campo) in self.juncoes.items():
+            embutido = linha.get(alias)
+            linha[alias] = embutido.get(campo) if isinstance(embutido, dict) else None
+        return linha
+
+    def linhas(self, resposta):
+        return [self.achatar(l) for l in handle_supabase_response(resposta)]
+
+LEITURA_AGENDA = Leitura(
+    'f_agenda_aulas',
+    'id, dia_semana, ordem_aula, tema_aula, tipo_aula',
+    {'disciplina_nome': ('fk_disciplina_id', 'nome'), 'professor_nome': ('fk_professor_id', 'nome')},
+)
+
+LEITURA_TUTOR_DO_ALUNO = Leitura('d_alunos', 'tutor_id', {'tutor_nome': ('tutor_id', 'nome')})
+
+LEITURA_OCORRENCIAS_LISTAGEM = Leitura(
+    'ocorrencias',
+    "numero, data_hora, status, aluno_nome, tutor_nome, solicitado_professor, solicitado_tutor, solicitado_coordenacao, solicitado_gestao, atendimento_professor, atendimento_tutor, atendimento_coordenacao, atendimento_gestao",
+    {'professor_nome': ('professor_id', 'nome'), 'sala_nome': ('sala_id', 'sala')},
+)
+
+LEITURA_OCORRENCIA_DETALHE = Leitura(
+    'ocorrencias',
+    "numero, data_hora, descricao, atendimento_professor, atendimento_tutor, atendimento_coordenacao, atendimento_gestao, dt_atendimento_tutor, dt_atendimento_coordenacao, dt_atendimento_gestao, aluno_nome, tutor_nome, status",
+    {'professor_nome': ('professor_id', 'nome'), 'sala_nome': ('sala_id', 'sala')},
+)
+
+# Mesmos campos do detalhe + aluno_id, para agrupar o dossiê por aluno
+LEITURA_OCORRENCIAS_DOSSIE = Leitura(
+    'ocorrencias',
+    LEITURA_OCORRENCIA_DETALHE.colunas + ", aluno_id",
+    LEITURA_OCORRENCIA_DETALHE.juncoes,
+)
+
+
+# =========================================================
+# RECONCILIAÇÃO DE STATUS DAS OCORRÊNCIAS
+# =========================================================
+
+NIVEIS_ATENDIMENTO = ('professor', 'tutor', 'coordenacao', 'gestao')
+
+COLUNAS_RECONCILIACAO = "numero, status, " + ", ".join(
+    f"solicitado_{n}, atendimento_{n}" for n in NIVEIS_ATENDIMENTO
+)
+
+RECONCILIACAO_INTERVALO_SEGUNDOS = int(os.environ.get("RECONCILIACAO_INTERVALO_SEGUNDOS", "600"))
+RECONCILIACAO_LOTE = 500
+
+def reconciliar_ocorrencia(occ):
+    """Calcula o status de uma ocorrência e o que precisa ser gravado para normalizá-la.
+
+    Níveis (exceto professor) não solicitados e sem texto recebem DEFAULT_AUTOTEXT;
+    um nível solicitado fica pendente enquanto não tiver um atendimento real.
+    Retorna (status, alteracoes), onde `alteracoes` contém só os campos que diferem
+    do que está armazenado.
+
+    É a regra que o registrar_atendimento já usava para finalizar. As listagens
+    antigas usavam outra, mais frouxa: ignoravam o nível professor e tratavam
+    DEFAULT_AUTOTEXT num nível solicitado como atendido. Com a regra única, essas
+    ocorrências passam de finalizadas para abertas.
+    """
+    alteracoes = {}
+    pendente = False
+    for nivel in NIVEIS_ATENDIMENTO:
+        solicitado = _to_bool(occ.get(f'solicitado_{nivel}'))
+        texto = (occ.get(f'atendimento_{nivel}') or "").strip()
+        if not solicitado and texto == "" and nivel != 'professor':
+            alteracoes[f'atendimento_{nivel}'] = DEFAULT_AUTOTEXT
+        elif solicitado and texto in ("", DEFAULT_AUTOTEXT):
+            pendente = True
+    status = "Aberta" if pendente else "Finalizada"
+    if occ.get('status') != status:
+        alteracoes['status'] = status
+    return status, alteracoes
+
+def aplicar_reconciliacao(occ):
+    """Grava (em uma única chamada) a normalização de uma ocorrência recém-escrita."""
+    status, alteracoes = reconciliar_ocorrencia(occ)
+    if alteracoes:
+        supabase.table('ocorrencias').update(alteracoes).eq('numero', occ['numero']).execute()
+        occ.update(alteracoes)
+        logging.info(f"[OCORRÊNCIA] Nº {occ['numero']} reconciliada → {status}")
+    return status
+
+def reconciliar_ocorrencias_em_lote():
+    """Percorre a tabela em páginas e grava as divergências agrupadas.
+
+    Linhas com o mesmo conjunto de alterações são atualizadas juntas com
+    `update().in_('numero', ...)`, então o nº de escritas depende das combinações
+    distintas de alterações e não do nº de ocorrências divergentes.
+    """
+    grupos = {}
+    inicio = 0
+    while True:
+        resp = supabase.table('ocorrencias').select(COLUNAS_RECONCILIACAO).order('numero').range(inicio, inicio + RECONCILIACAO_LOTE - 1).execute()
+        pagina = handle_supabase_response(resp)
+        for occ in pagina:
+            _, alteracoes = reconciliar_ocorrencia(occ)
+            if alteracoes:
+                chave = tuple(sorted(alteracoes.items()))
+                grupos.setdefault(chave, []).append(occ['numero'])
+        if len(pagina) < RECONCILIACAO_LOTE:
+            break
+        inicio += RECONCILIACAO_LOTE
+
+    total = 0
+    for chave, numeros in grupos.items():
+        for i in range(0, len(numeros), RECONCILIACAO_LOTE):
+            lote = numeros[i:i + RECONCILIACAO_LOTE]
+            supabase.table('ocorrencias').update(dict(chave)).in_('numero', lote).execute()
+            total += len(lote)
+    if total:
+        logging.info(f"[RECONCILIAÇÃO] {total} ocorrências atualizadas em {len(grupos)} grupo(s)")
+        estatisticas_ocorrencias.invalidar()
+    return total
+
+# Arquivo de coordenação entre os workers: o lock elege quem roda e o conteúdo/mtime marca a última execução
+RECONCILIACAO_MARCA = os.environ.get("RECONCILIACAO_MARCA", os.path.join(tempfile.gettempdir(), "gestao_reconciliacao.marca"))
+
+_reconciliador_iniciado = False
+_reconciliador_lock = threading.Lock()
+
+def reconciliar_se_for_a_vez():
+    """Roda o lote só se nenhum worker desta máquina o rodou no último intervalo.
+
+    Cada worker tem a sua thread, mas a varredura da tabela acontece uma vez
+    por intervalo: quem não obtém o lock (outro worker está reconciliando) ou
+    encontra a marca recente simplesmente não faz nada.
+    """
+    fd = os.open(RECONCILIACAO_MARCA, os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            return None
+        info = os.fstat(fd)
+        if info.st_size and time.time() - info.st_mtime < RECONCILIACAO_INTERVALO_SEGUNDOS:
+            return None
+        total = reconciliar_ocorrencias_em_lote()
+        os.ftruncate(fd, 0)
+        os.write(fd, f"{os.getpid()} {total}\n".encode())
+        return total
+    finally:
+        os.close(fd)
+
+def _laco_reconciliador():
+    while True:
+        try:
+            reconciliar_se_for_a_vez()
+        except Exception as e:
+            logging.error(f"Falha na reconciliação periódica de ocorrências: {e}")
+        time.sleep(RECONCILIACAO_INTERVALO_SEGUNDOS)
+
+def iniciar_reconciliador():
+    """Inicia (uma vez por processo) a thread de reconciliação periódica (ver reconciliar_se_for_a_vez)."""
+    global _reconciliador_iniciado
+    if RECONCILIACAO_INTERVALO_SEGUNDOS <= 0 or _reconciliador_iniciado:
+        return
+    with _reconciliador_lock:
+        if _reconciliador_iniciado:
+            return
+        threading.Thread(target=_laco_reconciliador, name='reconciliador-ocorrencias', daemon=True).start()
+        _reconciliador_iniciado = True
+
+@app.before_request
+def garantir_reconciliador():
+    # A thread é criada no próprio worker (após o fork do gunicorn), na primeira requisição
+    iniciar_reconciliador()
+
+
+# =========================================================
+# PAGINAÇÃO (KEYSET) E FILTROS DAS LISTAGENS DE OCORRÊNCIAS
+# =========================================================
+
+OCORRENCIAS_LIMITE_MAXIMO = 1000  # limite padrão de linhas por resposta do PostgREST
+
+class ParametrosInvalidos(ValueError):
+    """Parâmetro obrigatório ausente ou inválido (vira HTTP 400)."""
+
+def _codificar_cursor(linha):
+    bruto = json.dumps([linha.get('data_hora'), linha.get('numero')])
+    return base64.urlsafe_b64encode(bruto.encode()).decode().rstrip('=')
+
+def _decodificar_cursor(cursor):
+    """Chave (data_hora, numero) do cursor; a data_hora vai para o filtro do PostgREST, então precisa ser ISO."""
+    try:
+        preenchido = cursor + '=' * (-len(cursor) % 4)
+        data_hora, numero = json.loads(base64.urlsafe_b64decode(preenchido))
+        datetime.fromisoformat(data_hora)
+        return data_hora, int(numero)
+    except (ValueError, TypeError) as e:
+        raise ParametrosInvalidos(f"Cursor inválido: {cursor}") from e
+
+def _data_iso(valor, nome):
+    """Valida uma data (AAAA-MM-DD) ou data e hora ISO vinda da query string."""
+    try:
+        return date.fromisoformat(valor) if len(valor) == 10 else datetime.fromisoformat(valor)
+    except ValueError as e:
+        raise ParametrosInvalidos(f"Data inválida em {nome}: {valor}") from e
+
+def _int_ou_none(valor, nome):
+    """Inteiro da query string (None se ausente); um valor não numérico é erro do cliente, não filtro ignorado."""
+    if not valor:
+        return None
+    try:
+        return int(valor)
+    except ValueError as e:
+        raise ParametrosInvalidos(f"Valor inválido em {nome}: {valor}") from e
+
+def _dia_ou_none(valor, nome):
+    """Dia AAAA-MM-DD da query string (None se ausente), no formato comparado com a coluna data."""
+    if not valor:
+        return None
+    dia = _data_iso(valor, nome)
+    if isinstance(dia, datetime):
+        raise ParametrosInvalidos(f"Data inválida em {nome}: {valor} (esperado AAAA-MM-DD)")
+    return dia.isoformat()
+
+def filtrar_ocorrencias(q, args, status=None):
+    """Aplica no Supabase os filtros da query string: status, sala, aluno, data_inicial e data_final."""
+    status = status or args.get('status')
+    if status:
+        q = q.eq('status', status)
+    sala_id = _int_ou_none(args.get('sala'), 'sala')
+    if sala_id is not None:
+        q = q.eq('sala_id', sala_id)
+    aluno_id = _int_ou_none(args.get('aluno'), 'aluno')
+    if aluno_id is not None:
+        q = q.eq('aluno_id', aluno_id)
+    data_inicial = args.get('data_inicial')
+    if data_inicial:
+        q = q.gte('data_hora', _data_iso(data_inicial, 'data_inicial').isoformat())
+    data_final = args.get('data_final')
+    if data_final:
+        final = _data_iso(data_final, 'data_final')
+        if isinstance(final, datetime):
+            q = q.lte('data_hora', final.isoformat())
+        else:
+            # Data sem hora: inclui o dia inteiro
+            q = q.lt('data_hora', (final + timedelta(days=1)).isoformat())
+    return q
+
+def _ordenar_apos_cursor(q, cursor):
+    """Ordena por (data_hora, numero) decrescente, começando após a chave do cursor."""
+    q = q.order('data_hora', desc=True).order('numero', desc=True)
+    if cursor:
+        data_hora, numero = _decodificar_cursor(cursor)
+        q = q.or_(f'data_hora.lt."{data_hora}",and(data_hora.eq."{data_hora}",numero.lt.{numero})')
+    return q
+
+def paginar_ocorrencias(q, args):
+    """Ordena por (data_hora, numero) decrescente e aplica `cursor` e `limit`.
+
+    O cursor é a chave da última linha da página anterior, então cada página é
+    uma busca indexada, sem OFFSET. Retorna (query, limite).
+    """
+    q = _ordenar_apos_cursor(q, args.get('cursor'))
+    limite = _int_ou_none(args.get('limit'), 'limit')
+    if limite:
+        limite = min(max(limite, 1), OCORRENCIAS_LIMITE_MAXIMO)
+        q = q.limit(limite)
+    return q, limite
+
+def cabecalhos_pagina(linhas, limite):
+    """Cabeçalho X-Proximo-Cursor quando a página veio cheia (pode haver mais linhas)."""
+    if limite and len(linhas) == limite:
+        return {'X-Proximo-Cursor': _codificar_cursor(linhas[-1])}
+    return {}
+
+def percorrer_ocorrencias(consulta, cursor=None, converter=handle_supabase_response):
+    """Gera todas as ocorrências de `consulta` página a página, pelo keyset (data_hora, numero).
+
+    `consulta` é uma função que devolve a query base já filtrada (o builder do
+    postgrest é mutável, então cada página parte de uma nova).
+    """
+    while True:
+        q = _ordenar_apos_cursor(consulta(), cursor).limit(OCORRENCIAS_LIMITE_MAXIMO)
+        pagina = converter(q.execute())
+        yield from pagina
+        if len(pagina) < OCORRENCIAS_LIMITE_MAXIMO:
+            return
+        cursor = _codificar_cursor(pagina[-1])
+
+FORMATOS_STREAMING = {
+    'ndjson': 'application/x-ndjson',
+    'json_stream': 'application/json',
+}
+
+def transmitir_ocorrencias(consulta, args):
+    """Exporta todas as ocorrências filtradas em streaming, página a página.
+
+    As páginas seguem o mesmo keyset da listagem (percorrer_ocorrencias), de
+    OCORRENCIAS_LIMITE_MAXIMO linhas, e cada linha é escrita assim que chega:
+    a memória fica limitada a uma página.
+
+    ?formato=ndjson      -> uma ocorrência JSON por linha
+    ?formato=json_stream -> um array JSON escrito incrementalmente
+    """
+    formato = args.get('formato')
+    cursor_inicial = args.get('cursor')
+    # Filtros e cursor são validados aqui: dentro do gerador um erro já não vira 400
+    consulta()
+    if cursor_inicial:
+        _decodificar_cursor(cursor_inicial)
+
+    def linhas():
+        return percorrer_ocorrencias(consulta, cursor_inicial)
+
+    def gerar():
+        try:
+            if formato == 'ndjson':
+                for linha in linhas():
+                    yield app.json.dumps(linha) + '\n'
+            else:
+                separador = '['
+                for linha in linhas():
+                    yield separador + app.json.dumps(linha)
+                    separador = ','
+                yield '[]' if separador == '[' else ']'
+        except Exception:
+            # Cabeçalhos já enviados: só resta interromper (o JSON fica incompleto)
+            logging.exception("Erro durante exportação em streaming de ocorrências")
+
+    resposta = Response(stream_with_context(gerar()), mimetype=FORMATOS_STREAMING[formato])
+    resposta.headers['X-Accel-Buffering'] = 'no'  # não deixa proxy reverso acumular a resposta
+    return resposta
+
+
+# =========================================================
+# ESTATÍSTICAS DE OCORRÊNCIAS (mantidas incrementalmente)
+# =========================================================
+
+COLUNAS_ESTATISTICAS = (
+    "numero, data_hora, status, tipo, tutor_id, sala_id, "
+    "solicitado_tutor, solicitado_coordenacao, solicitado_gestao, "
+    "atendimento_tutor, atendimento_coordenacao, atendimento_gestao, "
+    "dt_atendimento_gestao"  # dt_atendimento_gestao é a data de fechamento final
+)
+
+ESTATISTICAS_RECONSTRUCAO_SEGUNDOS = int(os.environ.get("ESTATISTICAS_RECONSTRUCAO_SEGUNDOS", "900"))
+
+FAIXAS_TEMPO_RESPOSTA = ('1-7 dias', '8-30 dias', 'mais de 30 dias', 'não finalizadas')
+
+# Contribuição de uma ocorrência para os agregados; guardada para poder ser desfeita
+Contribuicao = namedtuple('Contribuicao', 'status tipo sala tutor mes abertura nao_respondida dias_resposta')
+
+def _parse_data_hora(data_str):
+    """Converte o ISO do Supabase em datetime ingênuo (hora local) ou None."""
+    if not data_str:
+        return None
+    try:
+        dt = datetime.fromisoformat(data_str.replace('Z', '+00:00'))
+    except (TypeError, ValueError):
+        logging.warning(f"Data de ocorrência inválida: {data_str}")
+        return None
+    if dt.tzinfo is not None:
+        dt = dt.astimezone().replace(tzinfo=None)
+    return dt
+
+_EPOCA = datetime(1970, 1, 1)
+
+def _segundos_desde_epoca(dt):
+    """Timestamp de um datetime ingênuo, sem aplicar fuso (mesma escala das colunas NumPy)."""
+    return (dt - _EPOCA) / timedelta(seconds=1)
+
+def _faixa_tempo_resposta(dias):
+    if dias <= 7:
+        return '1-7 dias'
+    if dias <= 30:
+        return '8-30 dias'
+    return 'mais de 30 dias'
+
+def contribuicao_ocorrencia(occ):
+    status = occ.get('status')
+    dt = _parse_data_hora(occ.get('data_hora'))
+    aberta = status == 'Aberta' and dt is not None
+    nao_respondida = False
+    if aberta:
+        solicitado = (_to_bool(occ.get('solicitado_tutor')) or
+                      _to_bool(occ.get('solicitado_coordenacao')) or
+                      _to_bool(occ.get('solicitado_gestao')))
+        respondido = any(
+            occ.get(campo) and occ.get(campo) != DEFAULT_AUTOTEXT
+            for campo in ('atendimento_tutor', 'atendimento_coordenacao', 'atendimento_gestao')
+        )
+        nao_respondida = solicitado and not respondido
+    return Contribuicao(
+        status=status,
+        tipo=occ.get('tipo') or 'Outros',
+        sala=str(occ.get('sala_id')),
+        tutor=str(occ.get('tutor_id')) if occ.get('tutor_id') else None,
+        mes=dt.strftime("%Y-%m") if dt else None,
+        abertura=_segundos_desde_epoca(dt) if aberta else None,
+        nao_respondida=nao_respondida,
+        dias_resposta=calcular_dias_resposta(occ.get('data_hora'), occ.get('dt_atendimento_gestao')) if status == 'Finalizada' else None,
+    )
+
+def _tem_fuso(valor):
+    return bool(valor) and len(valor) > 19 and (valor[-1] == 'Z' or valor[-6] in '+-')
+
+def _datas_para_array(valores):
+    """Converte strings ISO em datetime64[us] (NaT para vazias/inválidas) em lote.
+
+    Strings ingênuas são interpretadas pelo NumPy; as poucas com fuso horário
+    passam por _parse_data_hora para manter a mesma conversão da versão por linha.
+    Retorna (datas, máscara das que tinham fuso).
+    """
+    tem_fuso = np.array([_tem_fuso(v) for v in valores], dtype=bool)
+    textos = ['NaT' if not v or fuso else v for v, fuso in zip(valores, tem_fuso)]
+    individuais = np.flatnonzero(tem_fuso)
+    try:
+        datas = np.array(textos, dtype='datetime64[us]')
+    except ValueError:
+        # Algum valor fora do padrão ISO: converte um a um (inválidos ficam NaT)
+        individuais = range(len(valores))
+        datas = np.full(len(valores), np.datetime64('NaT'), dtype='datetime64[us]')
+    for i in individuais:
+        dt = _parse_data_hora(valores[i])
+        if dt is not None:
+            datas[i] = np.datetime64(dt, 'us')
+    return datas, tem_fuso
+
+def _categorias(valores):
+    """Codifica uma coluna como (categorias, códigos) — cada valor distinto é tratado uma única vez."""
+    return np.unique(np.array(valores, dtype=object).astype(str), return_inverse=True)
+
+def _mascara_booleana(valores):
+    categorias, codigos = _categorias(valores)
+    return np.array([_to_bool(c) for c in categorias], dtype=bool)[codigos]
+
+def _mascara_respondido(valores):
+    textos = np.array(valores, dtype=object)
+    return (textos != None) & (textos != '') & (textos != DEFAULT_AUTOTEXT)  # noqa: E711 (comparação elemento a elemento)
+
+def colunas_ocorrencias(linhas):
+    """Carrega as ocorrências em arrays (um por campo derivado) para agregação vetorizada."""
+    campos = [c.strip() for c in COLUNAS_ESTATISTICAS.split(',')]
+    try:
+        # Transpõe linhas -> colunas numa única passada
+        transposto = list(zip(*map(itemgetter(*campos), linhas))) or [()] * len(campos)
+    except KeyError:
+        transposto = [[occ.get(c) for occ in linhas] for c in campos]
+    colunas = dict(zip(campos, transposto))
+
+    def coluna(nome):
+        return colunas[nome]
+
+    numeros = np.array(coluna('numero'), dtype=np.int64)
+    ordem = np.argsort(numeros, kind='stable')
+
+    status_cats, status_cod = _categorias(coluna('status'))
+    tipo_cats, tipo_cod = _categorias([t or 'Outros' for t in coluna('tipo')])
+    sala_cats, sala_cod = _categorias(coluna('sala_id'))
+    tutor_cats, tutor_cod = _categorias([t if t else '' for t in coluna('tutor_id')])
+
+    abertura, abertura_fuso = _datas_para_array(coluna('data_hora'))
+    fechamento, fechamento_fuso = _datas_para_array(coluna('dt_atendimento_gestao'))
+    abertura_valida = ~np.isnat(abertura)
+
+    aberta = (status_cats[status_cod] == 'Aberta') & abertura_valida
+    finalizada = status_cats[status_cod] == 'Finalizada'
+    solicitado = (_mascara_booleana(coluna('solicitado_tutor')) |
+                  _mascara_booleana(coluna('solicitado_coordenacao')) |
+                  _mascara_booleana(coluna('solicitado_gestao')))
+    respondido = (_mascara_respondido(coluna('atendimento_tutor')) |
+                  _mascara_respondido(coluna('atendimento_coordenacao')) |
+                  _mascara_respondido(coluna('atendimento_gestao')))
+
+    # Dias de resposta com a mesma regra de calcular_dias_resposta: dias inteiros + 1 se sobrar ao menos 1s
+    # (datas com e sem fuso misturadas não são comparáveis e ficam sem valor, como lá)
+    tem_resposta = finalizada & abertura_valida & ~np.isnat(fechamento) & (abertura_fuso == fechamento_fuso)
+    diff_us = np.where(tem_resposta, (fechamento - abertura).astype(np.int64), 0)
+    dia_us = 86_400 * 1_000_000
+    dias = diff_us // dia_us
+    dias = dias + ((diff_us - dias * dia_us) >= 1_000_000)
+
+    return {
+        'numeros': numeros[ordem],
+        'ordem': ordem,
+        'status_cats': status_cats, 'status_cod': status_cod,
+        'tipo_cats': tipo_cats, 'tipo_cod': tipo_cod,
+        'sala_cats': sala_cats, 'sala_cod': sala_cod,
+        'tutor_cats': tutor_cats, 'tutor_cod': tutor_cod,
+        'mes': abertura.astype('datetime64[M]'),
+        'abertura_s': np.where(aberta, abertura.astype(np.int64) / 1e6, np.nan),
+        'aberta': aberta,
+        'finalizada': finalizada,
+        'nao_respondida': aberta & solicitado & ~respondido,
+        'tem_resposta': tem_resposta,
+        'dias': dias,
+    }
+
+def contribuicao_da_coluna(col, pos):
+    """Reconstrói a Contribuicao da linha `pos` a partir dos arrays (para desfazê-la numa atualização)."""
+    mes = col['mes'][pos]
+    tutor = col['tutor_cats'][col['tutor_cod'][pos]]
+    return Contribuicao(
+        status=str(col['status_cats'][col['status_cod'][pos]]),
+        tipo=str(col['tipo_cats'][col['tipo_cod'][pos]]),
+        sala=str(col['sala_cats'][col['sala_cod'][pos]]),
+        tutor=str(tutor) if tutor else None,
+        mes=None if np.isnat(mes) else str(np.datetime_as_string(mes, unit='M')),
+        abertura=float(col['abertura_s'][pos]) if col['aberta'][pos] else None,
+        nao_respondida=bool(col['nao_respondida'][pos]),
+        dias_resposta=int(col['dias'][pos]) if col['tem_resposta'][pos] else None,
+    )
+
+class ReconstrucaoUnica:
+    """Uma só releitura completa por vez de um agregado em memória (single-flight).
+
+    Quem encontra o agregado expirado tenta reconstruí-lo; se outra thread já
+    está relendo a tabela, segue com os contadores atuais em vez de repetir a
+    varredura. Só espera quando ainda não há nada carregado ou quando a
+    reconstrução foi pedida explicitamente.
+    """
+
+    def __init__(self, reconstruir):
+        self._reconstruir = reconstruir
+        self._lock = threading.Lock()
+        self.concluida_em = 0  # time.monotonic() da última reconstrução completa
+
+    def executar(self, expirado, forcar=False):
+        """Reconstrói se `expirado()` (reavaliado já com o lock) ou se `forcar`."""
+        pedido = time.monotonic()
+        if not self._lock.acquire(blocking=forcar or not self.concluida_em):
+            return
+        try:
+            # Outra thread concluiu enquanto esperávamos: o resultado dela já serve
+            if self.concluida_em >= pedido or not (forcar or expirado()):
+                return
+            self._reconstruir()
+            self.concluida_em = time.monotonic()
+        finally:
+            self._lock.release()
+
+    def executar_em_segundo_plano(self, expirado):
+        """Como executar(), mas fora da requisição: quem consulta segue com os valores atuais.
+
+        A primeira carga ainda é feita na hora (não há o que servir antes dela).
+        """
+        if not self.concluida_em:
+            self.executar(expirado)
+        elif not self._lock.locked() and expirado():
+            threading.Thread(target=self.executar, args=(expirado,), daemon=True,
+                             name=f"reconstrucao-{getattr(self._reconstruir, '__qualname__', '')}").start()
+
+class EstatisticasOcorrencias:
+    """Agregados do relatório estatístico, atualizados a cada escrita de ocorrência.
+
+    Guarda a contribuição de cada ocorrência para que uma alteração seja aplicada
+    como "remove a antiga, soma a nova". O relatório é montado a partir dos
+    contadores, sem reler a tabela; a reconstrução completa só acontece na
+    primeira consulta, quando expirada (ESTATISTICAS_RECONSTRUCAO_SEGUNDOS), após
+    a reconciliação em lote ou sob demanda — uma thread por vez (ReconstrucaoUnica).
+
+    Cada worker tem os seus contadores: toda escrita avança a versão de
+    'ocorrencias' em versoes_tabelas, e um worker que encontra uma versão que
+    não é a sua reconstrói na próxima consulta. Escritas feitas durante uma
+    reconstrução são reaplicadas sobre a carga nova.
+    """
+
+    def __init__(self, intervalo_reconstrucao):
+        self.intervalo_reconstrucao = intervalo_reconstrucao
+        self._lock = threading.RLock()
+        self._reconstruir_em = 0
+        self._reconstrucao = ReconstrucaoUnica(self.reconstruir)
+        self._versao = None   # token de 'ocorrencias' que os contadores refletem (None: carga sem tabela)
+        self._relendo = None  # numero -> Contribuicao escrita durante uma reconstrução
+        self._zerar()
+
+    def _zerar(self):
+        self._contribuicoes = {}  # numero -> Contribuicao (linhas alteradas após a carga colunar)
+        self._colunas = None
+        self.total = 0
+        self.por_status = Counter()
+        self.tipos = Counter()
+        self.por_mes = Counter()
+        self.salas = {}    # sala_id -> {'total', 'nao_respondidas', 'aberturas' (timestamps ordenados)}
+        self.tutores = {}  # tutor_id -> {'total', 'finalizadas', 'abertas', 'soma_dias', 'qtd_dias', <faixas>}
+
+    def _aplicar(self, c, sinal):
+        self.total += sinal
+        self.por_status[c.status] += sinal
+        self.tipos[c.tipo] += sinal
+        if c.mes:
+            self.por_mes[c.mes] += sinal
+
+        sala = self.salas.setdefault(c.sala, {'total': 0, 'nao_respondidas': 0, 'aberturas': []})
+        sala['total'] += sinal
+        if c.nao_respondida:
+            sala['nao_respondidas'] += sinal
+        if c.abertura is not None:
+            if sinal > 0:
+                bisect.insort(sala['aberturas'], c.abertura)
+            else:
+                pos = bisect.bisect_left(sala['aberturas'], c.abertura)
+                if pos < len(sala['aberturas']) and sala['aberturas'][pos] == c.abertura:
+                    sala['aberturas'].pop(pos)
+
+        if c.tutor:
+            tutor = self.tutores.setdefault(c.tutor, dict.fromkeys(
+                ('total', 'finalizadas', 'abertas', 'soma_dias', 'qtd_dias') + FAIXAS_TEMPO_RESPOSTA, 0))
+            tutor['total'] += sinal
+            if c.status == 'Finalizada':
+                tutor['finalizadas'] += sinal
+                if c.dias_resposta is not None:
+                    tutor['soma_dias'] += sinal * c.dias_resposta
+                    tutor['qtd_dias'] += sinal
+                    tutor[_faixa_tempo_resposta(c.dias_resposta)] += sinal
+            else:
+                tutor['abertas'] += sinal
+                tutor['não finalizadas'] += sinal
+
+    def atualizar(self, occ):
+        """Aplica a versão atual de uma ocorrência (inserida ou alterada)."""
+        numero = occ.get('numero')
+        if numero is None:
+            return
+        nova = contribuicao_ocorrencia(occ)
+        with self._lock:
+            self._avancar_versao()
+            if self._relendo is not None:
+                self._relendo[numero] = nova  # a leitura em andamento pode ter pego a linha antiga
+            if not self._reconstruir_em:
+                return  # ainda não carregado: a reconstrução já incluirá esta linha
+            self._substituir(numero, nova)
+
+    def _substituir(self, numero, nova):
+        antiga = self._contribuicao_atual(numero)
+        if antiga is not None:
+            self._aplicar(antiga, -1)
+        self._aplicar(nova, +1)
+        self._contribuicoes[numero] = nova
+
+    def invalidar(self):
+        """Reconstrói na próxima consulta, neste e nos outros workers."""
+        with self._lock:
+            self._reconstruir_em = 0
+        versoes_tabelas.avancar('ocorrencias')
+
+    @staticmethod
+    def _versao_atual():
+        try:
+            return versoes_tabelas.versao('ocorrencias')[0]
+        except OSError as e:
+            logging.warning(f"[ESTATÍSTICAS] Sem versão de ocorrencias ({e}); só a expiração vale")
+            return None
+
+    def _avancar_versao(self):
+        # Se os contadores estavam na versão atual, a nova (que só difere por esta escrita) também é deles
+        em_dia = self._versao is not None and self._versao == self._versao_atual()
+        versoes_tabelas.avancar('ocorrencias')
+        if em_dia:
+            self._versao = self._versao_atual()
+
+    def _expirado(self):
+        if time.monotonic() >= self._reconstruir_em:
+            return True
+        atual = self._versao_atual() if self._versao is not None else None
+        return atual is not None and atual != self._versao
+
+    def _contribuicao_atual(self, numero):
+        if numero in self._contribuicoes:
+            return self._contribuicoes[numero]
+        col = self._colunas
+        if col is None:
+            return None
+        i = np.searchsorted(col['numeros'], numero)
+        if i < len(col['numeros']) and col['numeros'][i] == numero:
+            return contribuicao_da_coluna(col, col['ordem'][i])
+        return None
+
+    def _carregar_por_linha(self, linhas):
+        """Caminho de referência: uma Contribuicao por ocorrência (usado no benchmark)."""
+        for occ in linhas:
+            c = contribuicao_ocorrencia(occ)
+            self._contribuicoes[occ.get('numero')] = c
+            self._aplicar(c, +1)
+
+    def _carregar_colunar(self, linhas):
+        """Preenche os contadores com reduções vetorizadas (bincount/unique) sobre as colunas."""
+        col = colunas_ocorrencias(linhas)
+        self._colunas = col
+        self.total = len(linhas)
+
+        def contagem(categorias, codigos, pesos=None):
+            return np.bincount(codigos, weights=pesos, minlength=len(categorias)).astype(np.int64)
+
+        self.por_status = Counter({str(c): int(n) for c, n in zip(col['status_cats'], contagem(col['status_cats'], col['status_cod'])) if c != 'None'})
+        self.tipos = Counter({str(c): int(n) for c, n in zip(col['tipo_cats'], contagem(col['tipo_cats'], col['tipo_cod']))})
+        meses, qtds = np.unique(col['mes'][~np.isnat(col['mes'])], return_counts=True)
+        self.por_mes = Counter({str(m): int(n) for m, n in zip(np.datetime_as_string(meses, unit='M'), qtds)})
+
+        sala_cats, sala_cod = col['sala_cats'], col['sala_cod']
+        totais = contagem(sala_cats, sala_cod)
+        nao_resp = contagem(sala_cats, sala_cod, col['nao_respondida'])
+        abertas = np.flatnonzero(col['aberta'])
+        ordem = np.lexsort((col['abertura_s'][abertas], sala_cod[abertas]))
+        abertas_cod = sala_cod[abertas][ordem]
+        aberturas = col['abertura_s'][abertas][ordem]
+        limites = np.searchsorted(abertas_cod, np.arange(len(sala_cats) + 1))
+        self.salas = {
+            str(c): {
+                'total': int(totais[k]),
+                'nao_respondidas': int(nao_resp[k]),
+                'aberturas': aberturas[limites[k]:limites[k + 1]].tolist(),
+            }
+            for k, c in enumerate(sala_cats)
+        }
+
+        tutor_cats, tutor_cod = col['tutor_cats'], col['tutor_cod']
+        fin, dias, tem = col['finalizada'], col['dias'], col['tem_resposta']
+        por_tutor = {
+            'total': contagem(tutor_cats, tutor_cod),
+            'finalizadas': contagem(tutor_cats, tutor_cod, fin),
+            'abertas': contagem(tutor_cats, tutor_cod, ~fin),
+            'soma_dias': contagem(tutor_cats, tutor_cod, np.where(tem, dias, 0)),
+            'qtd_dias': contagem(tutor_cats, tutor_cod, tem),
+            '1-7 dias': contagem(tutor_cats, tutor_cod, tem & (dias <= 7)),
+            '8-30 dias': contagem(tutor_cats, tutor_cod, tem & (dias > 7) & (dias <= 30)),
+            'mais de 30 dias': contagem(tutor_cats, tutor_cod, tem & (dias > 30)),
+            'não finalizadas': contagem(tutor_cats, tutor_cod, ~fin),
+        }
+        self.tutores = {
+            str(c): {campo: int(valores[k]) for campo, valores in por_tutor.items()}
+            for k, c in enumerate(tutor_cats) if c
+        }
+
+    def carregar(self, linhas, colunar=True):
+        with self._lock:
+            self._zerar()
+            if colunar:
+                self._carregar_colunar(linhas)
+            else:
+                self._carregar_por_linha(linhas)
+            self._reconstruir_em = time.monotonic() + self.intervalo_reconstrucao
+
+    def reconstruir(self):
+        """Recalcula tudo a partir da tabela, paginando além do limite de 1000 linhas."""
+        with self._lock:
+            self._relendo = {}
+            # Versão lida antes da tabela: escrita de outro worker durante a leitura força outra reconstrução
+            self._versao = self._versao_atual()
+        concluida = False
+        try:
+            linhas = buscar_todas(lambda: supabase.table('ocorrencias').select(COLUNAS_ESTATISTICAS).order('numero'))
+            with self._lock:
+                self.carregar(linhas)
+                for numero, nova in self._relendo.items():
+                    self._substituir(numero, nova)
+            concluida = True
+        finally:
+            with self._lock:
+                self._relendo = None
+                if not concluida:
+                    self._versao, self._reconstruir_em = None, 0
+        logging.info(f"[ESTATÍSTICAS] Reconstruídas a partir de {len(linhas)} ocorrências")
+
+    def relatorio(self, salas_map, tutores_map, forcar_reconstrucao=False):
+        """Monta o JSON do relatório estatístico a partir dos contadores."""
+        self._reconstrucao.executar(self._expirado, forcar_reconstrucao)
+        limite_7d = _segundos_desde_epoca(datetime.now() - timedelta(days=8))
+        with self._lock:
+            por_sala = []
+            for sala_id, sala in self.salas.items():
+                if sala['total'] <= 0 or sala_id not in salas_map:
+                    continue
+                abertas = len(sala['aberturas'])
+                menos_7d = abertas - bisect.bisect_right(sala['aberturas'], limite_7d)
+                por_sala.append({
+                    'sala': salas_map[sala_id],
+                    'total': sala['total'],
+                    'menos_7d': menos_7d,
+                    'mais_7d': abertas - menos_7d,
+                    'nao_respondidas': sala['nao_respondidas']
+                })
+
+            faixas = dict.fromkeys(FAIXAS_TEMPO_RESPOSTA, 0)
+            por_tutor = []
+            for tutor_id, tutor in self.tutores.items():
+                if tutor['total'] <= 0 or tutor_id not in tutores_map:
+                    continue
+                for faixa in FAIXAS_TEMPO_RESPOSTA:
+                    faixas[faixa] += tutor[faixa]
+                media = tutor['soma_dias'] / tutor['qtd_dias'] if tutor['qtd_dias'] else 0
+                por_tutor.append({
+                    'tutor': tutores_map[tutor_id],
+                    'total': tutor['total'],
+                    'finalizadas': tutor['finalizadas'],
+                    'abertas': tutor['abertas'],
+                    'media_dias_resposta': round(media, 1) if media else 0
+                })
+
+            meses_ordenados = sorted(m for m, qtd in self.por_mes.items() if qtd > 0)
+            return {
+                'total': self.total,
+                'abertas': self.por_status['Aberta'],
+                'finalizadas': self.por_status['Finalizada'],
+                'tipos': {t: qtd for t, qtd in self.tipos.items() if qtd > 0},
+                'por_sala': sorted(por_sala, key=lambda s: s['sala']),
+                'por_tutor': sorted(por_tutor, key=lambda t: t['tutor']),
+                'tempo_resposta': {
+                    'labels': list(faixas.keys()),
+                    'valores': list(faixas.values())
+                },
+                'ocorrencias_por_mes': {
+                    'labels': [datetime.strptime(m, "%Y-%m").strftime("%b/%y") for m in meses_ordenados],
+                    'valores': [self.por_mes[m] for m in meses_ordenados]
+                }
+            }
+
+estatisticas_ocorrencias = EstatisticasOcorrencias(ESTATISTICAS_RECONSTRUCAO_SEGUNDOS)
+
+
+# =========================================================
+# ESCRITA EM LOTES (upsert em paralelo com isolamento de falhas)
+# =========================================================
+
+LOTE_UPSERT_TAMANHO = int(os.environ.get("LOTE_UPSERT_TAMANHO", "500"))
+LOTE_UPSERT_PARALELISMO = int(os.environ.get("LOTE_UPSERT_PARALELISMO", "4"))
+
+def _erro_de_linha(erro):
+    """Se o erro do PostgREST vem do conteúdo de alguma linha (e não do lote/conexão).
+
+    São os SQLSTATE de dados inválidos (22xxx) e de restrição violada (23xxx),
+    e respostas 4xx sem corpo JSON (o postgrest-py põe o status HTTP em `code`).
+    Timeout, conexão, 5xx, on_conflict sem restrição (42P10) etc. valem para o
+    lote inteiro: dividi-lo só multiplicaria as chamadas que vão falhar.
+    """
+    codigo = getattr(erro, 'code', None)
+    if isinstance(codigo, int):
+        return 400 <= codigo < 500 and codigo not in (408, 429)
+    return isinstance(codigo, str) and len(codigo) == 5 and codigo[:2] in ('22', '23')
+
+def _upsert_isolando_falhas(tabela, registros, on_conflict):
+    """Upsert de um lote; se uma linha for recusada, divide ao meio até isolar as linhas com erro.
+
+    Retorna (salvos, falhas), com falhas = [(registro, mensagem)]. Erros que não
+    são de linha (_erro_de_linha) sobem na hora.
+    """
+    try:
+        supabase.table(tabela).upsert(registros, on_conflict=on_conflict).execute()
+        return registros, []
+    except Exception as e:
+        if not _erro_de_linha(e):
+            raise
+        if len(registros) == 1:
+            return [], [(registros[0], str(e))]
+    meio = len(registros) // 2
+    salvos_a, falhas_a = _upsert_isolando_falhas(tabela, registros[:meio], on_conflict)
+    salvos_b, falhas_b = _upsert_isolando_falhas(tabela, registros[meio:], on_conflict)
+    return salvos_a + salvos_b, falhas_a + falhas_b
+
+def upsert_em_lotes(tabela, registros, on_conflict, chave,
+                    tamanho=LOTE_UPSERT_TAMANHO, paralelismo=LOTE_UPSERT_PARALELISMO):
+    """Upsert de muitos registros em lotes enviados em paralelo pelo mesmo cliente HTTP.
+
+    Registros repetidos pela `chave` (as colunas de on_conflict) ficam só com o
+    último — o Postgres rejeita um upsert que altera a mesma linha duas vezes.
+    Um lote com erro é bisseccionado, então só as linhas ruins deixam de ser
+    gravadas. Retorna (salvos, falhas) como _upsert_isolando_falhas.
+    """
+    unicos = list({chave(r): r for r in registros}.values())
+    lotes = [unicos[i:i + tamanho] for i in range(0, len(unicos), tamanho)]
+    if len(lotes) <= 1:
+        return _upsert_isolando_falhas(tabela, unicos, on_conflict) if unicos else ([], [])
+
+    salvos, falhas = [], []
+    with ThreadPoolExecutor(max_workers=min(paralelismo, len(lotes))) as executor:
+        # Cada thread roda numa cópia do contexto da requisição (contagem de chamadas em `g`)
+        futuros = [executor.submit(contextvars.copy_context().run, _upsert_isolando_falhas, tabela, lote, on_conflict)
+                   for lote in lotes]
+        try:
+            for futuro in futuros:
+                lote_salvos, lote_falhas = futuro.result()
+                salvos.extend(lote_salvos)
+                falhas.extend(lote_falhas)
+        except Exception:
+            for futuro in futuros:
+                futuro.cancel()  # falha do lote inteiro: os que ainda não saíram nem são enviados
+            raise
+    return salvos, falhas
+
+
+# =========================================================
+# IMPORTAÇÃO DE ALUNOS (planilha CSV / XLSX)
+# =========================================================
+
+# Cabeçalho da planilha (normalizado) -> campo da importação
+IMPORTACAO_ALUNOS_COLUNAS = {
+    'ra': 'ra', 'nome': 'nome', 'aluno': 'nome', 'nome do aluno': 'nome',
+    'sala': 'sala', 'turma': 'sala', 'sala_id': 'sala',
+    'tutor': 'tutor', 'tutor_id': 'tutor',
+}
+# Linhas válidas acumuladas antes de cada envio (o upsert_em_lotes ainda divide em lotes paralelos)
+IMPORTACAO_ALUNOS_BLOCO = LOTE_UPSERT_TAMANHO * LOTE_UPSERT_PARALELISMO
+
+def _normalizar_texto(valor):
+    """Texto para comparação: sem acentos, minúsculo e com espaços simples."""
+    sem_acentos = unicodedata.normalize('NFKD', str(valor)).encode('ascii', 'ignore').decode()
+    return ' '.join(sem_acentos.casefold().split())
+
+def _codificacao_csv(arquivo):
+    """'utf-8-sig' se o arquivo inteiro é UTF-8 válido; senão 'cp1252' (CSV salvo pelo Excel no Windows).
+
+    Decide antes de importar qualquer linha, lendo o arquivo em pedaços sem
+    guardá-lo, e volta ao início dele.
+    """
+    decodificador = codecs.getincrementaldecoder('utf-8')()
+    try:
+        for pedaco in iter(lambda: arquivo.read(1 << 16), b''):
+            decodificador.decode(pedaco)
+        decodificador.decode(b'', final=True)
+        return 'utf-8-sig'
+    except UnicodeDecodeError:
+        return 'cp1252'
+    finally:
+        arquivo.seek(0)
+
+def _linhas_csv(arquivo):
+    """Lê o CSV sob demanda; o separador (; , ou tab) é detectado pelo cabeçalho."""
+    texto = io.TextIOWrapper(arquivo, encoding=_codificacao_csv(arquivo), newline='')
+    cabecalho = texto.readline()
+    try:
+        dialeto = csv.Sniffer().sniff(cabecalho, delimiters=';,\t')
+    except csv.Error:
+        dialeto = csv.excel
+    yield next(csv.reader([cabecalho], dialeto), [])
+    yield from csv.reader(texto, dialeto)
+
+def _linhas_xlsx(arquivo):
+    if openpyxl is None:
+        raise ParametrosInvalidos("Importação de XLSX indisponível (openpyxl não instalado); envie um CSV.")
+    # read_only: as linhas são lidas da planilha conforme iteradas, sem carregar tudo
+    planilha = openpyxl.load_workbook(arquivo, read_only=True, data_only=True)
+    try:
+        for linha in planilha.active.iter_rows(values_only=True):
+            yield ['' if v is None else str(int(v)) if isinstance(v, float) and v.is_integer() else str(v) for v in linha]
+    finally:
+        planilha.close()
+
+def ler_planilha_alunos(arquivo, nome_arquivo):
+    """Valida o cabeçalho e retorna um gerador de (nº da linha na planilha, {campo: texto})."""
+    linhas = _linhas_xlsx(arquivo) if nome_arquivo.lower().endswith('.xlsx') else _linhas_csv(arquivo)
+    # "R.A.", "ra" e "RA " valem igual: a pontuação do cabeçalho é ignorada
+    cabecalho = [IMPORTACAO_ALUNOS_COLUNAS.get(re.sub(r'[^a-z0-9_ ]', '', _normalizar_texto(c))) for c in next(linhas, [])]
+    faltando = {'ra', 'nome', 'sala'} - set(cabecalho)
+    if faltando:
+        raise ParametrosInvalidos(f"Colunas obrigatórias ausentes no cabeçalho: {', '.join(sorted(faltando))}.")
+
+    def registros():
+        for numero, valores in enumerate(linhas, start=2):
+            registro = {campo: (valor or '').strip() for campo, valor in zip(cabecalho, valores) if campo}
+            if any(registro.values()):
+                yield numero, registro
+    return registros()
+
+
+# =========================================================
+# FREQUÊNCIA: TOTAIS DIÁRIOS POR SALA E POR ALUNO
+# =========================================================
+
+STATUS_FREQUENCIA = ('P', 'F', 'PA', 'PS', 'PAS')
+FREQUENCIA_RECONSTRUCAO_SEGUNDOS = int(os.environ.get("FREQUENCIA_RECONSTRUCAO_SEGUNDOS", "900"))
+
+class TotaisFrequencia:
+    """Totais de f_frequencia por status para um período (escola, sala ou aluno).
+
+    Os totais diários ficam no banco: f_frequencia_totais_diarios, mantida por
+    trigger, e a função totais_frequencia que soma o período
+    (supabase/migrations/20261018150000_totais_frequencia.sql).
+
+    Enquanto a migração não for aplicada, os totais de escola e sala são
+    contados aqui: um vetor de contagens por dia (uma posição por status de
+    STATUS_FREQUENCIA + "outros") e somas acumuladas reaproveitadas até a
+    próxima escrita no escopo, então um período custa duas buscas binárias e
+    uma subtração. Cada escrita reconta só os dias (sala, data) que alterou; a
+    carga completa é refeita em segundo plano quando expira
+    (FREQUENCIA_RECONSTRUCAO_SEGUNDOS), para absorver alterações de outros
+    workers ou feitas direto no banco. Os de um aluno são contados direto em
+    f_frequencia (poucas linhas por período).
+    """
+
+    def __init__(self, intervalo_reconstrucao):
+        self.intervalo_reconstrucao = intervalo_reconstrucao
+        self._lock = threading.RLock()
+        self._reconstruir_em = 0
+        self._reconstrucao = ReconstrucaoUnica(self.reconstruir)
+        self._diarios = {}    # (escopo, id) -> {data: [contagens]}
+        self._acumulados = {} # (escopo, id) -> (datas ordenadas, somas acumuladas)
+        self._relendo = None  # dias escritos durante uma reconstrução, recontados ao fim dela
+
+    @staticmethod
+    def _posicao(status):
+        return STATUS_FREQUENCIA.index(status) if status in STATUS_FREQUENCIA else len(STATUS_FREQUENCIA)
+
+    @classmethod
+    def _contagens(cls, linhas):
+        contagens = [0] * (len(STATUS_FREQUENCIA) + 1)
+        for r in linhas:
+            contagens[cls._posicao(r.get('status'))] += 1
+        return contagens
+
+    def _definir_dia(self, sala_id, data, contagens):
+        """Troca as contagens de (sala, data), ajustando o total da escola pela diferença."""
+        anterior = self._diarios.setdefault(('sala', sala_id), {}).pop(data, None) or [0] * len(contagens)
+        if any(contagens):
+            self._diarios[('sala', sala_id)][data] = contagens
+        escola = self._diarios.setdefault(('escola', None), {})
+        dia = [e + n - a for e, n, a in zip(escola.get(data, [0] * len(contagens)), contagens, anterior)]
+        if any(dia):
+            escola[data] = dia
+        else:
+            escola.pop(data, None)
+        self._acumulados.pop(('sala', sala_id), None)
+        self._acumulados.pop(('escola', None), None)
+
+    def _recontar(self, dias):
+        por_sala = {}
+        for sala_id, data in dias:
+            por_sala.setdefault(sala_id, set()).add(data)
+        try:
+            for sala_id, datas in por_sala.items():
+                linhas = buscar_todas(lambda: supabase.table('f_frequencia').select('id, data, status')
+                                      .eq('fk_sala_id', sala_id).in_('data', sorted(datas)).order('id'))
+                with self._lock:
+                    for data in datas:
+                        self._definir_dia(sala_id, data, self._contagens(r for r in linhas if r.get('data') == data))
+        except Exception as e:
+            # A escrita já foi gravada; os totais ficam para a próxima reconstrução
+            logging.warning(f"[FREQUÊNCIA] Falha ao recontar totais diários ({e}); reconstrução antecipada")
+            self.invalidar()
+
+    def registrar(self, dias):
+        """Reconta os dias (sala_id, data) alterados por uma escrita da aplicação."""
+        if not rpc_ausente('totais_frequencia'):
+            return  # o trigger já atualizou o banco
+        dias = set(dias)
+        with self._lock:
+            if self._relendo is not None:
+                self._relendo |= dias
+                return
+            if not self._reconstrucao.concluida_em:
+                return  # nada carregado ainda: a primeira carga lê tudo
+        self._recontar(dias)
+
+    def reconstruir(self):
+        with self._lock:
+            self._relendo = set()
+        try:
+            linhas = buscar_todas(lambda: supabase.table('f_frequencia').select('id, fk_sala_id, data, status').order('id'))
+            diarios = {}
+            for r in linhas:
+                posicao = self._posicao(r.get('status'))
+                for chave in (('escola', None), ('sala', r.get('fk_sala_id'))):
+                    diarios.setdefault(chave, {}).setdefault(r.get('data'), [0] * (len(STATUS_FREQUENCIA) + 1))[posicao] += 1
+            with self._lock:
+                self._diarios, self._acumulados = diarios, {}
+                self._reconstruir_em = time.monotonic() + self.intervalo_reconstrucao
+        finally:
+            with self._lock:
+                pendentes, self._relendo = self._relendo, None
+        if pendentes:
+            self._recontar(pendentes)
+        logging.info(f"[FREQUÊNCIA] Totais diários reconstruídos a partir de {len(linhas)} registros")
+
+    def invalidar(self):
+        with self._lock:
+            self._reconstruir_em = 0
+
+    def _acumulado(self, chave):
+        if chave not in self._acumulados:
+            diario = self._diarios.get(chave, {})
+            datas = sorted(diario)
+            somas = np.zeros((len(datas) + 1, len(STATUS_FREQUENCIA) + 1), dtype=np.int64)
+            if datas:
+                np.cumsum([diario[d] for d in datas], axis=0, out=somas[1:])
+            self._acumulados[chave] = (datas, somas)
+        return self._acumulados[chave]
+
+    def _totais_banco(self, escopo, id_escopo, data_inicial, data_final):
+        """Contagens pela função totais_frequencia; None se ela ainda não existe no banco."""
+        resp = chamar_rpc_opcional('totais_frequencia', {
+            'p_sala_id': id_escopo if escopo == 'sala' else None,
+            'p_aluno_id': id_escopo if escopo == 'aluno' else None,
+            'p_data_inicial': data_inicial, 'p_data_final': data_final,
+        }, '20261018150000_totais_frequencia.sql', "contagem em memória em cada worker")
+        if resp is None:
+            return None
+        contagens = [0] * (len(STATUS_FREQUENCIA) + 1)
+        for r in handle_supabase_response(resp):
+            contagens[self._posicao(r['status'])] += int(r['total'])
+        return contagens
+
+    def totais(self, escopo, id_escopo=None, data_inicial=None, data_final=None):
+        """Contagem por status no período (datas ISO, inclusivas) para 'escola', 'sala' ou 'aluno'."""
+        contagens = self._totais_banco(escopo, id_escopo, data_inicial, data_final)
+        if contagens is None and escopo == 'aluno':
+            consulta = supabase.table('f_frequencia').select('id, status').eq('fk_aluno_id', id_escopo)
+            if data_inicial:
+                consulta = consulta.gte('data', data_inicial)
+            if data_final:
+                consulta = consulta.lte('data', data_final)
+            contagens = self._contagens(buscar_todas(lambda: consulta.order('id')))
+        elif contagens is None:
+            self._reconstrucao.executar_em_segundo_plano(lambda: time.monotonic() >= self._reconstruir_em)
+            with self._lock:
+                datas, somas = self._acumulado((escopo, id_escopo))
+                inicio = bisect.bisect_left(datas, data_inicial) if data_inicial else 0
+                fim = bisect.bisect_right(datas, data_final) if data_final else len(datas)
+                contagens = somas[max(fim, inicio)] - somas[inicio]
+        return dict(zip(STATUS_FREQUENCIA + ('outros',), (int(c) for c in contagens)))
+
+def resumo_frequencia(contagens):
+    """Totais e percentuais a partir das contagens por status."""
+    total = sum(contagens.values())
+    presencas = total - contagens['F'] - contagens['outros']
+
+    def percentual(valor):
+        return round(100 * valor / total, 1) if total else 0
+
+    return {
+        'total_registros': total,
+        'totais': {s: contagens[s] for s in STATUS_FREQUENCIA},
+        'percentuais': {s: percentual(contagens[s]) for s in STATUS_FREQUENCIA},
+        'presencas_percentual': percentual(presencas),
+        'faltas_totais': contagens['F'],
+        'atrasos_totais': contagens['PA'] + contagens['PAS'],
+        'saidas_antecipadas_totais': contagens['PS'] + contagens['PAS'],
+    }
+
+totais_frequencia = TotaisFrequencia(FREQUENCIA_RECONSTRUCAO_SEGUNDOS)
+
+
 # =========================================================
 # ROTAS DE PÁGINA PRINCIPAIS (Renderiza templates)
 # =========================================================
@@ -134,7 +2085,7 @@ def gestao_relatorio_estatistico():
 @app.route('/gestao_relatorio_frequencia')
 def gestao_relatorio_frequencia():
     # ROTA CORRIGIDA: Aponta para o arquivo que contém a lógica de filtro/tabela de frequência
-    return render_template('gestao_relatorio_frequencia (4).html') 
+    return render_template('gestao_relatorio_frequencia.html')
 
 @app.route('/gestao_relatorio_impressao')
 def gestao_relatorio_impressao():
@@ -249,7 +2200,13 @@ def gestao_cadastro_vincular_disciplina_sala():
 # ROTAS DE API (DADOS)
 # =========================================================
 
+@app.route('/api/status_pool_supabase', methods=['GET'])
+def api_status_pool_supabase():
+    """Conexões do pool HTTP do Supabase neste worker (cada worker tem o seu)."""
+    return jsonify(supabase.estatisticas())
+
 @app.route('/api/salas', methods=['GET'])
+@versionado('d_salas')
 def api_get_salas():
     try:
         response = supabase.table('d_salas').select('id, sala, nivel_ensino').order('sala').execute()
@@ -259,6 +2216,7 @@ def api_get_salas():
         return jsonify({"error": f"Erro ao buscar salas: {e}", "status": 500}), 500
 
 @app.route('/api/funcionarios', methods=['GET'])
+@versionado('d_funcionarios')
 def api_get_funcionarios():
     try:
         response = supabase.table('d_funcionarios').select('id, nome, funcao, is_tutor, email').order('nome').execute()
@@ -273,9 +2231,7 @@ def api_get_alunos_por_sala(sala_id):
         sala_id_bigint = int(sala_id)
         response_alunos = supabase.table('d_alunos').select('id, nome, tutor_id').eq('sala_id', sala_id_bigint).order('nome').execute()
         alunos_raw = handle_supabase_response(response_alunos)
-        response_tutores = supabase.table('d_funcionarios').select('id, nome').eq('is_tutor', True).execute()
-        tutores_raw = handle_supabase_response(response_tutores)
-        tutores_dict = {str(t['id']): t['nome'] for t in tutores_raw}
+        tutores_dict = cache_dimensoes.tutores()
         alunos = []
         for a in alunos_raw:
             tutor_id_str = str(a['tutor_id']) if a.get('tutor_id') else None
@@ -292,6 +2248,7 @@ def api_get_alunos_por_sala(sala_id):
         return jsonify({"error": f"Erro ao buscar alunos por sala: {e}", "status": 500}), 500
 
 @app.route('/api/tutores', methods=['GET'])
+@versionado('d_funcionarios')
 def api_get_tutores():
     try:
         response = supabase.table('d_funcionarios').select('id, nome, email, funcao').eq('is_tutor', True).order('nome').execute()
@@ -304,19 +2261,68 @@ def api_get_tutores():
 
 @app.route('/api/relatorio_frequencia')
 def api_relatorio_frequencia():
-    # Simulação de dados para a rota de relatório
+    """Totais P/F/PA/PS/PAS e percentuais de um aluno, de uma sala ou da escola no período."""
     try:
-        sala_id = request.args.get('salaId')
-        aluno_id = request.args.get('alunoId')
-        data_inicial = request.args.get('dataInicial')
-        data_final = request.args.get('dataFinal')
+        sala_id = _int_ou_none(request.args.get('salaId'), 'sala')
+        aluno_id = _int_ou_none(request.args.get('alunoId'), 'aluno')
+        data_inicial = _dia_ou_none(request.args.get('dataInicial'), 'dataInicial')
+        data_final = _dia_ou_none(request.args.get('dataFinal'), 'dataFinal')
+        if aluno_id is not None:
+            escopo, id_escopo = 'aluno', aluno_id
+        elif sala_id is not None:
+            escopo, id_escopo = 'sala', sala_id
+        else:
+            escopo, id_escopo = 'escola', None
+        contagens = totais_frequencia.totais(escopo, id_escopo, data_inicial, data_final)
+        return jsonify({'escopo': escopo, 'id': id_escopo, **resumo_frequencia(contagens)})
+    except ParametrosInvalidos as e:
+        return jsonify({"error": str(e), "status": 400}), 400
+    except Exception as e:
+        return jsonify({"error": f"Erro ao gerar relatório de frequência: {e}", "status": 500}), 500
+
+@app.route('/api/relatorio_frequencia_mensal')
+def api_relatorio_frequencia_mensal():
+    """Alunos da sala e registros do mês para a grade de gestao_relatorio_frequencia.html.
+
+    ?formato=compacto troca `alunos`/`frequencias` pela matriz compacta de
+    frequencia_compacta (decodificada por static/js/frequencia_compacta.js),
+    que é o que a página usa.
+    """
+    try:
+        sala_id = request.args.get('sala_id', type=int)
+        ano = request.args.get('year', type=int)
+        mes = request.args.get('month', type=int)
+        if not sala_id or not ano or not mes:
+            return jsonify({"error": "Parâmetros sala_id, year e month são obrigatórios.", "status": 400}), 400
+
+        data_inicio = date(ano, mes, 1).isoformat()
+        data_fim = date(ano, mes, monthrange(ano, mes)[1]).isoformat()
+
+        resp_alunos = supabase.table('d_alunos').select('id, nome').eq('sala_id', sala_id).order('nome').execute()
+        alunos = handle_supabase_response(resp_alunos)
+        aluno_ids = [a['id'] for a in alunos]
+
+        frequencias = []
+        if aluno_ids:
+            colunas = 'fk_aluno_id, data, status, hora_atraso, motivo_atraso, hora_saida, motivo_saida'
+            frequencias = buscar_todas(lambda: supabase.table('f_frequencia').select(colunas)
+                                       .in_('fk_aluno_id', aluno_ids).gte('data', data_inicio).lte('data', data_fim)
+                                       .order('fk_aluno_id').order('data'))
+        if request.args.get('formato') == 'compacto':
+            corpo = frequencia_compacta(alunos, frequencias, ano, mes)
+        else:
+            for r in frequencias:
+                r['aluno_id'] = r.pop('fk_aluno_id')
+            corpo = {'alunos': alunos, 'frequencias': frequencias}
+
         return jsonify({
-            'presencas_percentual': 92,
-            'faltas_totais': 5,
-            'atrasos_totais': 2,
-            'saidas_antecipadas_totais': 1
-        })
+            'sala_id': sala_id,
+            'sala_nome': cache_dimensoes.campo('d_salas', sala_id, 'sala'),
+            **corpo,
+            'resumo': resumo_frequencia(totais_frequencia.totais('sala', sala_id, data_inicio, data_fim)),
+        }), 200
     except Exception as e:
+        logging.exception("Erro ao gerar relatório mensal de frequência")
         return jsonify({"error": f"Erro ao gerar relatório de frequência: {e}", "status": 500}), 500
 
 @app.route('/api/frequencia/datas_registradas_por_sala/<int:sala_id>')
@@ -339,6 +2345,7 @@ def api_get_alunos_por_tutor(tutor_id):
         return jsonify({"error": f"Erro ao buscar alunos por tutor: {e}", "status": 500}), 500
 
 @app.route('/api/disciplinas', methods=['GET'])
+@versionado('d_disciplinas')
 def api_get_disciplinas():
     try:
         response = supabase.table('d_disciplinas').select('id, nome').order('nome').execute()
@@ -348,6 +2355,7 @@ def api_get_disciplinas():
         return jsonify({"error": f"Erro ao buscar disciplinas: {e}", "status": 500}), 500
 
 @app.route('/api/clubes', methods=['GET'])
+@versionado('d_clubes')
 def api_get_clubes():
     try:
         response = supabase.table('d_clubes').select('id, nome, semestre').order('semestre, nome').execute()
@@ -357,6 +2365,7 @@ def api_get_clubes():
         return jsonify({"error": f"Erro ao buscar clubes: {e}", "status": 500}), 500
 
 @app.route('/api/eletivas', methods=['GET'])
+@versionado('d_eletivas')
 def api_get_eletivas():
     try:
         response = supabase.table('d_eletivas').select('id, nome, semestre').order('semestre, nome').execute()
@@ -366,6 +2375,7 @@ def api_get_eletivas():
         return jsonify({"error": f"Erro ao buscar eletivas: {e}", "status": 500}), 500
 
 @app.route('/api/inventario', methods=['GET'])
+@versionado('d_inventario_equipamentos')
 def api_get_inventario():
     try:
         response = supabase.table('d_inventario_equipamentos').select('id, colmeia, equipamento_id, status').order('colmeia, equipamento_id').execute()
@@ -393,79 +2403,317 @@ def api_get_agendamentos_pendentes(professor_id):
     except Exception as e:
         return jsonify({"error": f"Erro ao buscar agendamentos pendentes: {e}", "status": 500}), 500
 
+def _formatar_ocorrencia_listagem(item):
+    """Monta a linha exibida nas listagens, com o status derivado (somente leitura)."""
+    status, alteracoes = reconciliar_ocorrencia(item)
+    return {
+        "numero": item.get('numero'),
+        "data_hora": formatar_data_hora(item.get('data_hora')),
+        "aluno_nome": item.get('aluno_nome', 'N/A'),
+        "tutor_nome": item.get('tutor_nome', 'N/A'),
+        "professor_nome": item.get('professor_nome') or 'N/A',
+        "sala_nome": item.get('sala_nome') or 'N/A',
+        "status": status,
+        "solicitado_tutor": _to_bool(item.get('solicitado_tutor')),
+        "solicitado_coordenacao": _to_bool(item.get('solicitado_coordenacao')),
+        "solicitado_gestao": _to_bool(item.get('solicitado_gestao')),
+        "atendimento_tutor": alteracoes.get('atendimento_tutor', (item.get('atendimento_tutor') or "").strip()),
+        "atendimento_coordenacao": alteracoes.get('atendimento_coordenacao', (item.get('atendimento_coordenacao') or "").strip()),
+        "atendimento_gestao": alteracoes.get('atendimento_gestao', (item.get('atendimento_gestao') or "").strip())
+    }
+
+# ---------------------------------------------------------
+# Leituras compartilhadas com o modo ASGI (asgi.py)
+#
+# Cada plano recebe os argumentos e um cliente (o global ou o AsyncClient) e
+# devolve (query, montar): quem chama executa a query — com ou sem await — e
+# `montar(resposta)` produz (corpo, cabeçalhos). Assim as duas formas de servir
+# a rota compartilham filtros, paginação e formatação.
+# ---------------------------------------------------------
+
+def plano_ocorrencias_por_status(args, status, cliente=None):
+    # Somente leitura: a normalização no banco é feita na escrita e pelo reconciliador em lote
+    q = filtrar_ocorrencias(LEITURA_OCORRENCIAS_LISTAGEM.consulta(cliente), args, status=status)
+    q, limite = paginar_ocorrencias(q, args)
+
+    def montar(resp):
+        linhas = LEITURA_OCORRENCIAS_LISTAGEM.linhas(resp)
+        # Uma fonte só: a coluna gravada decide a lista e o status exibido. Filtrar
+        # de novo pelo status derivado sumiria com a linha das duas listas enquanto
+        # o reconciliador em lote não a regrava.
+        ocorrencias = [{**_formatar_ocorrencia_listagem(o), "status": o.get('status') or status} for o in linhas]
+        return ocorrencias, cabecalhos_pagina(linhas, limite)
+    return q, montar
+
+def plano_ocorrencias_lista(args, cliente=None):
+    q = filtrar_ocorrencias((cliente or supabase).table('ocorrencias').select('*'), args)
+    q, limite = paginar_ocorrencias(q, args)
+
+    def montar(resp):
+        linhas = handle_supabase_response(resp)
+        return linhas, cabecalhos_pagina(linhas, limite)
+    return q, montar
+
+def plano_ocorrencia_detalhe(ocorrencia_id, cliente=None):
+    q = LEITURA_OCORRENCIA_DETALHE.consulta(cliente).eq('numero', int(ocorrencia_id)).single()
+
+    def montar(resp):
+        data = LEITURA_OCORRENCIA_DETALHE.achatar(handle_supabase_response(resp))
+        if data and isinstance(data, dict):
+            data['id'] = data.get('numero')
+            data['professor_nome'] = data.get('professor_nome') or 'N/A'
+            data['sala_nome'] = data.get('sala_nome') or 'N/A'
+        return data, {}
+    return q, montar
+
+def plano_frequencia_status(args, cliente=None):
+    sala_id = args.get('sala_id')
+    data = args.get('data')
+    if not sala_id or not data:
+        raise ParametrosInvalidos("Parâmetros sala_id e data são obrigatórios.")
+    sala_id = _int_ou_none(sala_id, 'sala_id')
+    _data_iso(data, 'data')
+    # Busca qualquer registro para aquela sala e data
+    q = (cliente or supabase).table('f_frequencia').select('id').eq('fk_sala_id', sala_id).eq('data', data).limit(1)
+
+    def montar(resp):
+        return {"registrada": len(handle_supabase_response(resp)) > 0}, {}
+    return q, montar
+
+def responder_plano(plano):
+    """Executa um plano com o cliente síncrono e monta a resposta Flask."""
+    q, montar = plano
+    corpo, cabecalhos = montar(q.execute())
+    resposta = jsonify(corpo)
+    resposta.headers.update(cabecalhos)
+    return resposta
+
+# ---------------------------------------------------------
+# Eventos das ocorrências (Server-Sent Events)
+#
+# O painel de ocorrências abertas recebe as mudanças por push em vez de
+# recarregar a lista inteira. Cada escrita numa ocorrência publica a linha já
+# formatada (a mesma de /api/ocorrencias_abertas) num log compartilhado pelos
+# workers; cada worker acompanha o log e repassa às conexões SSE abertas nele.
+# ---------------------------------------------------------
+
+EVENTOS_DIR = os.environ.get("EVENTOS_DIR", os.path.join(tempfile.gettempdir(), "gestao_eventos"))
+EVENTOS_MAX_BYTES = int(os.environ.get("EVENTOS_MAX_BYTES", str(4 * 1024 * 1024)))
+EVENTOS_MEMORIA = 2000  # eventos recentes guardados por worker para retomar pelo Last-Event-ID
+EVENTOS_INTERVALO_SEGUNDOS = float(os.environ.get("EVENTOS_INTERVALO_SEGUNDOS", "0.5"))
+EVENTOS_PING_SEGUNDOS = 15
+# A conexão é encerrada depois desse tempo; o EventSource reconecta sozinho (com Last-Event-ID)
+EVENTOS_CONEXAO_MAX_SEGUNDOS = int(os.environ.get("EVENTOS_CONEXAO_MAX_SEGUNDOS", "300"))
+# Fluxos abertos ao mesmo tempo por worker. Cada um prende uma thread do gthread
+# (gunicorn.conf.py) enquanto espera eventos; o padrão, 1/4 das threads, deixa
+# as demais para as requisições comuns. Acima do limite a resposta é 503 e o
+# painel tenta de novo depois de EVENTOS_OCUPADO_RETRY_SEGUNDOS.
+EVENTOS_MAX_CONEXOES = int(os.environ.get("EVENTOS_MAX_CONEXOES", str(max(1, int(os.environ.get("GUNICORN_THREADS", "8")) // 4))))
+EVENTOS_OCUPADO_RETRY_SEGUNDOS = 30
+_conexoes_eventos = threading.BoundedSemaphore(EVENTOS_MAX_CONEXOES)
+
+class CanalEventos:
+    """Difusão de eventos entre os workers por um log em arquivo (uma linha JSON por evento).
+
+    `publicar` acrescenta a linha com uma única escrita sob flock; em cada
+    worker uma thread lê o que foi acrescentado e acorda as conexões que estão
+    esperando. O id de um evento é "<inode>-<posição final no arquivo>", então
+    o Last-Event-ID vale em qualquer worker. Acima de EVENTOS_MAX_BYTES o log é
+    rotacionado (novo inode); quem estava no log anterior, ou perdeu eventos
+    que já saíram da memória, recebe `reinicio` e recarrega a lista.
+    """
+
+    def __init__(self, diretorio, max_bytes):
+        self.diretorio = diretorio
+        self.caminho = os.path.join(diretorio, "ocorrencias.log")
+        self.max_bytes = max_bytes
+        self._cond = threading.Condition()
+        self._eventos = deque(maxlen=EVENTOS_MEMORIA)  # (inode, início, fim, dados)
+        self._inode = None
+        self._posicao = 0
+        self._pid = None
+
+    def _abrir_atual(self):
+        """Abre o log vigente para acréscimo, com o lock exclusivo já obtido."""
+        os.makedirs(self.diretorio, exist_ok=True)
+        while True:
+            fd = os.open(self.caminho, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            # Outro processo pode ter rotacionado o log enquanto esperávamos o lock
+            try:
+                if os.stat(self.caminho).st_ino == os.fstat(fd).st_ino:
+                    return fd
+            except FileNotFoundError:
+                pass
+            os.close(fd)
+
+    def publicar(self, dados):
+        linha = (json.dumps(dados, ensure_ascii=False, default=str) + "\n").encode()
+        fd = self._abrir_atual()
+        try:
+            if os.fstat(fd).st_size + len(linha) > self.max_bytes:
+                os.replace(self.caminho, self.caminho + ".1")
+                os.close(fd)
+                fd = self._abrir_atual()
+            os.write(fd, linha)
+        finally:
+            os.close(fd)
+
+    def ultimo_id(self):
+        """Id do fim do log agora: quem começa daqui recebe só o que for publicado depois."""
+        os.makedirs(self.diretorio, exist_ok=True)
+        fd = os.open(self.caminho, os.O_RDONLY | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_SH)
+            info = os.fstat(fd)
+        finally:
+            os.close(fd)
+        return f"{info.st_ino}-{info.st_size}"
+
+    def _garantir_leitor(self):
+        # Uma thread por processo, criada no próprio worker (após o fork do gunicorn)
+        if self._pid == os.getpid():
+            return
+        with self._cond:
+            if self._pid == os.getpid():
+                return
+            self._eventos.clear()
+            self._inode, self._posicao = None, 0
+            threading.Thread(target=self._laco_leitor, name='eventos-ocorrencias', daemon=True).start()
+            self._pid = os.getpid()
+
+    def _laco_leitor(self):
+        arquivo = None
+        while True:
+            try:
+                arquivo = self._ler_novos(arquivo)
+            except Exception as e:
+                logging.error(f"[EVENTOS] Falha ao ler o log de eventos: {e}")
+            time.sleep(EVENTOS_INTERVALO_SEGUNDOS)
+
+    def _ler_novos(self, arquivo):
+        try:
+            inode = os.stat(self.caminho).st_ino
+        except FileNotFoundError:
+            return arquivo
+        if arquivo is None or inode != self._inode:
+            if arquivo is not None:
+                # Termina o log rotacionado antes de passar ao novo
+                self._consumir(arquivo)
+                arquivo.close()
+            arquivo = open(self.caminho, 'rb')
+            with self._cond:
+                self._inode, self._posicao = os.fstat(arquivo.fileno()).st_ino, 0
+                self._cond.notify_all()
+        self._consumir(arquivo)
+        return arquivo
+
+    def _consumir(self, arquivo):
+        arquivo.seek(self._posicao)
+        novos = []
+        posicao = self._posicao
+        for linha in arquivo:
+            if not linha.endswith(b"\n"):
+                break  # escrita ainda incompleta
+            novos.append((self._inode, posicao, posicao + len(linha), linha[:-1].decode()))
+            posicao += len(linha)
+        if novos:
+            with self._cond:
+                self._eventos.extend(novos)
+                self._posicao = posicao
+                self._cond.notify_all()
+
+    def aguardar(self, ultimo, espera):
+        """Eventos publicados depois do id `ultimo`, esperando até `espera` segundos.
+
+        Retorna (eventos, reinicio): `eventos` é uma lista de (id, dados) e
+        `reinicio` indica que a sequência desde `ultimo` não pode ser reconstituída.
+        """
+        self._garantir_leitor()
+        try:
+            inode, posicao = (int(p) for p in ultimo.split('-'))
+        except (AttributeError, ValueError):
+            return [], True
+        limite = time.monotonic() + espera
+        with self._cond:
+            while True:
+                if self._inode is not None:
+                    if inode != self._inode:
+                        return [], True
+                    mesmos = [e for e in self._eventos if e[0] == inode]
+                    if mesmos and mesmos[0][1] > posicao:
+                        return [], True  # parte dos eventos já saiu da memória deste worker
+                    novos = [(f"{i}-{fim}", dados) for i, _, fim, dados in mesmos if fim > posicao]
+                    if novos:
+                        return novos, False
+                restante = limite - time.monotonic()
+                if restante <= 0:
+                    return [], False
+                self._cond.wait(restante)
+
+canal_ocorrencias = CanalEventos(EVENTOS_DIR, EVENTOS_MAX_BYTES)
+
+def publicar_evento_ocorrencia(numero, acao):
+    """Publica a linha atual da ocorrência (formato da listagem) para os painéis abertos.
+
+    Falhas são só registradas: a escrita que originou o evento já foi concluída.
+    """
+    try:
+        resp = LEITURA_OCORRENCIAS_LISTAGEM.consulta().eq('numero', int(numero)).execute()
+        linhas = LEITURA_OCORRENCIAS_LISTAGEM.linhas(resp)
+        ocorrencia = _formatar_ocorrencia_listagem(linhas[0]) if linhas else None
+        canal_ocorrencias.publicar({"acao": acao, "numero": int(numero), "ocorrencia": ocorrencia})
+    except Exception as e:
+        logging.warning(f"[EVENTOS] Falha ao publicar evento da ocorrência {numero}: {e}")
+
+@app.route('/api/ocorrencias_eventos', methods=['GET'])
+def api_ocorrencias_eventos():
+    """Fluxo text/event-stream com as mudanças das ocorrências.
+
+    Eventos: `pronto` (conexão nova, com o id de partida), `ocorrencia`
+    ({acao, numero, ocorrencia}) e `reinicio` (a lista deve ser recarregada).
+    Com EVENTOS_MAX_CONEXOES fluxos já abertos neste worker, responde 503.
+    """
+    if not _conexoes_eventos.acquire(blocking=False):
+        resposta = Response(f"retry: {EVENTOS_OCUPADO_RETRY_SEGUNDOS * 1000}\n\n", status=503, mimetype='text/event-stream')
+        resposta.headers['Retry-After'] = str(EVENTOS_OCUPADO_RETRY_SEGUNDOS)
+        return resposta
+    ultimo = request.headers.get('Last-Event-ID') or request.args.get('desde')
+    try:
+        atual = ultimo or canal_ocorrencias.ultimo_id()
+    except OSError as e:
+        _conexoes_eventos.release()
+        logging.error(f"[EVENTOS] Log de eventos indisponível: {e}")
+        return jsonify({"error": f"Eventos indisponíveis: {e}", "status": 500}), 500
+
+    def gerar(atual):
+        yield "retry: 3000\n\n"
+        if not ultimo:
+            yield f"id: {atual}\nevent: pronto\ndata: {{}}\n\n"
+        fim = time.monotonic() + EVENTOS_CONEXAO_MAX_SEGUNDOS
+        while time.monotonic() < fim:
+            eventos, reinicio = canal_ocorrencias.aguardar(atual, EVENTOS_PING_SEGUNDOS)
+            if reinicio:
+                atual = canal_ocorrencias.ultimo_id()
+                yield f"id: {atual}\nevent: reinicio\ndata: {{}}\n\n"
+            elif not eventos:
+                yield ": ping\n\n"
+            for atual, dados in eventos:
+                yield f"id: {atual}\nevent: ocorrencia\ndata: {dados}\n\n"
+
+    resposta = Response(stream_with_context(gerar(atual)), mimetype='text/event-stream')
+    # Libera a vaga ao fechar a resposta, mesmo se o cliente sair antes do primeiro evento
+    resposta.call_on_close(_conexoes_eventos.release)
+    resposta.headers['Cache-Control'] = 'no-cache'
+    resposta.headers['X-Accel-Buffering'] = 'no'  # sem buffer em proxies (nginx)
+    return resposta
+
 @app.route('/api/ocorrencias_abertas', methods=['GET'])
 def api_ocorrencias_abertas():
     try:
-        # Consulta principal, buscando todos os campos necessários
-        resp = supabase.table('ocorrencias').select(
-            "numero, data_hora, status, aluno_nome, tutor_nome, solicitado_tutor, solicitado_coordenacao, solicitado_gestao, atendimento_tutor, atendimento_coordenacao, atendimento_gestao, professor_id(nome), sala_id(sala)"
-        ).order('data_hora', desc=True).execute()
-
-        items = resp.data or []
-        abertas = []
-
-        for item in items:
-            numero = item.get('numero')
-            update_fields = {}
-
-            st = _to_bool(item.get('solicitado_tutor'))
-            sc = _to_bool(item.get('solicitado_coordenacao'))
-            sg = _to_bool(item.get('solicitado_gestao'))
-
-            at_tutor = (item.get('atendimento_tutor') or "").strip()
-            at_coord = (item.get('atendimento_coordenacao') or "").strip()
-            at_gest = (item.get('atendimento_gestao') or "").strip()
-
-            # Preenche atendimento automático quando não solicitado
-            if not st and at_tutor == "":
-                at_tutor = DEFAULT_AUTOTEXT
-                update_fields['atendimento_tutor'] = at_tutor
-            if not sc and at_coord == "":
-                at_coord = DEFAULT_AUTOTEXT
-                update_fields['atendimento_coordenacao'] = at_coord
-            if not sg and at_gest == "":
-                at_gest = DEFAULT_AUTOTEXT
-                update_fields['atendimento_gestao'] = at_gest
-
-            pendente_tutor = st and (at_tutor == "")
-            pendente_coord = sc and (at_coord == "")
-            pendente_gestao = sg and (at_gest == "")
-
-            # Cálculo de status 
-            novo_status = "Aberta" if (pendente_tutor or pendente_coord or pendente_gestao) else "Finalizada"
-
-            # Atualiza status automaticamente no Supabase se necessário
-            if item.get('status') != novo_status:
-                update_fields['status'] = novo_status
-                try:
-                    supabase.table('ocorrencias').update(update_fields).eq('numero', numero).execute()
-                    logging.info(f"[OCORRÊNCIA] Nº {numero} atualizada → {novo_status}")
-                except Exception as e:
-                    logging.error(f"Falha ao atualizar ocorrência {numero}: {e}")
-
-            if novo_status == "Aberta":
-                # Extração segura dos nomes referenciados
-                professor_nome = (item.get('professor_id') or {}).get('nome', 'N/A')
-                sala_nome = (item.get('sala_id') or {}).get('sala', 'N/A')
-                
-                abertas.append({
-                    "numero": numero,
-                    "data_hora": formatar_data_hora(item.get('data_hora')),
-                    "aluno_nome": item.get('aluno_nome', 'N/A'),
-                    "tutor_nome": item.get('tutor_nome', 'N/A'),
-                    "professor_nome": professor_nome,
-                    "sala_nome": sala_nome,
-                    "status": novo_status,
-                    "solicitado_tutor": st,
-                    "solicitado_coordenacao": sc,
-                    "solicitado_gestao": sg,
-                    "atendimento_tutor": at_tutor,
-                    "atendimento_coordenacao": at_coord,
-                    "atendimento_gestao": at_gest
-                })
-
-        return jsonify(abertas), 200
-
+        return responder_plano(plano_ocorrencias_por_status(request.args, "Aberta")), 200
+    except ParametrosInvalidos as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         logging.exception("Erro /api/ocorrencias_abertas")
         return jsonify({"error": str(e)}), 500
@@ -474,89 +2722,9 @@ def api_ocorrencias_abertas():
 @app.route('/api/ocorrencias_finalizadas', methods=['GET'])
 def api_ocorrencias_finalizadas():
     try:
-        sala = request.args.get('sala')
-        aluno = request.args.get('aluno')
-
-        q = supabase.table('ocorrencias').select(
-            "numero, data_hora, status, aluno_nome, tutor_nome, solicitado_tutor, solicitado_coordenacao, solicitado_gestao, atendimento_tutor, atendimento_coordenacao, atendimento_gestao, professor_id(nome), sala_id(sala)"
-        ).order('data_hora', desc=True)
-        
-        # APLICAÇÃO DOS FILTROS (conversão para int para garantir a tipagem)
-        if sala:
-            try:
-                q = q.eq('sala_id', int(sala))
-            except ValueError:
-                logging.warning(f"Filtro de sala inválido: {sala}")
-        if aluno:
-            try:
-                q = q.eq('aluno_id', int(aluno))
-            except ValueError:
-                logging.warning(f"Filtro de aluno inválido: {aluno}")
-
-        resp = q.execute()
-        items = resp.data or []
-        finalizadas = []
-
-        for item in items:
-            numero = item.get('numero')
-            update_fields = {}
-
-            st = _to_bool(item.get('solicitado_tutor'))
-            sc = _to_bool(item.get('solicitado_coordenacao'))
-            sg = _to_bool(item.get('solicitado_gestao'))
-
-            at_tutor = (item.get('atendimento_tutor') or "").strip()
-            at_coord = (item.get('atendimento_coordenacao') or "").strip()
-            at_gest = (item.get('atendimento_gestao') or "").strip()
-
-            if not st and at_tutor == "":
-                at_tutor = DEFAULT_AUTOTEXT
-                update_fields['atendimento_tutor'] = at_tutor
-            if not sc and at_coord == "":
-                at_coord = DEFAULT_AUTOTEXT
-                update_fields['atendimento_coordenacao'] = at_coord
-            if not sg and at_gest == "":
-                at_gest = DEFAULT_AUTOTEXT
-                update_fields['atendimento_gestao'] = at_gest
-
-            pendente_tutor = st and (at_tutor == "")
-            pendente_coord = sc and (at_coord == "")
-            pendente_gestao = sg and (at_gest == "")
-
-            # Cálculo de status
-            novo_status = "Aberta" if (pendente_tutor or pendente_coord or pendente_gestao) else "Finalizada"
-
-            if item.get('status') != novo_status:
-                update_fields['status'] = novo_status
-                try:
-                    supabase.table('ocorrencias').update(update_fields).eq('numero', numero).execute()
-                    logging.info(f"[OCORRÊNCIA] Nº {numero} atualizada → {novo_status}")
-                except Exception as e:
-                    logging.error(f"Falha ao atualizar ocorrência {numero}: {e}")
-
-            if novo_status == "Finalizada":
-                # Extração segura dos nomes referenciados
-                professor_nome = (item.get('professor_id') or {}).get('nome', 'N/A')
-                sala_nome = (item.get('sala_id') or {}).get('sala', 'N/A')
-
-                finalizadas.append({
-                    "numero": numero,
-                    "data_hora": formatar_data_hora(item.get('data_hora')),
-                    "aluno_nome": item.get('aluno_nome', 'N/A'),
-                    "tutor_nome": item.get('tutor_nome', 'N/A'),
-                    "professor_nome": professor_nome,
-                    "sala_nome": sala_nome,
-                    "status": novo_status,
-                    "solicitado_tutor": st,
-                    "solicitado_coordenacao": sc,
-                    "solicitado_gestao": sg,
-                    "atendimento_tutor": at_tutor,
-                    "atendimento_coordenacao": at_coord,
-                    "atendimento_gestao": at_gest
-                })
-
-        return jsonify(finalizadas), 200
-
+        return responder_plano(plano_ocorrencias_por_status(request.args, "Finalizada")), 200
+    except ParametrosInvalidos as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         logging.exception("Erro /api/ocorrencias_finalizadas")
         return jsonify({"error": str(e)}), 500
@@ -564,8 +2732,12 @@ def api_ocorrencias_finalizadas():
 @app.route('/api/ocorrencias_todas')
 def api_ocorrencias_todas():
     try:
-        response = supabase.table('ocorrencias').select('*').order('data_hora', desc=True).execute()
-        return jsonify(handle_supabase_response(response))
+        if request.args.get('formato') in FORMATOS_STREAMING:
+            args = request.args.copy()
+            return transmitir_ocorrencias(lambda: filtrar_ocorrencias(supabase.table('ocorrencias').select('*'), args), args)
+        return responder_plano(plano_ocorrencias_lista(request.args))
+    except ParametrosInvalidos as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -631,22 +2803,15 @@ def get_relatorio_ocorrencias():
 @app.route('/api/ocorrencias/<ocorrencia_id>', methods=['GET'])
 def api_get_ocorrencias(ocorrencia_id=None):
     try:
-        select_query_detail = "numero, data_hora, descricao, atendimento_professor, atendimento_tutor, atendimento_coordenacao, atendimento_gestao, dt_atendimento_tutor, dt_atendimento_coordenacao, dt_atendimento_gestao, aluno_nome, tutor_nome, professor_id(nome), sala_id(sala)"
         if ocorrencia_id:
-            response = supabase.table('ocorrencias').select(select_query_detail).eq('numero', int(ocorrencia_id)).single().execute()
-            data = handle_supabase_response(response)
-            if data and isinstance(data, dict):
-                data['id'] = data.get('numero')
-                data['professor_nome'] = data.get('professor_id', {}).get('nome', 'N/A')
-                data['sala_nome'] = data.get('sala_id', {}).get('sala', 'N/A')
-                if 'professor_id' in data:
-                    del data['professor_id']
-                if 'sala_id' in data:
-                    del data['sala_id']
-            return jsonify(data), 200
+            return responder_plano(plano_ocorrencia_detalhe(ocorrencia_id)), 200
+        elif request.args.get('formato') in FORMATOS_STREAMING:
+            args = request.args.copy()
+            return transmitir_ocorrencias(lambda: filtrar_ocorrencias(supabase.table('ocorrencias').select('*'), args), args)
         else:
-            response = supabase.table('ocorrencias').select('*').order('data_hora', desc=True).execute()
-            return jsonify(handle_supabase_response(response)), 200
+            return responder_plano(plano_ocorrencias_lista(request.args)), 200
+    except ParametrosInvalidos as e:
+        return jsonify({"error": str(e), "status": 400}), 400
     except Exception as e:
         logging.error(f"Erro ao buscar ocorrência de detalhe: {e}")
         return jsonify({"error": f"Falha ao buscar detalhes: {e}", "status": 500}), 500
@@ -659,16 +2824,8 @@ def api_get_alunos_all():
         alunos = []
         for a in alunos_raw:
             try:
-                sala_nome = None
-                tutor_nome = None
-                if a.get('sala_id'):
-                    sala_resp = supabase.table('d_salas').select('sala').eq('id', a['sala_id']).single().execute()
-                    sala_data = handle_supabase_response(sala_resp)
-                    sala_nome = sala_data.get('sala') if isinstance(sala_data, dict) else None
-                if a.get('tutor_id'):
-                    tut_resp = supabase.table('d_funcionarios').select('nome').eq('id', a['tutor_id']).single().execute()
-                    tut_data = handle_supabase_response(tut_resp)
-                    tutor_nome = tut_data.get('nome') if isinstance(tut_data, dict) else None
+                sala_nome = cache_dimensoes.campo('d_salas', a.get('sala_id'), 'sala')
+                tutor_nome = cache_dimensoes.campo('d_funcionarios', a.get('tutor_id'), 'nome')
                 alunos.append({
                     "id": str(a.get('id')),
                     "ra": a.get('ra'),
@@ -696,6 +2853,7 @@ def api_get_vinculacoes_disciplinas(sala_id):
         return jsonify({"error": f"Erro ao buscar vínculos de disciplinas: {e}", "status": 500}), 500
 
 @app.route('/api/horarios_fixos/<nivel_ensino>', methods=['GET'])
+@versionado('d_horarios_fixos')
 def api_get_horarios_fixos(nivel_ensino):
     try:
         response = supabase.table('d_horarios_fixos').select('*').eq('nivel_ensino', nivel_ensino).order('dia_semana').execute()
@@ -711,28 +2869,18 @@ def api_get_agenda_semanal():
     if not sala_id or not data_referencia:
         return jsonify({"error": "Parâmetros sala_id e data_referencia são obrigatórios.", "status": 400}), 400
     try:
-        response = supabase.table('f_agenda_aulas').select('id, dia_semana, ordem_aula, tema_aula, tipo_aula, fk_disciplina_id, fk_professor_id').eq('fk_sala_id', int(sala_id)).eq('data_referencia', data_referencia).execute()
-        agenda_raw = handle_supabase_response(response)
+        # Disciplina e professor vêm embutidos na mesma requisição (sem consulta por aula)
+        response = LEITURA_AGENDA.consulta().eq('fk_sala_id', int(sala_id)).eq('data_referencia', data_referencia).execute()
         agenda = []
-        for item in agenda_raw:
-            disc_nome = None
-            prof_nome = None
-            if item.get('fk_disciplina_id'):
-                dresp = supabase.table('d_disciplinas').select('nome').eq('id', item['fk_disciplina_id']).single().execute()
-                ddata = handle_supabase_response(dresp)
-                disc_nome = ddata.get('nome') if isinstance(ddata, dict) else None
-            if item.get('fk_professor_id'):
-                presp = supabase.table('d_funcionarios').select('nome').eq('id', item['fk_professor_id']).single().execute()
-                pdata = handle_supabase_response(presp)
-                prof_nome = pdata.get('nome') if isinstance(pdata, dict) else None
+        for item in LEITURA_AGENDA.linhas(response):
             agenda.append({
                 "id": str(item.get('id')),
                 "dia_semana": item.get('dia_semana'),
                 "ordem_aula": item.get('ordem_aula'),
                 "tema_aula": item.get('tema_aula'),
                 "tipo_aula": item.get('tipo_aula'),
-                "disciplina_nome": disc_nome,
-                "professor_nome": prof_nome
+                "disciplina_nome": item.get('disciplina_nome'),
+                "professor_nome": item.get('professor_nome')
             })
         return jsonify(agenda)
     except Exception as e:
@@ -759,6 +2907,16 @@ def api_get_guia_aprendizagem():
     except Exception as e:
         return jsonify({"error": f"Erro ao buscar Guia de Aprendizagem: {e}", "status": 500}), 500
 
+@app.route('/api/reconciliar_ocorrencias', methods=['POST'])
+def api_reconciliar_ocorrencias():
+    """Executa sob demanda a reconciliação em lote de status/autotextos."""
+    try:
+        total = reconciliar_ocorrencias_em_lote()
+        return jsonify({"message": f"{total} ocorrências reconciliadas.", "atualizadas": total, "status": 200}), 200
+    except Exception as e:
+        logging.exception("Erro na reconciliação de ocorrências")
+        return jsonify({"error": f"Falha ao reconciliar ocorrências: {e}", "status": 500}), 500
+
 @app.route("/api/registrar_atendimento/<int:ocorrencia_id>", methods=["POST"])
 def registrar_atendimento(ocorrencia_id):
     try:
@@ -784,44 +2942,20 @@ def registrar_atendimento(ocorrencia_id):
         campo_texto, campo_data = campos[nivel]
         agora = datetime.now().isoformat()
 
-        supabase.table("ocorrencias").update({
+        # O update devolve a linha atualizada, que é reconciliada em seguida (status/autotextos)
+        resp = supabase.table("ocorrencias").update({
             campo_texto: texto,
             campo_data: agora
         }).eq("numero", ocorrencia_id).execute()
 
-        # Reavalia status
-        resp = supabase.table('ocorrencias').select(
-            "solicitado_professor, solicitado_tutor, solicitado_coordenacao, solicitado_gestao, "
-            "atendimento_professor, atendimento_tutor, atendimento_coordenacao, atendimento_gestao"
-        ).eq("numero", ocorrencia_id).single().execute()
-
-        if not resp.data:
+        linhas = handle_supabase_response(resp)
+        if not linhas:
             return jsonify({"error": "Ocorrência não encontrada"}), 404
 
-        occ = resp.data
-
-        sp = _to_bool(occ.get('solicitado_professor'))
-        st = _to_bool(occ.get('solicitado_tutor'))
-        sc = _to_bool(occ.get('solicitado_coordenacao'))
-        sg = _to_bool(occ.get('solicitado_gestao'))
-
-        at_prof = (occ.get('atendimento_professor') or "").strip()
-        at_tutor = (occ.get('atendimento_tutor') or "").strip()
-        at_coord = (occ.get('atendimento_coordenacao') or "").strip()
-        at_gest = (occ.get('atendimento_gestao') or "").strip()
-
-        pendente_prof = sp and (at_prof == "" or at_prof == DEFAULT_AUTOTEXT)
-        pendente_tutor = st and (at_tutor == "" or at_tutor == DEFAULT_AUTOTEXT)
-        pendente_coord = sc and (at_coord == "" or at_coord == DEFAULT_AUTOTEXT)
-        pendente_gestao = sg and (at_gest == "" or at_gest == DEFAULT_AUTOTEXT)
-
-        novo_status = "Aberta"
-        if not (pendente_prof or pendente_tutor or pendente_coord or pendente_gestao):
-            novo_status = "Finalizada"
-
-        if novo_status == "Finalizada":
-            supabase.table("ocorrencias").update({"status": novo_status}).eq("numero", ocorrencia_id).execute()
-            logging.info(f"[ATENDIMENTO] Nº {ocorrencia_id} finalizada pelo nível {nivel}")
+        novo_status = aplicar_reconciliacao(linhas[0])
+        estatisticas_ocorrencias.atualizar(linhas[0])
+        logging.info(f"[ATENDIMENTO] Nº {ocorrencia_id} registrado pelo nível {nivel} → {novo_status}")
+        publicar_evento_ocorrencia(ocorrencia_id, 'atendimento')
 
         return jsonify({"success": True, "novo_status": novo_status}), 200
 
@@ -841,6 +2975,7 @@ def api_cadastrar_sala():
         nova_sala = {"sala": sala, "nivel_ensino": nivel_ensino}
         response = supabase.table('d_salas').insert(nova_sala).execute()
         handle_supabase_response(response)
+        _invalidar_cache('d_salas')
         return jsonify({"message": f"Sala {sala} cadastrada com sucesso!", "status": 201}), 201
     except Exception as e:
         if "unique constraint" in str(e):
@@ -876,6 +3011,7 @@ def api_cadastrar_funcionario():
              
         response = supabase.table('d_funcionarios').insert(novo_funcionario).execute()
         handle_supabase_response(response)
+        _invalidar_cache('d_funcionarios')
         return jsonify({"message": f"{nome} ({funcao}) cadastrado com sucesso!", "status": 201}), 201
     except Exception as e:
         if "unique constraint" in str(e):
@@ -898,6 +3034,7 @@ def api_cadastrar_disciplina():
         }
         response = supabase.table('d_disciplinas').insert(nova_disciplina).execute()
         handle_supabase_response(response)
+        _invalidar_cache('d_disciplinas')
         return jsonify({"message": f"Disciplina '{nome}' cadastrada com sucesso!", "status": 201}), 201
     except Exception as e:
         if "unique constraint" in str(e):
@@ -915,6 +3052,7 @@ def api_cadastrar_clube():
         novo_clube = {"nome": nome, "semestre": semestre}
         response = supabase.table('d_clubes').insert(novo_clube).execute()
         handle_supabase_response(response)
+        _invalidar_cache('d_clubes')
         return jsonify({"message": f"Clube '{nome}' cadastrado com sucesso!", "status": 201}), 201
     except Exception as e:
         if "unique constraint" in str(e):
@@ -932,6 +3070,7 @@ def api_cadastrar_eletiva():
         nova_eletiva = {"nome": nome, "semestre": semestre}
         response = supabase.table('d_eletivas').insert(nova_eletiva).execute()
         handle_supabase_response(response)
+        _invalidar_cache('d_eletivas')
         return jsonify({"message": f"Eletiva '{nome}' cadastrada com sucesso!", "status": 201}), 201
     except Exception as e:
         if "unique constraint" in str(e):
@@ -949,6 +3088,7 @@ def api_cadastrar_equipamento():
         novo_equipamento = {"colmeia": colmeia, "equipamento_id": int(equipamento_id), "status": "DISPONÍVEL"}
         response = supabase.table('d_inventario_equipamentos').insert(novo_equipamento).execute()
         handle_supabase_response(response)
+        _invalidar_cache('d_inventario_equipamentos')
         return jsonify({"message": f"Equipamento {equipamento_id} da {colmeia} cadastrado com sucesso!", "status": 201}), 201
     except Exception as e:
         if "unique constraint" in str(e):
@@ -970,6 +3110,7 @@ def api_cadastrar_aluno():
         novo_aluno = {"ra": ra, "nome": nome, "sala_id": sala_id_bigint, "tutor_id": tutor_id_bigint}
         response = supabase.table('d_alunos').insert(novo_aluno).execute()
         handle_supabase_response(response)
+        _invalidar_cache('d_alunos')
         return jsonify({"message": f"Aluno(a) {nome} (RA: {ra}) cadastrado com sucesso!", "status": 201}), 201
     except Exception as e:
         if "unique constraint" in str(e):
@@ -977,16 +3118,139 @@ def api_cadastrar_aluno():
         logging.error(f"Erro no Supabase durante o cadastro de aluno: {e}")
         return jsonify({"error": f"Erro interno do servidor: {e}", "status": 500}), 500
 
+@app.route('/api/importar_alunos', methods=['POST'])
+def api_importar_alunos():
+    """Cadastra/atualiza alunos em massa a partir de uma planilha (campo `arquivo`, CSV ou XLSX).
+
+    Colunas: RA, Nome, Sala (nome ou id) e, opcional, Tutor (nome ou id). O RA
+    é a chave: quem já está cadastrado é atualizado e um RA repetido na planilha
+    vale só na primeira linha. A planilha é lida e gravada em blocos, e a
+    resposta traz o resultado de cada linha. Se a importação for interrompida
+    depois de algum bloco gravado, a resposta é 207 com o que foi salvo até ali
+    (reenviar a mesma planilha é seguro: o RA é a chave).
+    """
+    arquivo = request.files.get('arquivo')
+    if arquivo is None or not arquivo.filename:
+        return jsonify({"error": "Envie a planilha no campo 'arquivo' (CSV ou XLSX).", "status": 400}), 400
+    relatorio = []
+    linha_do_ra = {}  # ra -> nº da linha que vale
+    bloco = []
+    interrupcao = None
+    try:
+        # Nomes e ids aceitos na planilha, a partir do cache das dimensões (sem consulta por linha)
+        salas, tutores = {}, {}
+        for s_id, s in cache_dimensoes.linhas('d_salas').items():
+            salas[s_id] = salas[_normalizar_texto(s['sala'])] = int(s_id)
+        for f_id, nome in cache_dimensoes.tutores().items():
+            tutores[f_id] = tutores[_normalizar_texto(nome)] = int(f_id)
+
+        registros = ler_planilha_alunos(arquivo.stream, arquivo.filename)
+
+        def gravar_bloco():
+            salvos, recusados = [], []
+            # Quem veio sem tutor vai num upsert à parte: no mesmo lote de quem tem
+            # tutor_id, a coluna ausente chegaria como null e apagaria o tutor cadastrado
+            grupos = ([r for r in bloco if 'tutor_id' in r], [r for r in bloco if 'tutor_id' not in r])
+            try:
+                for grupo in grupos:
+                    if grupo:
+                        grupo_salvos, grupo_recusados = upsert_em_lotes('d_alunos', grupo, 'ra', chave=itemgetter('ra'))
+                        salvos.extend(grupo_salvos)
+                        recusados.extend(grupo_recusados)
+            except Exception as e:
+                # Parte dos lotes pode ter sido gravada antes da falha
+                for r in bloco:
+                    relatorio.append({"linha": linha_do_ra[r['ra']], "ra": r['ra'], "status": "erro",
+                                      "erro": f"Gravação não confirmada: {e}"})
+                bloco.clear()
+                raise
+            for r in salvos:
+                relatorio.append({"linha": linha_do_ra[r['ra']], "ra": r['ra'], "status": "salvo"})
+            for r, erro in recusados:
+                logging.error(f"Aluno recusado na importação (RA {r['ra']}): {erro}")
+                relatorio.append({"linha": linha_do_ra[r['ra']], "ra": r['ra'], "status": "erro", "erro": erro})
+            bloco.clear()
+
+        for numero, campos in registros:
+            ra, nome = campos.get('ra'), campos.get('nome')
+            sala_id = salas.get(_normalizar_texto(campos.get('sala', '')))
+            tutor_id = tutores.get(_normalizar_texto(campos.get('tutor', '')))
+            erro = None
+            if not ra or not nome:
+                erro = "RA e Nome são obrigatórios."
+            elif ra in linha_do_ra:
+                relatorio.append({"linha": numero, "ra": ra, "status": "ignorada",
+                                  "erro": f"RA repetido na planilha (vale a linha {linha_do_ra[ra]})."})
+                continue
+            elif sala_id is None:
+                erro = f"Sala não encontrada: {campos.get('sala') or '(vazia)'}"
+            elif campos.get('tutor') and tutor_id is None:
+                erro = f"Tutor não encontrado: {campos['tutor']}"
+            if erro:
+                relatorio.append({"linha": numero, "ra": ra, "status": "erro", "erro": erro})
+                continue
+
+            linha_do_ra[ra] = numero
+            aluno = {"ra": ra, "nome": nome, "sala_id": sala_id}
+            # Sem a coluna Tutor, ou com a célula vazia, o tutor de quem já está cadastrado é mantido
+            if tutor_id is not None:
+                aluno["tutor_id"] = tutor_id
+            bloco.append(aluno)
+            if len(bloco) >= IMPORTACAO_ALUNOS_BLOCO:
+                gravar_bloco()
+        if bloco:
+            gravar_bloco()
+    except (ParametrosInvalidos, UnicodeDecodeError, zipfile.BadZipFile) as e:
+        interrupcao, status_erro = f"Planilha inválida: {e}", 400
+    except Exception as e:
+        logging.error(f"Erro na importação de alunos: {e}")
+        interrupcao, status_erro = f"Falha ao importar alunos: {e}", 500
+    if interrupcao:
+        # Linhas já lidas que ainda esperavam o próximo envio
+        for r in bloco:
+            relatorio.append({"linha": linha_do_ra[r['ra']], "ra": r['ra'], "status": "erro",
+                              "erro": "Não gravada: importação interrompida."})
+
+    relatorio.sort(key=itemgetter('linha'))
+    salvos = sum(1 for r in relatorio if r['status'] == 'salvo')
+    if salvos:
+        _invalidar_cache('d_alunos')
+    logging.info(f"[IMPORTAÇÃO] {arquivo.filename}: {salvos} aluno(s) salvos de {len(relatorio)} linha(s)"
+                 + (f"; interrompida: {interrupcao}" if interrupcao else ""))
+    resumo = {"salvos": salvos, "linhas": len(relatorio), "relatorio": relatorio}
+    if interrupcao:
+        if not salvos:
+            return jsonify({"error": interrupcao, "status": status_erro}), status_erro
+        return jsonify({"error": f"Importação interrompida: {interrupcao}", "interrompida": True,
+                        "message": f"{salvos} aluno(s) importados antes da interrupção; as linhas seguintes não foram "
+                                   "processadas. Corrija e reenvie a planilha (alunos já salvos são atualizados).",
+                        **resumo, "status": 207}), 207
+    if not relatorio:
+        return jsonify({"error": "A planilha não tem alunos.", "status": 400}), 400
+    if salvos == len(relatorio):
+        return jsonify({"message": f"{salvos} aluno(s) importados com sucesso!", **resumo, "status": 201}), 201
+    if not salvos:
+        return jsonify({"error": "Nenhum aluno foi importado.", **resumo, "status": 400}), 400
+    return jsonify({"message": f"{salvos} aluno(s) importados; {len(relatorio) - salvos} linha(s) com erro.",
+                    **resumo, "status": 207}), 207
+
 @app.route('/api/salvar_frequencia', methods=['POST'])
 def api_salvar_frequencia_massa():
-    """Salva a frequência P/F em massa, utilizando UPSERT para evitar duplicatas."""
+    """Salva a frequência P/F em massa, utilizando UPSERT para evitar duplicatas.
+
+    Payloads grandes (a chamada da escola inteira) são gravados em lotes
+    paralelos; linhas inválidas ou recusadas pelo banco não derrubam as demais e
+    voltam em `falhas` (HTTP 207 quando parte foi salva).
+    """
     data_list = request.json
     if not data_list or not isinstance(data_list, list):
-        return jsonify({"error": "Dados inválidos: Esperado uma lista de registros."}, 400)
+        return jsonify({"error": "Dados inválidos: Esperado uma lista de registros.", "status": 400}), 400
         
     registros_a_salvar = []
+    indices = {}  # (aluno, data) -> posição no payload, para apontar as falhas do banco
+    falhas = []
     
-    for item in data_list:
+    for indice, item in enumerate(data_list):
         try:
             aluno_id_bigint = int(item['aluno_id'])
             sala_id_bigint = int(item['sala_id'])
@@ -996,122 +3260,120 @@ def api_salvar_frequencia_massa():
             # Garante que só P e F podem ser inseridos aqui, para não sobrescrever PA/PS/PAS
             if status not in ['P', 'F']:
                 logging.warning(f"Status inválido {status} na frequência em massa. Ignorando.")
+                falhas.append({"indice": indice, "aluno_id": item.get('aluno_id'), "data": data, "erro": f"Status inválido: {status}"})
                 continue
 
-            registro = {
+            registros_a_salvar.append({
                 "fk_aluno_id": aluno_id_bigint,
                 "fk_sala_id": sala_id_bigint,
                 "data": data,
                 "status": status,
-                # Chaves de conflito para UPSERT:
-                "data": data, 
-                "fk_aluno_id": aluno_id_bigint
-            }
-            registros_a_salvar.append(registro)
-        except (ValueError, KeyError, TypeError):
-            continue
+            })
+            indices[(aluno_id_bigint, data)] = indice
+        except (ValueError, KeyError, TypeError) as e:
+            falhas.append({"indice": indice, "aluno_id": item.get('aluno_id') if isinstance(item, dict) else None,
+                           "data": item.get('data') if isinstance(item, dict) else None, "erro": f"Registro inválido: {e}"})
             
     if not registros_a_salvar:
-        return jsonify({"error": "Nenhum registro válido foi encontrado para salvar."}, 400)
+        return jsonify({"error": "Nenhum registro válido foi encontrado para salvar.", "falhas": falhas, "status": 400}), 400
         
     try:
-        # Usa UPSERT (on_conflict na PK) para atualizar se já existir ou inserir se for novo.
-        response = supabase.table('f_frequencia').upsert(registros_a_salvar, on_conflict='fk_aluno_id, data').execute()
-        handle_supabase_response(response)
-        return jsonify({"message": f"{len(registros_a_salvar)} registros de frequência salvos/atualizados com sucesso!", "status": 201}), 201
+        # UPSERT (on_conflict aluno+data) para atualizar se já existir ou inserir se for novo.
+        salvos, recusados = upsert_em_lotes('f_frequencia', registros_a_salvar, 'fk_aluno_id, data',
+                                            chave=lambda r: (r['fk_aluno_id'], r['data']))
+        totais_frequencia.registrar((r['fk_sala_id'], r['data']) for r in salvos)
+        for r, erro in recusados:
+            logging.error(f"Frequência recusada (aluno {r['fk_aluno_id']}, {r['data']}): {erro}")
+            falhas.append({"indice": indices.get((r['fk_aluno_id'], r['data'])), "aluno_id": r['fk_aluno_id'], "data": r['data'], "erro": erro})
+
+        if not falhas:
+            return jsonify({"message": f"{len(salvos)} registros de frequência salvos/atualizados com sucesso!", "status": 201}), 201
+        if not salvos:
+            return jsonify({"error": "Nenhum registro de frequência foi salvo.", "falhas": falhas, "status": 500}), 500
+        return jsonify({
+            "message": f"{len(salvos)} registros salvos; {len(falhas)} com erro.",
+            "salvos": len(salvos),
+            "falhas": falhas,
+            "status": 207
+        }), 207
     except Exception as e:
         logging.error(f"Erro no Supabase ao salvar frequência em massa: {e}")
         return jsonify({"error": f"Erro interno do servidor: {e}", "status": 500}), 500
 
-@app.route('/api/salvar_atraso', methods=['POST'])
-def api_salvar_atraso():
-    """Salva um registro de PA ou PAS, atualizando o status se necessário."""
+# Evento -> (status isolado, status que combinados viram PAS)
+EVENTOS_FREQUENCIA = {
+    'atraso': ('PA', ('PS', 'PAS')),
+    'saida': ('PS', ('PA', 'PAS')),
+}
+
+def _mesclar_status_frequencia(status_atual, evento):
+    """Status após um atraso/saída; mesma regra da função SQL registrar_evento_frequencia."""
+    status_isolado, combinam = EVENTOS_FREQUENCIA[evento]
+    return 'PAS' if status_atual in combinam else status_isolado
+
+def registrar_evento_frequencia(evento, aluno_id, sala_id, data, hora, motivo, responsavel=None, telefone=None):
+    """Grava um atraso ou saída antecipada e retorna o status resultante.
+
+    Usa a função registrar_evento_frequencia do banco (supabase/migrations):
+    uma ida e volta, com a combinação do status feita de forma atômica. Se a
+    função ainda não foi criada no projeto, cai na leitura + upsert antiga
+    (duas idas e voltas, sujeita a perder um evento simultâneo).
+    """
+    resp = chamar_rpc_opcional('registrar_evento_frequencia', {
+        'p_evento': evento, 'p_aluno_id': aluno_id, 'p_sala_id': sala_id, 'p_data': data,
+        'p_hora': hora, 'p_motivo': motivo, 'p_responsavel': responsavel, 'p_telefone': telefone,
+    }, '20261018120000_registrar_evento_frequencia.sql', "leitura + upsert (não atômico)")
+    if resp is not None:
+        return resp.data
+
+    resp = supabase.table('f_frequencia').select('status').eq('fk_aluno_id', aluno_id).eq('data', data).maybe_single().execute()
+    status_atual = resp.data['status'] if resp and resp.data else None
+    novo_status = _mesclar_status_frequencia(status_atual, evento)
+    registro = {
+        "fk_aluno_id": aluno_id,
+        "fk_sala_id": sala_id,
+        "data": data,
+        f"hora_{evento}": hora,
+        f"motivo_{evento}": motivo,
+        f"responsavel_{evento}": responsavel,
+        f"telefone_{evento}": telefone,
+        "status": novo_status
+    }
+    supabase.table('f_frequencia').upsert(registro, on_conflict='fk_aluno_id, data').execute()
+    return novo_status
+
+def _salvar_evento_frequencia(evento, descricao):
     data = request.json
     required_fields = ['aluno_id', 'sala_id', 'data', 'hora', 'motivo']
-    if not all(field in data for field in required_fields):
-        return jsonify({"error": "Dados incompletos: Aluno, Data, Hora e Motivo são obrigatórios."}, 400)
-    
-    aluno_id, sala_id = int(data['aluno_id']), int(data['sala_id'])
+    if not data or not all(field in data for field in required_fields):
+        return jsonify({"error": "Dados incompletos: Aluno, Data, Hora e Motivo são obrigatórios.", "status": 400}), 400
+
+    try:
+        aluno_id, sala_id = int(data['aluno_id']), int(data['sala_id'])
+    except (TypeError, ValueError):
+        return jsonify({"error": "IDs de aluno e sala inválidos.", "status": 400}), 400
     registro_data = data['data']
-    
+
     try:
-        # 1. Busca o status atual
-        resp = supabase.table('f_frequencia').select('status, id').eq('fk_aluno_id', aluno_id).eq('data', registro_data).maybe_single().execute()
-        current_status = resp.data['status'] if resp.data else None
-        
-        # 2. Determina o novo status combinado
-        novo_status = "PA"
-        if current_status == 'PS' or current_status == 'PAS': # Já tinha PS ou PAS
-            novo_status = 'PAS'
-        elif current_status == 'F': # Estava faltando, mas apareceu com atraso.
-             novo_status = 'PA'
-        elif current_status == 'P': # Estava presente. Vira PA.
-             novo_status = 'PA'
-
-        # 3. Prepara o registro (usa UPSERT)
-        registro = {
-            "fk_aluno_id": aluno_id,
-            "fk_sala_id": sala_id,
-            "data": registro_data,
-            "hora_atraso": data['hora'],
-            "motivo_atraso": data['motivo'],
-            "responsavel_atraso": data.get('responsavel'),
-            "telefone_atraso": data.get('telefone'),
-            "status": novo_status
-        }
-        
-        response = supabase.table('f_frequencia').upsert(registro, on_conflict='fk_aluno_id, data').execute()
-        handle_supabase_response(response)
-        
-        return jsonify({"message": f"Registro de Atraso salvo com sucesso! Status: {novo_status}", "status": 201}), 201
+        novo_status = registrar_evento_frequencia(
+            evento, aluno_id, sala_id, registro_data, data['hora'], data['motivo'],
+            data.get('responsavel'), data.get('telefone'),
+        )
+        totais_frequencia.registrar([(sala_id, registro_data)])
+        return jsonify({"message": f"Registro de {descricao} salvo com sucesso! Status: {novo_status}", "status": 201}), 201
     except Exception as e:
-        logging.error(f"Erro no Supabase ao salvar atraso: {e}")
+        logging.error(f"Erro no Supabase ao salvar {descricao.lower()}: {e}")
         return jsonify({"error": f"Erro interno do servidor: {e}", "status": 500}), 500
 
+@app.route('/api/salvar_atraso', methods=['POST'])
+def api_salvar_atraso():
+    """Salva um registro de PA ou PAS, atualizando o status se necessário."""
+    return _salvar_evento_frequencia('atraso', "Atraso")
+
 @app.route('/api/salvar_saida_antecipada', methods=['POST'])
 def api_salvar_saida_antecipada():
     """Salva um registro de PS ou PAS, atualizando o status se necessário."""
-    data = request.json
-    required_fields = ['aluno_id', 'sala_id', 'data', 'hora', 'motivo']
-    if not all(field in data for field in required_fields):
-        return jsonify({"error": "Dados incompletos: Aluno, Data, Hora e Motivo são obrigatórios."}, 400)
-        
-    aluno_id, sala_id = int(data['aluno_id']), int(data['sala_id'])
-    registro_data = data['data']
-
-    try:
-        # 1. Busca o status atual
-        resp = supabase.table('f_frequencia').select('status, id').eq('fk_aluno_id', aluno_id).eq('data', registro_data).maybe_single().execute()
-        current_status = resp.data['status'] if resp.data else None
-        
-        # 2. Determina o novo status combinado
-        novo_status = "PS"
-        if current_status == 'PA' or current_status == 'PAS': # Já tinha PA ou PAS
-            novo_status = 'PAS'
-        elif current_status == 'F': # Estava faltando, mas saiu cedo (o que implica presença).
-             novo_status = 'PS'
-        elif current_status == 'P': # Estava presente. Vira PS.
-             novo_status = 'PS'
-        
-        # 3. Prepara o registro (usa UPSERT)
-        registro = {
-            "fk_aluno_id": aluno_id,
-            "fk_sala_id": sala_id,
-            "data": registro_data,
-            "hora_saida": data['hora'],
-            "motivo_saida": data['motivo'],
-            "responsavel_saida": data.get('responsavel'),
-            "telefone_saida": data.get('telefone'),
-            "status": novo_status
-        }
-        
-        response = supabase.table('f_frequencia').upsert(registro, on_conflict='fk_aluno_id, data').execute()
-        handle_supabase_response(response)
-        
-        return jsonify({"message": f"Registro de Saída Antecipada salvo com sucesso! Status: {novo_status}", "status": 201}), 201
-    except Exception as e:
-        logging.error(f"Erro no Supabase ao salvar saída antecipada: {e}")
-        return jsonify({"error": f"Erro interno do servidor: {e}", "status": 500}), 500
+    return _salvar_evento_frequencia('saida', "Saída Antecipada")
 
 @app.route('/api/registrar_ocorrencia', methods=['POST'])
 def api_registrar_ocorrencia():
@@ -1136,15 +3398,11 @@ def api_registrar_ocorrencia():
     # --------------------------------------------------------------------------------
     
     try:
-        # Obtém o nome do tutor a partir do aluno_id
-        tutor_id_resp = supabase.table('d_alunos').select('tutor_id').eq('id', aluno_id_bigint).single().execute()
-        tutor_id = tutor_id_resp.data.get('tutor_id') if tutor_id_resp.data else None
-        
-        tutor_nome_resp = None
-        if tutor_id:
-            tutor_nome_resp = supabase.table('d_funcionarios').select('nome').eq('id', tutor_id).single().execute()
-            
-        tutor_nome = tutor_nome_resp.data.get('nome') if tutor_nome_resp and tutor_nome_resp.data else 'Tutor Não Encontrado'
+        # Obtém o id e o nome do tutor a partir do aluno_id (uma única requisição)
+        tutor_resp = LEITURA_TUTOR_DO_ALUNO.consulta().eq('id', aluno_id_bigint).maybe_single().execute()
+        aluno_tutor = LEITURA_TUTOR_DO_ALUNO.achatar(tutor_resp.data) if tutor_resp and tutor_resp.data else {}
+        tutor_id = aluno_tutor.get('tutor_id')
+        tutor_nome = aluno_tutor.get('tutor_nome') or 'Tutor Não Encontrado'
         
         # O Supabase irá setar a coluna 'numero' (bigint) automaticamente (sequência)
         nova_ocorrencia = {
@@ -1164,12 +3422,16 @@ def api_registrar_ocorrencia():
             "solicitado_coordenacao": 'SIM' if _to_bool(data.get('solicitar_coordenacao')) else 'NÃO',
             "solicitado_gestao": 'SIM' if _to_bool(data.get('solicitar_gestao')) else 'NÃO',
         }
+        # Já grava status e autotextos normalizados, sem depender de uma leitura posterior
+        nova_ocorrencia.update(reconciliar_ocorrencia(nova_ocorrencia)[1])
         
         # A coluna 'solicitado_*' é TEXT, então 'NÃO' e 'SIM' são os valores corretos.
         # A função _to_bool irá interpretar isso corretamente na busca.
         
         response = supabase.table('ocorrencias').insert(nova_ocorrencia).execute()
-        handle_supabase_response(response)
+        for linha in handle_supabase_response(response):
+            estatisticas_ocorrencias.atualizar(linha)
+            publicar_evento_ocorrencia(linha['numero'], 'registro')
         
         logging.info(f"Ocorrência registrada para Aluno ID {aluno_id_bigint}")
         
@@ -1250,7 +3512,10 @@ def api_atualizar_ocorrencia(ocorrencia_id):
     try:
         ocorrencia_id_bigint = int(ocorrencia_id)
         response = supabase.table('ocorrencias').update(data).eq('numero', ocorrencia_id_bigint).execute()
-        handle_supabase_response(response)
+        for linha in handle_supabase_response(response):
+            aplicar_reconciliacao(linha)
+            estatisticas_ocorrencias.atualizar(linha)
+            publicar_evento_ocorrencia(linha['numero'], 'atualizacao')
         return jsonify({"message": "Ocorrência atualizada com sucesso.", "status": 200}), 200
     except Exception as e:
         return jsonify({"error": f"Falha ao atualizar ocorrência: {e}", "status": 500}), 500
@@ -1298,166 +3563,15 @@ def api_finalizar_devolucao_equipamento():
 
 @app.route('/api/relatorio_estatistico', methods=['GET'])
 def api_relatorio_estatistico():
-    """Gera o JSON de estatísticas de ocorrências."""
-    try:
-        # 1. Obter todas as ocorrências detalhadas
-        resp_occ = supabase.table('ocorrencias').select(
-            "numero, data_hora, status, tipo, tutor_id, sala_id, "
-            "solicitado_tutor, solicitado_coordenacao, solicitado_gestao, "
-            "atendimento_tutor, atendimento_coordenacao, atendimento_gestao, "
-            "dt_atendimento_gestao" # Usamos o dt_atendimento_gestao como data de fechamento final
-        ).execute()
-        ocorrencias = handle_supabase_response(resp_occ)
-        
-        # 2. Obter mapeamentos de Sala e Tutor
-        resp_salas = supabase.table('d_salas').select('id, sala').execute()
-        salas_map = {str(s['id']): s['sala'] for s in handle_supabase_response(resp_salas)}
-        
-        resp_tutores = supabase.table('d_funcionarios').select('id, nome').eq('is_tutor', True).execute()
-        tutores_map = {str(t['id']): t['nome'] for t in handle_supabase_response(resp_tutores)}
-
-        # 3. Agregação de dados
-        total = len(ocorrencias)
-        abertas = 0
-        finalizadas = 0
-        
-        tipos_count = {}
-        salas_stats = {} # Por Sala: {total, menos_7d, mais_7d, nao_respondidas}
-        tutores_stats = {} # Por Tutor: {total, finalizadas, abertas, tempos_resposta: []}
-        tempo_resposta_faixas = {
-            '1-7 dias': 0, '8-30 dias': 0, 'mais de 30 dias': 0, 'não finalizadas': 0
-        }
-        ocorrencias_por_mes = {} # {mes_ano: count}
-        
-        hoje = datetime.now()
-        
-        for occ in ocorrencias:
-            occ_status = occ.get('status')
-            occ_data_hora = occ.get('data_hora')
-            occ_tipo = occ.get('tipo', 'Outros')
-            sala_id_str = str(occ.get('sala_id'))
-            tutor_id_str = str(occ.get('tutor_id')) if occ.get('tutor_id') else None
-            
-            # 3.1. Totais e Tipos
-            if occ_status == 'Aberta':
-                abertas += 1
-            elif occ_status == 'Finalizada':
-                finalizadas += 1
-            
-            tipos_count[occ_tipo] = tipos_count.get(occ_tipo, 0) + 1
-            
-            # 3.2. Por Mês
-            if occ_data_hora:
-                # Tratamento para datetime.fromisoformat: 
-                try:
-                    dt = datetime.fromisoformat(occ_data_hora.replace('Z', '+00:00'))
-                    mes_ano_key = dt.strftime("%Y-%m")
-                    ocorrencias_por_mes[mes_ano_key] = ocorrencias_por_mes.get(mes_ano_key, 0) + 1
-                except Exception:
-                    logging.warning(f"Data de ocorrência inválida: {occ_data_hora}")
-            
-            # 3.3. Estatísticas por Sala
-            if sala_id_str in salas_map:
-                sala_name = salas_map[sala_id_str]
-                if sala_id_str not in salas_stats:
-                    salas_stats[sala_id_str] = {'sala': sala_name, 'total': 0, 'menos_7d': 0, 'mais_7d': 0, 'nao_respondidas': 0}
-                salas_stats[sala_id_str]['total'] += 1
-                
-                if occ_status == 'Aberta' and occ_data_hora:
-                    try:
-                        dt_abertura = datetime.fromisoformat(occ_data_hora.replace('Z', '+00:00'))
-                        dias_aberta = (hoje - dt_abertura).days
-                        
-                        if dias_aberta <= 7:
-                            salas_stats[sala_id_str]['menos_7d'] += 1
-                        else:
-                            salas_stats[sala_id_str]['mais_7d'] += 1
-                            
-                        # Verifica se é "Não Respondida"
-                        solicitado = (_to_bool(occ.get('solicitado_tutor')) or 
-                                      _to_bool(occ.get('solicitado_coordenacao')) or 
-                                      _to_bool(occ.get('solicitado_gestao')))
-                        
-                        atendimento_tutor = occ.get('atendimento_tutor')
-                        atendimento_coord = occ.get('atendimento_coordenacao')
-                        atendimento_gestao = occ.get('atendimento_gestao')
-                        
-                        respondido = (
-                            (atendimento_tutor and atendimento_tutor != DEFAULT_AUTOTEXT) or
-                            (atendimento_coord and atendimento_coord != DEFAULT_AUTOTEXT) or
-                            (atendimento_gestao and atendimento_gestao != DEFAULT_AUTOTEXT)
-                        )
-                        
-                        if solicitado and not respondido:
-                            salas_stats[sala_id_str]['nao_respondidas'] += 1
-                    except Exception:
-                        logging.warning(f"Erro no cálculo de dias abertas para ocorrência {occ.get('numero')}")
-
-
-            # 3.4. Estatísticas por Tutor
-            if tutor_id_str and tutor_id_str in tutores_map:
-                tutor_name = tutores_map[tutor_id_str]
-                if tutor_id_str not in tutores_stats:
-                    tutores_stats[tutor_id_str] = {'tutor': tutor_name, 'total': 0, 'finalizadas': 0, 'abertas': 0, 'tempos_resposta': []}
-                
-                tutores_stats[tutor_id_str]['total'] += 1
-                if occ_status == 'Finalizada':
-                    tutores_stats[tutor_id_str]['finalizadas'] += 1
-                    
-                    # Calcula o tempo de resposta
-                    dias_resp = calcular_dias_resposta(occ_data_hora, occ.get('dt_atendimento_gestao'))
-                    if dias_resp is not None:
-                        tutores_stats[tutor_id_str]['tempos_resposta'].append(dias_resp)
-                        
-                        if dias_resp <= 7:
-                            tempo_resposta_faixas['1-7 dias'] += 1
-                        elif dias_resp <= 30:
-                            tempo_resposta_faixas['8-30 dias'] += 1
-                        else:
-                            tempo_resposta_faixas['mais de 30 dias'] += 1
-                else:
-                    tutores_stats[tutor_id_str]['abertas'] += 1
-                    tempo_resposta_faixas['não finalizadas'] += 1
+    """Gera o JSON de estatísticas de ocorrências a partir dos agregados em memória.
 
-        # 4. Finalização dos cálculos e formatação
-        
-        # Média de dias de resposta por tutor
-        final_tutores = []
-        for t_id, t_data in tutores_stats.items():
-            t_data['media_dias_resposta'] = sum(t_data['tempos_resposta']) / len(t_data['tempos_resposta']) if t_data['tempos_resposta'] else 0
-            # Formatação para o JS
-            final_tutores.append({
-                'tutor': t_data['tutor'],
-                'total': t_data['total'],
-                'finalizadas': t_data['finalizadas'],
-                'abertas': t_data['abertas'],
-                'media_dias_resposta': round(t_data['media_dias_resposta'], 1) if t_data['media_dias_resposta'] else 0
-            })
-            
-        # Formatação do Tempo de Resposta para Gráfico
-        tempo_resp_grafico = {
-            'labels': list(tempo_resposta_faixas.keys()),
-            'valores': list(tempo_resposta_faixas.values())
-        }
-        
-        # Formatação Ocorrências por Mês para Gráfico
-        meses_ordenados = sorted(ocorrencias_por_mes.keys())
-        ocorrencias_por_mes_grafico = {
-            'labels': [datetime.strptime(m, "%Y-%m").strftime("%b/%y") for m in meses_ordenados],
-            'valores': [ocorrencias_por_mes[m] for m in meses_ordenados]
-        }
-
-        # 5. Retorno do JSON final
-        return jsonify({
-            'total': total,
-            'abertas': abertas,
-            'finalizadas': finalizadas,
-            'tipos': tipos_count,
-            'por_sala': list(salas_stats.values()),
-            'por_tutor': final_tutores,
-            'tempo_resposta': tempo_resp_grafico,
-            'ocorrencias_por_mes': ocorrencias_por_mes_grafico
-        }), 200
+    `?reconstruir=1` força o recálculo completo a partir da tabela.
+    """
+    try:
+        salas_map = {s_id: s['sala'] for s_id, s in cache_dimensoes.linhas('d_salas').items()}
+        tutores_map = cache_dimensoes.tutores()
+        forcar = _to_bool(request.args.get('reconstruir'))
+        return jsonify(estatisticas_ocorrencias.relatorio(salas_map, tutores_map, forcar)), 200
 
     except Exception as e:
         logging.exception("Erro ao gerar relatório estatístico")
@@ -1465,61 +3579,138 @@ def api_relatorio_estatistico():
         return jsonify({"error": f"Erro interno ao gerar relatório: {e}"}), 500
 
 
+def sincronizar_disciplinas_salas(desejado):
+    """Aplica {sala_id: [disciplina_id, ...]} pela diferença; retorna (inseridos, removidos).
+
+    Usa a função sincronizar_disciplinas_salas do banco (supabase/migrations):
+    uma ida e volta para qualquer nº de salas, numa transação. Sem ela, lê os
+    vínculos atuais das salas e grava só a diferença — inserindo antes de
+    apagar, para a sala não ficar sem disciplinas entre as duas escritas.
+    """
+    salas = sorted(desejado)
+    vinculos = [{"fk_sala_id": s, "fk_disciplina_id": d} for s in salas for d in desejado[s]]
+    resp = chamar_rpc_opcional('sincronizar_disciplinas_salas', {'p_salas': salas, 'p_vinculos': vinculos},
+                               '20261018140000_sincronizar_disciplinas_salas.sql', "leitura + diferença (não atômico)")
+    if resp is not None:
+        return resp.data['inseridos'], resp.data['removidos']
+
+    resp = supabase.table('vinculos_disciplina_sala').select('fk_sala_id, fk_disciplina_id').in_('fk_sala_id', salas).execute()
+    # Compara pelo texto do id: o navegador pode mandar "5" para uma coluna numérica
+    atuais = {(int(v['fk_sala_id']), str(v['fk_disciplina_id'])): v['fk_disciplina_id'] for v in handle_supabase_response(resp)}
+    chaves_desejadas = {(v['fk_sala_id'], str(v['fk_disciplina_id'])) for v in vinculos}
+
+    novos = [v for v in vinculos if (v['fk_sala_id'], str(v['fk_disciplina_id'])) not in atuais]
+    if novos:
+        supabase.table('vinculos_disciplina_sala').insert(novos).execute()
+    remover = {}
+    for (sala_id, chave), disciplina_id in atuais.items():
+        if (sala_id, chave) not in chaves_desejadas:
+            remover.setdefault(sala_id, []).append(disciplina_id)
+    for sala_id, disciplinas in remover.items():
+        supabase.table('vinculos_disciplina_sala').delete().eq('fk_sala_id', sala_id).in_('fk_disciplina_id', disciplinas).execute()
+    return len(novos), sum(map(len, remover.values()))
+
 @app.route('/api/vincular_disciplina_sala', methods=['POST'])
 def api_vincular_disciplina_sala():
-    data = request.json
-    sala_id = data.get('sala_id')
-    disciplinas_ids = data.get('disciplinas')
-    if not sala_id:
-        return jsonify({"error": "ID da sala é obrigatório.", "status": 400}), 400
+    """Define as disciplinas de uma ou mais salas.
+
+    Corpo: {sala_id, disciplinas: [ids]} ou {salas: [{sala_id, disciplinas}, ...]}
+    para configurar várias salas de uma vez. A lista de cada sala é a completa:
+    o que não estiver nela é desvinculado.
+    """
     try:
-        sala_id_bigint = int(sala_id)
-        # Limpa todos os vínculos existentes para esta sala
-        supabase.table('vinculos_disciplina_sala').delete().eq('fk_sala_id', sala_id_bigint).execute()
-        if disciplinas_ids:
-            # Insere os novos vínculos
-            registros = [{"fk_sala_id": sala_id_bigint, "fk_disciplina_id": d_id} for d_id in disciplinas_ids]
-            supabase.table('vinculos_disciplina_sala').insert(registros).execute()
-        return jsonify({"message": f"Vínculos da sala {sala_id} atualizados com sucesso.", "status": 200}), 200
+        data = request.get_json(silent=True)
+        salas = (data.get('salas') or ([data] if data.get('sala_id') else [])) if isinstance(data, dict) else None
+        if not isinstance(salas, list) or not all(isinstance(s, dict) and isinstance(s.get('disciplinas') or [], list)
+                                                  for s in salas):
+            raise ParametrosInvalidos("Corpo inválido: esperado {sala_id, disciplinas: [ids]} ou {salas: [{sala_id, disciplinas}]}.")
+        if not salas or not all(s.get('sala_id') for s in salas):
+            return jsonify({"error": "ID da sala é obrigatório.", "status": 400}), 400
+
+        desejado = {}
+        for s in salas:
+            try:
+                disciplinas = desejado.setdefault(int(s['sala_id']), {})
+            except (TypeError, ValueError):
+                raise ParametrosInvalidos(f"ID de sala inválido: {s['sala_id']!r}.")
+            for d_id in s.get('disciplinas') or []:
+                # 5 e "5" são a mesma disciplina (a comparação com o banco também é pelo texto)
+                disciplinas.setdefault(str(d_id), d_id)
+        desejado = {sala_id: list(disciplinas.values()) for sala_id, disciplinas in desejado.items()}
+
+        inseridos, removidos = sincronizar_disciplinas_salas(desejado)
+        if inseridos or removidos:
+            _invalidar_cache('vinculos_disciplina_sala')
+        alvo = f"da sala {salas[0]['sala_id']}" if len(desejado) == 1 else f"de {len(desejado)} salas"
+        return jsonify({"message": f"Vínculos {alvo} atualizados com sucesso.", "inseridos": inseridos,
+                        "removidos": removidos, "status": 200}), 200
+    except ParametrosInvalidos as e:
+        return jsonify({"error": str(e), "status": 400}), 400
     except Exception as e:
         logging.error(f"Erro ao salvar vínculos de disciplina: {e}")
         return jsonify({"error": f"Falha ao salvar vínculos de disciplina: {e}", "status": 500}), 500
 
+def vincular_tutor_alunos(tutor_id, salas, alunos):
+    """Deixa `alunos` como os vinculados ao tutor nas `salas`; retorna (vinculados, desvinculados).
+
+    Usa a função vincular_tutor_alunos do banco (supabase/migrations): uma ida
+    e volta, tudo ou nada, qualquer que seja o nº de alunos e salas. Se a função
+    ainda não foi criada no projeto, faz as mesmas duas atualizações em conjunto
+    (duas idas e voltas, sem transação entre elas).
+    """
+    resp = chamar_rpc_opcional('vincular_tutor_alunos', {'p_tutor_id': tutor_id, 'p_salas': salas, 'p_alunos': alunos},
+                               '20261018130000_vincular_tutor_alunos.sql', "duas atualizações (não atômico)")
+    if resp is not None:
+        return resp.data['vinculados'], resp.data['desvinculados']
+
+    vinculados = []
+    if alunos:
+        # Só quem ainda não está com o tutor
+        vinculados = handle_supabase_response(
+            supabase.table('d_alunos').update({'tutor_id': tutor_id}).in_('id', alunos)
+            .or_(f'tutor_id.is.null,tutor_id.neq.{tutor_id}').execute())
+    q = supabase.table('d_alunos').update({'tutor_id': None}).in_('sala_id', salas).eq('tutor_id', tutor_id)
+    if alunos:
+        q = q.not_.in_('id', alunos)
+    desvinculados = handle_supabase_response(q.execute())
+    return len(vinculados), len(desvinculados)
+
 @app.route('/api/vincular_tutor_aluno', methods=['POST'])
 def api_vincular_tutor_aluno():
-    data = request.json
-    tutor_id = data.get('tutor_id')
-    vinculos = data.get('vinculos')
-    sala_id = data.get('sala_id') # Adicionado para melhor escopo de desvinculação
-    
-    if not tutor_id or not sala_id:
-        return jsonify({"error": "ID do tutor e ID da sala são obrigatórios.", "status": 400}), 400
-    
+    """Define os alunos vinculados a um tutor em uma ou mais salas.
+
+    Corpo: {tutor_id, sala_id, vinculos: [{aluno_id, sala_id?}], salas?: [ids]}.
+    As salas consideradas são `sala_id`, as de `salas` e as dos vínculos; nelas,
+    alunos do tutor que não estão em `vinculos` são desvinculados.
+    """
     try:
-        tutor_id_bigint = int(tutor_id)
-        sala_id_bigint = int(sala_id)
-        
-        alunos_a_vincular_ids = [int(v['aluno_id']) for v in vinculos if 'aluno_id' in v]
-        
-        # 1. Desvincula o tutor de todos os alunos da sala que atualmente estão vinculados ao tutor_id passado
-        alunos_na_sala_raw = supabase.table('d_alunos').select('id').eq('sala_id', sala_id_bigint).eq('tutor_id', tutor_id_bigint).execute()
-        alunos_na_sala_ids = [int(a['id']) for a in handle_supabase_response(alunos_na_sala_raw)]
-        
-        # Alunos que estavam vinculados a este tutor e foram desmarcados
-        alunos_a_desvincular_ids = [a_id for a_id in alunos_na_sala_ids if a_id not in alunos_a_vincular_ids]
-        
-        if alunos_a_desvincular_ids:
-            logging.info(f"Desvinculando alunos: {alunos_a_desvincular_ids} da sala {sala_id_bigint} do tutor {tutor_id_bigint}")
-            supabase.table('d_alunos').update({'tutor_id': None}).in_('id', alunos_a_desvincular_ids).execute()
-        
-        # 2. Vincula o tutor aos alunos selecionados
-        if alunos_a_vincular_ids:
-            # O Supabase Python SDK não suporta 'update().in_()' para a lista de alunos diretamente. 
-            # Fazemos um loop para garantir a atomicidade por aluno.
-            for aluno_id in alunos_a_vincular_ids:
-                supabase.table('d_alunos').update({'tutor_id': tutor_id_bigint}).eq('id', aluno_id).execute()
-                
-        return jsonify({"message": "Vínculos atualizados com sucesso.", "status": 200}), 200
+        data = request.get_json(silent=True)
+        vinculos = (data.get('vinculos') or []) if isinstance(data, dict) else None
+        if not isinstance(vinculos, list) or not all(isinstance(v, dict) for v in vinculos) \
+                or not isinstance(data.get('salas') or [], list):
+            raise ParametrosInvalidos("Corpo inválido: esperado {tutor_id, sala_id, vinculos: [{aluno_id, sala_id}], salas: [ids]}.")
+        tutor_id = data.get('tutor_id')
+        salas = [s for s in [data.get('sala_id'), *(data.get('salas') or []), *(v.get('sala_id') for v in vinculos)] if s]
+
+        if not tutor_id or not salas:
+            return jsonify({"error": "ID do tutor e ID da sala são obrigatórios.", "status": 400}), 400
+
+        try:
+            tutor_id_bigint = int(tutor_id)
+            salas_ids = sorted({int(s) for s in salas})
+            alunos_ids = sorted({int(v['aluno_id']) for v in vinculos if 'aluno_id' in v})
+        except (TypeError, ValueError):
+            raise ParametrosInvalidos("IDs de tutor, sala e aluno devem ser números inteiros.")
+
+        vinculados, desvinculados = vincular_tutor_alunos(tutor_id_bigint, salas_ids, alunos_ids)
+        _invalidar_cache('d_alunos')
+        logging.info(f"[TUTOR] Tutor {tutor_id_bigint} nas salas {salas_ids}: "
+                     f"{vinculados} aluno(s) vinculado(s), {desvinculados} desvinculado(s)")
+
+        return jsonify({"message": "Vínculos atualizados com sucesso.", "vinculados": vinculados,
+                        "desvinculados": desvinculados, "status": 200}), 200
+    except ParametrosInvalidos as e:
+        return jsonify({"error": str(e), "status": 400}), 400
     except Exception as e:
         logging.error(f"Erro ao vincular tutor/aluno: {e}")
         return jsonify({"error": f"Falha ao vincular tutor/aluno: {e}", "status": 500}), 500
@@ -1532,17 +3723,17 @@ def ocorrencia_detalhes():
 
     try:
         # Consulta ao Supabase na tabela de ocorrências, buscando as referências
-        select_query_detail = "numero, data_hora, descricao, atendimento_professor, atendimento_tutor, atendimento_coordenacao, atendimento_gestao, dt_atendimento_tutor, dt_atendimento_coordenacao, dt_atendimento_gestao, aluno_nome, tutor_nome, professor_id(nome), sala_id(sala), status"
-        resp = supabase.table('ocorrencias').select(select_query_detail).eq('numero', numero).single().execute()
+        resp = LEITURA_OCORRENCIA_DETALHE.consulta().eq('numero', numero).single().execute()
 
         occ = resp.data
 
         if occ is None:
             return jsonify({'error': 'Ocorrência não encontrada'}), 404
 
-        # Extrai nomes aninhados
-        professor_nome = occ.get('professor_id', {}).get('nome', 'N/A')
-        sala_nome = occ.get('sala_id', {}).get('sala', 'N/A')
+        # Extrai nomes embutidos
+        occ = LEITURA_OCORRENCIA_DETALHE.achatar(occ)
+        professor_nome = occ.get('professor_nome') or 'N/A'
+        sala_nome = occ.get('sala_nome') or 'N/A'
         
         # Retorna os campos esperados pelo JS
         return jsonify({
@@ -1566,19 +3757,9 @@ def ocorrencia_detalhes():
 def api_frequencia_status():
     """Verifica se a frequência de uma sala em uma data já foi registrada."""
     try:
-        sala_id = request.args.get('sala_id')
-        data = request.args.get('data')
-
-        if not sala_id or not data:
-            return jsonify({"error": "Parâmetros sala_id e data são obrigatórios."}), 400
-        
-        # Busca qualquer registro para aquela sala e data
-        q = supabase.table('f_frequencia').select('id').eq('fk_sala_id', int(sala_id)).eq('data', data)
-        resp = q.limit(1).execute()
-        
-        registrada = len(resp.data or []) > 0
-        
-        return jsonify({"registrada": registrada}), 200
+        return responder_plano(plano_frequencia_status(request.args)), 200
+    except ParametrosInvalidos as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         logging.exception("Erro ao verificar status da frequência.")
         return jsonify({"error": str(e)}), 500
@@ -1604,9 +3785,86 @@ def api_frequencia_detalhes():
         logging.exception("Erro ao buscar detalhes da frequência.")
         return jsonify({"error": str(e)}), 500
 
+# Um caractere por dia no formato compacto; '?' = sem registro, '*' = status fora da legenda
+CODIGOS_FREQUENCIA = {'P': 'P', 'F': 'F', 'PA': 'A', 'PS': 'S', 'PAS': 'T'}
+LEGENDA_FREQUENCIA = {codigo: status for status, codigo in CODIGOS_FREQUENCIA.items()}
+LEGENDA_FREQUENCIA['?'] = '?'
+STATUS_COM_DETALHES = ('PA', 'PS', 'PAS')
+CAMPOS_DETALHES_FREQUENCIA = (
+    'hora_atraso', 'motivo_atraso', 'responsavel_atraso', 'telefone_atraso',
+    'hora_saida', 'motivo_saida', 'responsavel_saida', 'telefone_saida',
+)
+
+def frequencia_compacta(alunos, registros, ano, mes):
+    """Matriz de frequência do mês codificada como uma string por aluno.
+
+    A matriz (alunos x dias) é montada num array de bytes de largura fixa e cada
+    linha vira uma string com um código por dia (LEGENDA_FREQUENCIA). Só os dias
+    PA/PS/PAS (e status fora da legenda) entram na tabela esparsa `detalhes`.
+    """
+    dias_no_mes = monthrange(ano, mes)[1]
+    linha_do_aluno = {a['id']: i for i, a in enumerate(alunos)}
+    matriz = np.full((len(alunos), dias_no_mes), ord('?'), dtype=np.uint8)
+    detalhes = []
+
+    for reg in registros:
+        i = linha_do_aluno.get(reg.get('fk_aluno_id'))
+        if i is None:
+            continue
+        dia = int(reg['data'][8:10])
+        status = reg.get('status')
+        codigo = CODIGOS_FREQUENCIA.get(status, '*')
+        matriz[i, dia - 1] = ord(codigo)
+        if status in STATUS_COM_DETALHES:
+            # Só os campos preenchidos; os ausentes voltam como None na expansão
+            detalhes.append({'aluno_id': reg['fk_aluno_id'], 'dia': dia,
+                             'detalhes': {c: reg[c] for c in CAMPOS_DETALHES_FREQUENCIA if reg.get(c) is not None}})
+        elif codigo == '*':
+            detalhes.append({'aluno_id': reg['fk_aluno_id'], 'dia': dia, 'status': status})
+
+    return {
+        'formato': 'compacto',
+        'mes_ano': f"{ano}-{mes:02d}",
+        'dias_mes': dias_no_mes,
+        'legenda': LEGENDA_FREQUENCIA,
+        'alunos': [
+            {'id': a['id'], 'nome': a['nome'], 'codigos': matriz[i].tobytes().decode('ascii')}
+            for i, a in enumerate(alunos)
+        ],
+        'detalhes': detalhes,
+    }
+
+def expandir_frequencia_compacta(compacto):
+    """Formato antigo (um dict por aluno/dia) a partir do compacto."""
+    ano, mes = map(int, compacto['mes_ano'].split('-'))
+    dias_uteis = [date(ano, mes, d).isoformat() for d in range(1, compacto['dias_mes'] + 1)]
+    esparsos = {(d['aluno_id'], d['dia']): d for d in compacto['detalhes']}
+
+    relatorio = []
+    for aluno in compacto['alunos']:
+        dias = []
+        for dia, (data, codigo) in enumerate(zip(dias_uteis, aluno['codigos']), start=1):
+            extra = esparsos.get((aluno['id'], dia), {})
+            status = extra['status'] if codigo == '*' else LEGENDA_FREQUENCIA[codigo]
+            preenchidos = extra.get('detalhes')
+            detalhes = {c: preenchidos.get(c) for c in CAMPOS_DETALHES_FREQUENCIA} if preenchidos is not None else None
+            dias.append({'data': data, 'status': status, 'detalhes': detalhes})
+        relatorio.append({'id': aluno['id'], 'nome': aluno['nome'], 'dias': dias})
+
+    return {
+        'dias_mes': compacto['dias_mes'],
+        'relatorio': relatorio,
+        'dias_uteis': dias_uteis # Lista de datas YYYY-MM-DD
+    }
+
 @app.route('/api/relatorio_frequencia_detalhada', methods=['GET'])
 def api_relatorio_frequencia_detalhada():
-    """Gera o relatório de frequência detalhada por sala e mês/ano."""
+    """Gera o relatório de frequência detalhada por sala e mês/ano.
+
+    ?formato=compacto devolve uma string de códigos por aluno + tabela esparsa de
+    detalhes (decodificada por static/js/frequencia_compacta.js); sem o parâmetro,
+    mantém o formato antigo com um objeto por aluno/dia.
+    """
     try:
         sala_id = request.args.get('sala_id')
         mes_ano_str = request.args.get('mes_ano') # Formato 'YYYY-MM'
@@ -1630,56 +3888,17 @@ def api_relatorio_frequencia_detalhada():
         if not aluno_ids:
              return jsonify({"error": "Nenhum aluno encontrado nesta sala."}), 404
 
-        # 2. Busca todos os registros de frequência para esses alunos no período
-        resp_frequencia = supabase.table('f_frequencia').select('*').in_('fk_aluno_id', aluno_ids).gte('data', data_inicio).lte('data', data_fim).execute()
-        frequencia_raw = handle_supabase_response(resp_frequencia)
+        # 2. Busca só as colunas usadas dos registros de frequência desses alunos no período
+        colunas = ", ".join(('fk_aluno_id', 'data', 'status') + CAMPOS_DETALHES_FREQUENCIA)
+        registros = buscar_todas(lambda: supabase.table('f_frequencia').select(colunas)
+                                 .in_('fk_aluno_id', aluno_ids).gte('data', data_inicio).lte('data', data_fim)
+                                 .order('fk_aluno_id').order('data'))
 
-        # Mapeia registros por (aluno_id, data)
-        frequencia_map = {}
-        for reg in frequencia_raw:
-            key = (reg['fk_aluno_id'], reg['data'])
-            frequencia_map[key] = reg
-
-        # 3. Monta a matriz de relatório
-        relatorio = []
-        
-        # Gera a lista completa de datas no mês para a coluna do relatório
-        dias_uteis = [datetime(ano, mes, d).strftime('%Y-%m-%d') for d in range(1, dias_no_mes + 1)]
-
-        for aluno in alunos:
-            aluno_row = {'id': aluno['id'], 'nome': aluno['nome'], 'dias': []}
-            
-            for data in dias_uteis:
-                key = (aluno['id'], data)
-                registro = frequencia_map.get(key)
-                
-                status_final = '?' # Não registrado / Fim de semana, etc.
-                detalhes = None
-
-                if registro:
-                    status_final = registro['status']
-                    if status_final in ['PA', 'PS', 'PAS']:
-                        # Coleta os detalhes para o modal
-                        detalhes = {
-                            'hora_atraso': registro.get('hora_atraso'),
-                            'motivo_atraso': registro.get('motivo_atraso'),
-                            'responsavel_atraso': registro.get('responsavel_atraso'),
-                            'telefone_atraso': registro.get('telefone_atraso'),
-                            'hora_saida': registro.get('hora_saida'),
-                            'motivo_saida': registro.get('motivo_saida'),
-                            'responsavel_saida': registro.get('responsavel_saida'),
-                            'telefone_saida': registro.get('telefone_saida'),
-                        }
-
-                aluno_row['dias'].append({'data': data, 'status': status_final, 'detalhes': detalhes})
-            
-            relatorio.append(aluno_row)
-        
-        return jsonify({
-            'dias_mes': dias_no_mes,
-            'relatorio': relatorio,
-            'dias_uteis': dias_uteis # Lista de datas YYYY-MM-DD
-        }), 200
+        # 3. Monta a matriz compacta (e expande para o formato antigo se preciso)
+        compacto = frequencia_compacta(alunos, registros, ano, mes)
+        if request.args.get('formato') == 'compacto':
+            return jsonify(compacto), 200
+        return jsonify(expandir_frequencia_compacta(compacto)), 200
 
     except Exception as e:
         logging.exception("Erro ao gerar relatório de frequência detalhada")
@@ -1722,14 +3941,355 @@ from flask import send_file
 import io
 from fpdf import FPDF  # ou qualquer biblioteca de PDF que você use
 
-from flask import Flask, request, send_file, jsonify
-import io
-from fpdf import FPDF
+# =========================================================
+# PDF DE OCORRÊNCIAS (fila em processos + cache em disco)
+# =========================================================
+
+PDF_CACHE_DIR = os.environ.get('PDF_CACHE_DIR', os.path.join(tempfile.gettempdir(), 'gestao_pdf_cache'))
+PDF_PROCESSOS = int(os.environ.get('PDF_PROCESSOS', '2'))
+PDF_TIMEOUT_SEGUNDOS = int(os.environ.get('PDF_TIMEOUT_SEGUNDOS', '120'))
+PDF_CACHE_TTL_SEGUNDOS = int(os.environ.get('PDF_CACHE_TTL_SEGUNDOS', str(7 * 24 * 3600)))
+# Intervalo mínimo entre varreduras do cache por worker (o dossiê envia um job por aluno)
+PDF_LIMPEZA_INTERVALO_SEGUNDOS = int(os.environ.get('PDF_LIMPEZA_INTERVALO_SEGUNDOS', '600'))
+# A rota síncrona prende uma thread do gunicorn enquanto espera o PDF; acima deste
+# limite por worker ela responde 202 com o job, como /api/pdf_ocorrencias/jobs
+PDF_ESPERAS_SINCRONAS_MAX = int(os.environ.get('PDF_ESPERAS_SINCRONAS_MAX', str(max(1, int(os.environ.get("GUNICORN_THREADS", "8")) // 4))))
+_esperas_pdf = threading.BoundedSemaphore(PDF_ESPERAS_SINCRONAS_MAX)
+PDF_LAYOUT_VERSAO = 2  # incrementar ao mudar o layout invalida os PDFs em cache
+
+def _paragrafo_pdf(pdf, texto):
+    pdf.multi_cell(0, 6, texto)
+    pdf.set_x(pdf.l_margin)  # o fpdf2 deixa o cursor na margem direita após multi_cell
+
+def renderizar_pdf_ocorrencias(ocorrencias):
+    """Gera o PDF (bytes) das ocorrências de um aluno. Roda nos processos da fila."""
+    pdf = FPDF()
+    pdf.add_page()
+    pdf.set_auto_page_break(auto=True, margin=15)
+    pdf.set_font("Arial", "B", 14)
+    pdf.cell(0, 10, "RELATÓRIO DE REGISTRO DE OCORRÊNCIAS", ln=True, align='C')
+    pdf.set_font("Arial", "", 12)
+    pdf.cell(0, 7, "E.E. PEI PROFESSOR IRENE DIAS RIBEIRO", ln=True, align='C')
+    pdf.ln(5)
+
+    # Cabeçalho do aluno (usando primeira ocorrência)
+    aluno_nome = ocorrencias[0].get("aluno_nome") or "Aluno Desconhecido"
+    sala = ocorrencias[0].get("sala_nome") or "Indefinida"
+    tutor = ocorrencias[0].get("tutor_nome") or "Indefinido"
+    pdf.cell(0, 7, f"Aluno: {aluno_nome}    Sala: {sala}", ln=True)
+    pdf.cell(0, 7, f"Tutor: {tutor}", ln=True)
+    pdf.ln(5)
+
+    for o in ocorrencias:
+        pdf.set_font("Arial", "B", 12)
+        pdf.cell(0, 7, f"Ocorrência nº: {o.get('numero')}", ln=True)
+        pdf.set_font("Arial", "", 12)
+        dt = _parse_data_hora(o.get('data_hora'))
+        data, hora = (dt.strftime('%d/%m/%Y'), dt.strftime('%H:%M')) if dt else ('', '')
+        pdf.cell(0, 6, f"Data: {data}    Hora: {hora}", ln=True)
+        pdf.cell(0, 6, f"Professor: {o.get('professor_nome') or '---'}", ln=True)
+        _paragrafo_pdf(pdf, f"Descrição:\n{o.get('descricao') or ''}")
+
+        _paragrafo_pdf(pdf, f"Atendimento Professor:\n{o.get('atendimento_professor') or ''}")
+        _paragrafo_pdf(pdf, f"Atendimento Tutor (Se solicitado):\n{o.get('atendimento_tutor') or ''}")
+        _paragrafo_pdf(pdf, f"Atendimento Coordenação (Se solicitado):\n{o.get('atendimento_coordenacao') or ''}")
+        _paragrafo_pdf(pdf, f"Atendimento Gestão (Se solicitado):\n{o.get('atendimento_gestao') or ''}")
+        pdf.ln(3)
+        pdf.line(10, pdf.get_y(), 200, pdf.get_y())  # linha separadora
+        pdf.ln(3)
+
+    # Assinatura no final
+    pdf.ln(10)
+    pdf.cell(0, 10, "Assinatura Responsável: _______________________________", ln=True)
+    pdf.cell(0, 10, "Data: ___ / ___ / ______", ln=True)
+
+    pdf_buffer = io.BytesIO()
+    pdf.output(pdf_buffer)
+    return pdf_buffer.getvalue()
+
+def _gravar_pdf_ocorrencias(ocorrencias, destino):
+    """Executado no processo filho: renderiza e publica o arquivo de forma atômica."""
+    conteudo = renderizar_pdf_ocorrencias(ocorrencias)
+    temporario = f"{destino}.{os.getpid()}.tmp"
+    with open(temporario, 'wb') as f:
+        f.write(conteudo)
+    os.replace(temporario, destino)
+
+class FilaPdfOcorrencias:
+    """Fila de geração de PDFs com cache endereçado por conteúdo.
+
+    A chave (que também é o id do job) é o sha256 dos números selecionados e do
+    conteúdo das ocorrências — qualquer edição ou novo atendimento gera outra
+    chave. O estado fica só em disco (<chave>.pdf, .pendente, .erro), então o
+    status é o mesmo em todos os workers do gunicorn.
+    """
+
+    def __init__(self, diretorio, processos, timeout):
+        self.diretorio = diretorio
+        self.processos = processos
+        self.timeout = timeout
+        self._executor = None
+        self._pid = None
+        self._quebrado = False  # um filho morto inutiliza o pool; recria no próximo envio
+        self._lock = threading.Lock()
+        self._limpar_em = 0.0  # monotonic da próxima varredura de expirados
+
+    @staticmethod
+    def chave(ocorrencias):
+        conteudo = json.dumps(
+            {'layout': PDF_LAYOUT_VERSAO, 'ocorrencias': sorted(ocorrencias, key=lambda o: o.get('numero'))},
+            sort_keys=True, default=str,
+        )
+        return hashlib.sha256(conteudo.encode()).hexdigest()
+
+    @staticmethod
+    def chave_valida(chave):
+        return len(chave) == 64 and all(c in '0123456789abcdef' for c in chave)
+
+    def caminho(self, chave, extensao='pdf'):
+        return os.path.join(self.diretorio, f"{chave}.{extensao}")
+
+    def _pool(self):
+        # Um pool por processo: o executor não sobrevive ao fork dos workers do gunicorn
+        with self._lock:
+            if self._executor is None or self._pid != os.getpid() or self._quebrado:
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.processos, mp_context=multiprocessing.get_context('spawn'))
+                self._pid = os.getpid()
+                self._quebrado = False
+            return self._executor
+
+    def status(self, chave):
+        if os.path.exists(self.caminho(chave)):
+            return 'pronto'
+        if os.path.exists(self.caminho(chave, 'erro')):
+            return 'erro'
+        try:
+            iniciado = os.path.getmtime(self.caminho(chave, 'pendente'))
+        except FileNotFoundError:
+            return None
+        # Marcador órfão (worker reiniciado no meio da geração) conta como erro
+        return 'pendente' if time.time() - iniciado < 2 * self.timeout else 'erro'
 
-app = Flask(__name__)
+    def erro(self, chave):
+        try:
+            with open(self.caminho(chave, 'erro'), encoding='utf-8') as f:
+                return f.read()
+        except FileNotFoundError:
+            return "Geração interrompida"
+
+    def enviar(self, chave, ocorrencias):
+        """Agenda a geração se ainda não houver PDF pronto ou em andamento. Retorna o status."""
+        atual = self.status(chave)
+        if atual in ('pronto', 'pendente'):
+            return atual
+        os.makedirs(self.diretorio, exist_ok=True)
+        self._limpar_expirados_se_preciso()
+        for extensao in ('erro', 'pendente'):
+            if os.path.exists(self.caminho(chave, extensao)):
+                os.remove(self.caminho(chave, extensao))
+        try:
+            # O_EXCL: se outro worker acabou de agendar a mesma chave, só acompanha
+            os.close(os.open(self.caminho(chave, 'pendente'), os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+        except FileExistsError:
+            return 'pendente'
+
+        try:
+            futuro = self._pool().submit(_gravar_pdf_ocorrencias, ocorrencias, self.caminho(chave))
+        except BrokenProcessPool:
+            self._quebrado = True
+            futuro = self._pool().submit(_gravar_pdf_ocorrencias, ocorrencias, self.caminho(chave))
+        futuro.add_done_callback(lambda f: self._concluir(chave, f))
+        return 'pendente'
+
+    def _concluir(self, chave, futuro):
+        erro = futuro.exception()
+        if erro is not None:
+            if isinstance(erro, BrokenProcessPool):
+                self._quebrado = True
+            logging.error(f"Falha ao gerar PDF {chave}: {erro}")
+            with open(self.caminho(chave, 'erro'), 'w', encoding='utf-8') as f:
+                f.write(str(erro))
+        try:
+            os.remove(self.caminho(chave, 'pendente'))
+        except FileNotFoundError:
+            pass
+
+    def aguardar(self, chave, timeout):
+        limite = time.monotonic() + timeout
+        while time.monotonic() < limite:
+            atual = self.status(chave)
+            if atual != 'pendente':
+                return atual
+            time.sleep(0.1)
+        return 'pendente'
+
+    def _limpar_expirados_se_preciso(self):
+        # A varredura é um listdir do cache inteiro: no máximo uma por intervalo, não uma por job
+        with self._lock:
+            agora = time.monotonic()
+            if agora < self._limpar_em:
+                return
+            self._limpar_em = agora + PDF_LIMPEZA_INTERVALO_SEGUNDOS
+        self._limpar_expirados()
+
+    def _limpar_expirados(self):
+        limite = time.time() - PDF_CACHE_TTL_SEGUNDOS
+        for nome in os.listdir(self.diretorio):
+            caminho = os.path.join(self.diretorio, nome)
+            try:
+                if nome.endswith(('.pdf', '.erro')) and os.path.getmtime(caminho) < limite:
+                    os.remove(caminho)
+            except FileNotFoundError:
+                pass
+
+fila_pdf = FilaPdfOcorrencias(PDF_CACHE_DIR, PDF_PROCESSOS, PDF_TIMEOUT_SEGUNDOS)
+
+def _buscar_ocorrencias_pdf(numeros):
+    numeros = [int(n) for n in numeros]
+    resp = LEITURA_OCORRENCIA_DETALHE.consulta().in_('numero', numeros).order('data_hora', desc=True).execute()
+    return LEITURA_OCORRENCIA_DETALHE.linhas(resp)
+
+def _nome_arquivo_pdf(ocorrencias):
+    return (ocorrencias[0].get('aluno_nome') or 'relatorio').replace(' ', '_') + "_ocorrencias.pdf"
+
+def _resposta_job_pdf(chave, status, http_status=200):
+    dados = {
+        "job_id": chave,
+        "status": status,
+        "url_status": f"/api/pdf_ocorrencias/jobs/{chave}",
+        "url_download": f"/api/pdf_ocorrencias/jobs/{chave}/download",
+    }
+    if status == 'erro':
+        dados["error"] = fila_pdf.erro(chave)
+    return jsonify(dados), http_status
+
+@app.route('/api/pdf_ocorrencias/jobs', methods=['POST'])
+def enviar_job_pdf_ocorrencias():
+    """Agenda o PDF e responde na hora: 200 se já estava em cache, 202 se foi para a fila."""
+    dados = request.get_json() or {}
+    numeros = dados.get('numeros', [])
+    if not numeros:
+        return jsonify({"error": "Nenhuma ocorrência selecionada"}), 400
+    try:
+        ocorrencias = _buscar_ocorrencias_pdf(numeros)
+        if not ocorrencias:
+            return jsonify({"error": "Nenhuma ocorrência encontrada"}), 404
+        chave = fila_pdf.chave(ocorrencias)
+        status = fila_pdf.enviar(chave, ocorrencias)
+        return _resposta_job_pdf(chave, status, 200 if status == 'pronto' else 202)
+    except Exception as e:
+        logging.exception("Erro ao agendar PDF de ocorrências")
+        return jsonify({"error": f"Falha ao agendar PDF: {e}", "status": 500}), 500
+
+@app.route('/api/pdf_ocorrencias/jobs/<job_id>', methods=['GET'])
+def status_job_pdf_ocorrencias(job_id):
+    status = fila_pdf.status(job_id) if fila_pdf.chave_valida(job_id) else None
+    if status is None:
+        return jsonify({"error": "Job não encontrado", "status": 404}), 404
+    return _resposta_job_pdf(job_id, status)
+
+@app.route('/api/pdf_ocorrencias/jobs/<job_id>/download', methods=['GET'])
+def download_job_pdf_ocorrencias(job_id):
+    status = fila_pdf.status(job_id) if fila_pdf.chave_valida(job_id) else None
+    if status is None:
+        return jsonify({"error": "Job não encontrado", "status": 404}), 404
+    if status != 'pronto':
+        return _resposta_job_pdf(job_id, status, 409)
+    nome = request.args.get('nome') or "ocorrencias.pdf"
+    return send_file(fila_pdf.caminho(job_id), as_attachment=True, download_name=nome, mimetype='application/pdf')
+
+class _SaidaZip:
+    """Destino não-posicionável para o zipfile: acumula os bytes até o gerador drená-los."""
+
+    def __init__(self):
+        self._partes = []
+
+    def write(self, dados):
+        self._partes.append(bytes(dados))
+        return len(dados)
+
+    def flush(self):
+        pass
+
+    def drenar(self):
+        dados = b''.join(self._partes)
+        self._partes.clear()
+        return dados
+
+def _nome_seguro(texto):
+    return re.sub(r'[^\w.-]+', '_', str(texto or '')).strip('_') or 'sem_nome'
+
+@app.route('/api/dossie_ocorrencias', methods=['GET'])
+def dossie_ocorrencias():
+    """ZIP com um PDF por aluno (uma pasta por sala), para uma sala ou a escola toda.
+
+    Aceita os filtros da listagem (sala, aluno, status, data_inicial, data_final).
+    Os PDFs são gerados em paralelo pela fila_pdf (e reaproveitam o cache dela) e
+    entram no ZIP na ordem em que ficam prontos.
+    """
+    try:
+        args = request.args.copy()
+        grupos = {}
+        consulta = lambda: filtrar_ocorrencias(LEITURA_OCORRENCIAS_DOSSIE.consulta(), args)
+        for linha in percorrer_ocorrencias(consulta, converter=LEITURA_OCORRENCIAS_DOSSIE.linhas):
+            # Sem aluno_id, a linha fica igual à do PDF individual e compartilha o cache
+            grupos.setdefault(linha.pop('aluno_id', None), []).append(linha)
+        if not grupos:
+            return jsonify({"error": "Nenhuma ocorrência encontrada"}), 404
+
+        pendentes = {}
+        for aluno_id, ocorrencias in grupos.items():
+            chave = fila_pdf.chave(ocorrencias)
+            fila_pdf.enviar(chave, ocorrencias)
+            primeira = ocorrencias[0]
+            nome = f"{_nome_seguro(primeira.get('sala_nome'))}/{_nome_seguro(primeira.get('aluno_nome'))}_{aluno_id}_ocorrencias.pdf"
+            pendentes[chave] = nome
+    except ParametrosInvalidos as e:
+        return jsonify({"error": str(e), "status": 400}), 400
+    except Exception as e:
+        logging.exception("Erro ao preparar dossiê de ocorrências")
+        return jsonify({"error": f"Falha ao gerar dossiê: {e}", "status": 500}), 500
+
+    def gerar():
+        saida = _SaidaZip()
+        falhas = []
+        with zipfile.ZipFile(saida, 'w', compression=zipfile.ZIP_STORED) as zf:
+            # Prazo renovado a cada PDF concluído: só desiste se a fila parar de andar
+            prazo = time.monotonic() + PDF_TIMEOUT_SEGUNDOS
+            while pendentes and time.monotonic() < prazo:
+                prontos = [(c, fila_pdf.status(c)) for c in pendentes]
+                prontos = [(c, st) for c, st in prontos if st != 'pendente']
+                if not prontos:
+                    time.sleep(0.1)
+                    continue
+                for chave, status in prontos:
+                    nome = pendentes.pop(chave)
+                    if status == 'pronto':
+                        zf.write(fila_pdf.caminho(chave), nome)
+                    else:
+                        falhas.append(f"{nome}: {fila_pdf.erro(chave)}")
+                    yield saida.drenar()
+                prazo = time.monotonic() + PDF_TIMEOUT_SEGUNDOS
+            falhas.extend(f"{nome}: tempo esgotado" for nome in pendentes.values())
+            if falhas:
+                logging.error(f"Dossiê gerado com {len(falhas)} falha(s)")
+                zf.writestr('ERROS.txt', "\n".join(falhas))
+        yield saida.drenar()
+
+    resposta = Response(stream_with_context(gerar()), mimetype='application/zip')
+    resposta.headers['Content-Disposition'] = 'attachment; filename=dossie_ocorrencias.zip'
+    resposta.headers['X-Accel-Buffering'] = 'no'
+    return resposta
 
 @app.route('/api/gerar_pdf_ocorrencias', methods=['POST'])
 def gerar_pdf_ocorrencias():
+    """Versão síncrona usada pelas telas atuais: passa pela mesma fila e cache.
+
+    Responde com o PDF quando ele fica pronto a tempo. Sem vaga para esperar
+    (PDF_ESPERAS_SINCRONAS_MAX) ou com o tempo esgotado, responde 202 com o job
+    já na fila, e a tela acompanha por url_status / url_download.
+    """
     dados = request.get_json()
     numeros = dados.get('numeros', [])
 
@@ -1737,69 +4297,26 @@ def gerar_pdf_ocorrencias():
         return jsonify({"error": "Nenhuma ocorrência selecionada"}), 400
 
     try:
-        # Buscar ocorrências no Supabase
-        resp = supabase.table('ocorrencias').select(
-            "numero, data_hora, descricao, status, aluno_nome, sala_id, tutor, atendimento_professor, atendimento_tutor, atendimento_coordenacao, atendimento_gestao"
-        ).in_('numero', numeros).order('data_hora', desc=True).execute()
-
-        ocorrencias = resp.data
-
+        ocorrencias = _buscar_ocorrencias_pdf(numeros)
         if not ocorrencias:
             return jsonify({"error": "Nenhuma ocorrência encontrada"}), 404
 
-        pdf = FPDF()
-        pdf.add_page()
-        pdf.set_auto_page_break(auto=True, margin=15)
-        pdf.set_font("Arial", "B", 14)
-        pdf.cell(0, 10, "RELATÓRIO DE REGISTRO DE OCORRÊNCIAS", ln=True, align='C')
-        pdf.set_font("Arial", "", 12)
-        pdf.cell(0, 7, "E.E. PEI PROFESSOR IRENE DIAS RIBEIRO", ln=True, align='C')
-        pdf.ln(5)
-
-        # Cabeçalho do aluno (usando primeira ocorrência)
-        aluno_nome = ocorrencias[0].get("aluno_nome", "Aluno Desconhecido")
-        sala = ocorrencias[0].get("sala_id", "Indefinida")
-        tutor = ocorrencias[0].get("tutor", "Indefinido")
-        pdf.cell(0, 7, f"Aluno: {aluno_nome}    Sala: {sala}", ln=True)
-        pdf.cell(0, 7, f"Tutor: {tutor}", ln=True)
-        pdf.ln(5)
-
-        for o in ocorrencias:
-            pdf.set_font("Arial", "B", 12)
-            pdf.cell(0, 7, f"Ocorrência nº: {o.get('numero')}", ln=True)
-            pdf.set_font("Arial", "", 12)
-            data_hora = o.get('data_hora', '')
-            if data_hora:
-                data, hora = str(data_hora).split(' ')
-            else:
-                data, hora = '', ''
-            pdf.cell(0, 6, f"Data: {data}    Hora: {hora}", ln=True)
-            professor = o.get('atendimento_professor', '---')
-            pdf.cell(0, 6, f"Professor: {professor}", ln=True)
-            pdf.multi_cell(0, 6, f"Descrição:\n{o.get('descricao', '')}")
-            
-            pdf.cell(0, 6, f"Atendimento Professor:\n{o.get('atendimento_professor', '')}", ln=True)
-            pdf.cell(0, 6, f"Atendimento Tutor (Se solicitado):\n{o.get('atendimento_tutor', '')}", ln=True)
-            pdf.cell(0, 6, f"Atendimento Coordenação (Se solicitado):\n{o.get('atendimento_coordenacao', '')}", ln=True)
-            pdf.cell(0, 6, f"Atendimento Gestão (Se solicitado):\n{o.get('atendimento_gestao', '')}", ln=True)
-            pdf.ln(3)
-            pdf.line(10, pdf.get_y(), 200, pdf.get_y())  # linha separadora
-            pdf.ln(3)
-
-        # Assinatura no final
-        pdf.ln(10)
-        pdf.cell(0, 10, "Assinatura Responsável: _______________________________", ln=True)
-        pdf.cell(0, 10, "Data: ___ / ___ / ______", ln=True)
-
-        pdf_buffer = io.BytesIO()
-        pdf.output(pdf_buffer)
-        pdf_buffer.seek(0)
-
-        nome_arquivo = aluno_nome.replace(' ', '_') + "_ocorrencias.pdf"
+        chave = fila_pdf.chave(ocorrencias)
+        status = fila_pdf.enviar(chave, ocorrencias)
+        if status == 'pendente' and _esperas_pdf.acquire(blocking=False):
+            try:
+                status = fila_pdf.aguardar(chave, PDF_TIMEOUT_SEGUNDOS)
+            finally:
+                _esperas_pdf.release()
+        if status == 'pendente':
+            return _resposta_job_pdf(chave, status, 202)
+        if status != 'pronto':
+            return jsonify({"error": f"Falha ao gerar PDF: {fila_pdf.erro(chave)}"}), 500
+
         return send_file(
-            pdf_buffer,
+            fila_pdf.caminho(chave),
             as_attachment=True,
-            download_name=nome_arquivo,
+            download_name=_nome_arquivo_pdf(ocorrencias),
             mimetype='application/pdf'
         )
 
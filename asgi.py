@@ -0,0 +1,178 @@
+"""
+Modo ASGI opcional do sistema de gestão (SERVIDOR=asgi no start.sh).
+
+As leituras mais acessadas (listagens de ocorrências, detalhe e status da
+frequência do dia) rodam como corrotinas sobre um AsyncClient do Supabase com
+um pool de conexões HTTP/2 compartilhado pelo worker: enquanto uma requisição
+espera o PostgREST, o mesmo processo atende as outras. Elas usam os mesmos
+planos de consulta das rotas Flask (plano_* no app.py), então filtros,
+paginação e formato da resposta são idênticos.
+
+Todas as demais rotas (escritas, páginas, PDFs, exportações em streaming)
+continuam no app Flask, executado num pool de threads pelo a2wsgi.
+
+Uso:
+    uvicorn asgi:app --host 0.0.0.0 --port $PORT --workers 2
+"""
+import contextvars
+import logging
+import os
+import re
+import time
+from urllib.parse import parse_qsl
+
+import httpx
+from a2wsgi import WSGIMiddleware
+from supabase import AsyncClientOptions, create_async_client
+from werkzeug.datastructures import MultiDict
+from werkzeug.http import parse_accept_header
+
+import app as gestao
+
+ASGI_MAX_CONEXOES = int(os.environ.get("ASGI_MAX_CONEXOES", "50"))
+ASGI_THREADS_WSGI = int(os.environ.get("ASGI_THREADS_WSGI", "10"))
+
+# Lista de chamadas ao Supabase da requisição assíncrona corrente (equivalente ao g.chamadas_supabase)
+_chamadas_supabase = contextvars.ContextVar('chamadas_supabase', default=None)
+
+
+async def _hook_requisicao_supabase(http_request):
+    http_request.extensions['inicio_metricas'] = time.perf_counter()
+    chamadas = _chamadas_supabase.get()
+    if chamadas is not None:
+        chamadas.append(gestao._tabela_da_url(http_request.url.path))
+
+
+async def _hook_resposta_supabase(http_response):
+    gestao.registrar_resposta_supabase(http_response)
+
+
+def _erro_simples(e):
+    return {"error": str(e)}
+
+def _erro_detalhes(e):
+    return {"error": f"Falha ao buscar detalhes: {e}", "status": 500}
+
+
+# (caminho, função(args, cliente, **parâmetros do caminho) que devolve o plano,
+#  corpo do erro 500 — o mesmo que a rota Flask correspondente devolve)
+ROTAS_ASSINCRONAS = [
+    (re.compile(r'/api/ocorrencias_abertas'),
+     lambda args, cliente: gestao.plano_ocorrencias_por_status(args, "Aberta", cliente), _erro_simples),
+    (re.compile(r'/api/ocorrencias_finalizadas'),
+     lambda args, cliente: gestao.plano_ocorrencias_por_status(args, "Finalizada", cliente), _erro_simples),
+    (re.compile(r'/api/ocorrencias_todas'),
+     lambda args, cliente: gestao.plano_ocorrencias_lista(args, cliente), _erro_simples),
+    (re.compile(r'/api/ocorrencias'),
+     lambda args, cliente: gestao.plano_ocorrencias_lista(args, cliente), _erro_detalhes),
+    (re.compile(r'/api/ocorrencias/(?P<ocorrencia_id>[^/]+)'),
+     lambda args, cliente, ocorrencia_id: gestao.plano_ocorrencia_detalhe(ocorrencia_id, cliente), _erro_detalhes),
+    (re.compile(r'/api/frequencia/status'),
+     lambda args, cliente: gestao.plano_frequencia_status(args, cliente), _erro_simples),
+]
+
+
+class AplicacaoAsgi:
+    """Despacha as rotas de ROTAS_ASSINCRONAS para corrotinas e o resto para o Flask."""
+
+    def __init__(self, wsgi_app):
+        self.flask = WSGIMiddleware(wsgi_app, workers=ASGI_THREADS_WSGI)
+        self._mapa_flask = wsgi_app.url_map.bind('localhost')
+        self.cliente = None
+        self._http = None
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self._ciclo_de_vida(receive, send)
+            return
+        if scope['type'] == 'http' and scope['method'] == 'GET' and self.cliente is not None:
+            args = MultiDict(parse_qsl(scope['query_string'].decode('latin1'), keep_blank_values=True))
+            # Exportações em streaming ficam com o Flask (gerador síncrono)
+            if args.get('formato') not in gestao.FORMATOS_STREAMING:
+                for padrao, plano, erro in ROTAS_ASSINCRONAS:
+                    encontrado = padrao.fullmatch(scope['path'])
+                    if encontrado:
+                        # Mesmo rótulo de rota das métricas do Flask (o padrão da regra, não a URL)
+                        regra, _ = self._mapa_flask.match(scope['path'], method='GET', return_rule=True)
+                        await self._responder(scope, send, plano, erro, args, encontrado.groupdict(), regra.rule)
+                        return
+        await self.flask(scope, receive, send)
+
+    async def _ciclo_de_vida(self, receive, send):
+        while True:
+            mensagem = await receive()
+            if mensagem['type'] == 'lifespan.startup':
+                try:
+                    await self._iniciar()
+                except Exception as e:
+                    logging.exception("Falha ao iniciar o cliente assíncrono do Supabase")
+                    await send({'type': 'lifespan.startup.failed', 'message': str(e)})
+                    return
+                await send({'type': 'lifespan.startup.complete'})
+            elif mensagem['type'] == 'lifespan.shutdown':
+                if self._http is not None:
+                    await self._http.aclose()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    async def _iniciar(self):
+        # Um pool por worker: criado aqui, depois do fork do servidor
+        self._http = httpx.AsyncClient(
+            http2=True,
+            follow_redirects=True,
+            timeout=gestao.timeout_supabase(),
+            limits=gestao.limites_pool_supabase(ASGI_MAX_CONEXOES),
+            event_hooks={'request': [_hook_requisicao_supabase], 'response': [_hook_resposta_supabase]},
+        )
+        self.cliente = await create_async_client(
+            gestao.SUPABASE_URL,
+            gestao.SUPABASE_KEY,
+            options=AsyncClientOptions(httpx_client=self._http),
+        )
+        gestao.iniciar_reconciliador()
+        logging.info(f"[ASGI] Cliente assíncrono pronto (até {ASGI_MAX_CONEXOES} conexões)")
+
+    async def _responder(self, scope, send, plano, erro, args, parametros, rota):
+        inicio = time.perf_counter()
+        chamadas = []
+        _chamadas_supabase.set(chamadas)
+        cabecalhos = {}
+        try:
+            q, montar = plano(args, self.cliente, **parametros)
+            corpo, cabecalhos = montar(await q.execute())
+            status = 200
+        except gestao.ParametrosInvalidos as e:
+            corpo, status = {"error": str(e)}, 400
+        except Exception as e:
+            logging.exception(f"Erro {scope['path']} (ASGI)")
+            corpo, status = erro(e), 500
+
+        # Mesmo serializador do jsonify, para a resposta sair byte a byte igual à do Flask
+        dados = gestao.app.json.response(corpo).get_data()
+        codificacao = None
+        if status == 200:
+            aceitas = dict(scope['headers']).get(b'accept-encoding', b'').decode('latin1')
+            dados, codificacao = gestao.comprimir_corpo(dados, parse_accept_header(aceitas))
+        cabecalhos = {
+            'Content-Type': 'application/json',
+            'Content-Length': str(len(dados)),
+            'Vary': 'Accept-Encoding',
+            'X-Supabase-Chamadas': str(len(chamadas)),
+            **cabecalhos,
+        }
+        if codificacao:
+            cabecalhos['Content-Encoding'] = codificacao
+        await send({
+            'type': 'http.response.start',
+            'status': status,
+            'headers': [(k.lower().encode('latin1'), v.encode('latin1')) for k, v in cabecalhos.items()],
+        })
+        await send({'type': 'http.response.body', 'body': dados})
+
+        gestao.metricas.contar('gestao_http_requisicoes_total', {'rota': rota, 'metodo': 'GET', 'status': str(status)})
+        gestao.metricas.observar('gestao_http_duracao_segundos', {'rota': rota, 'metodo': 'GET'}, time.perf_counter() - inicio)
+        gestao.metricas.observar('gestao_http_resposta_bytes', {'rota': rota}, len(dados))
+        gestao.metricas.gravar()
+
+
+app = AplicacaoAsgi(gestao.app)
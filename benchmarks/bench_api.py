@@ -0,0 +1,147 @@
+"""
+Benchmark ponta a ponta das rotas da API contra o SupabaseFake.
+
+Sobe o app Flask com o fake em memória (dados_escola.py), aplica uma latência
+fixa a cada chamada ao "PostgREST" e dispara requisições concorrentes pelo
+test_client. Para cada rota informa vazão, latência p50/p95/p99 e o nº médio
+de chamadas ao Supabase por requisição. Não acessa a rede.
+
+Uso:
+    python benchmarks/bench_api.py [--escala 1] [--latencia-ms 5] [--requisicoes 200]
+                                   [--concorrencia 8] [--rotas alunos,salvar_frequencia]
+                                   [--json resultado.json]
+"""
+import argparse
+import json
+import logging
+import os
+import random
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+AQUI = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(AQUI, '..'))
+sys.path.insert(0, AQUI)
+os.environ.setdefault('SUPABASE_URL', 'http://localhost')
+os.environ.setdefault('SUPABASE_KEY', 'benchmark')
+os.environ.setdefault('RECONCILIACAO_INTERVALO_SEGUNDOS', '0')
+os.environ.setdefault('SUPABASE_AQUECIMENTO_SEGUNDOS', '0')
+
+import app  # noqa: E402
+from dados_escola import dias_letivos, gerar_dados  # noqa: E402
+from supabase_fake import SupabaseFake  # noqa: E402
+
+
+def _sala(r, dados):
+    return r.choice(dados['d_salas'])['id']
+
+
+def _chamada_da_sala(r, dados):
+    """Payload de /api/salvar_frequencia: a chamada de uma sala inteira num dia."""
+    sala_id = _sala(r, dados)
+    data = r.choice(dias_letivos())
+    return [{'aluno_id': a['id'], 'sala_id': sala_id, 'data': data, 'status': r.choice(('P', 'P', 'P', 'F'))}
+            for a in dados['d_alunos'] if a['sala_id'] == sala_id]
+
+
+# nome -> função(random, dados) que devolve (método, url, corpo json)
+ROTAS = {
+    'salas': lambda r, d: ('GET', '/api/salas', None),
+    'alunos': lambda r, d: ('GET', '/api/alunos', None),
+    'alunos_por_sala': lambda r, d: ('GET', f'/api/alunos_por_sala/{_sala(r, d)}', None),
+    'ocorrencias_abertas': lambda r, d: ('GET', '/api/ocorrencias_abertas?limit=100', None),
+    'ocorrencias_todas': lambda r, d: ('GET', f'/api/ocorrencias_todas?sala={_sala(r, d)}', None),
+    'ocorrencia_detalhe': lambda r, d: ('GET', f"/api/ocorrencias/{r.choice(d['ocorrencias'])['numero']}", None),
+    'relatorio_estatistico': lambda r, d: ('GET', '/api/relatorio_estatistico', None),
+    'relatorio_frequencia': lambda r, d: ('GET', f'/api/relatorio_frequencia?salaId={_sala(r, d)}', None),
+    'frequencia_status': lambda r, d: ('GET', f"/api/frequencia/status?sala_id={_sala(r, d)}&data={r.choice(dias_letivos())}", None),
+    'salvar_frequencia': lambda r, d: ('POST', '/api/salvar_frequencia', _chamada_da_sala(r, d)),
+}
+
+
+def percentil(valores_ordenados, p):
+    """Percentil pelo método do posto mais próximo."""
+    if not valores_ordenados:
+        return 0.0
+    posto = max(1, -(-len(valores_ordenados) * p // 100))
+    return valores_ordenados[int(posto) - 1]
+
+
+class Executor:
+    def __init__(self, dados, latencia):
+        self.dados = dados
+        # O fake não passa pelo httpx: repassa cada chamada à contagem do app (X-Supabase-Chamadas)
+        self.fake = SupabaseFake(dados, latencia=latencia,
+                                 ao_executar=lambda tabela, *_: app.registrar_chamada_supabase(tabela))
+        self._local = threading.local()
+        app.supabase = self.fake
+
+    def _cliente(self):
+        if not hasattr(self._local, 'cliente'):
+            self._local.cliente = app.app.test_client()
+        return self._local.cliente
+
+    def requisitar(self, metodo, url, corpo):
+        inicio = time.perf_counter()
+        resposta = self._cliente().open(url, method=metodo, json=corpo)
+        decorrido = time.perf_counter() - inicio
+        return decorrido, resposta.status_code, int(resposta.headers.get('X-Supabase-Chamadas', 0))
+
+
+def medir_rota(executor, nome, requisicoes, concorrencia, seed=1):
+    gerar = ROTAS[nome]
+    r = random.Random(seed)
+    pedidos = [gerar(r, executor.dados) for _ in range(requisicoes)]
+    executor.requisitar(*pedidos[0])  # aquecimento: caches e agregados em memória
+
+    inicio = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concorrencia) as pool:
+        resultados = list(pool.map(lambda p: executor.requisitar(*p), pedidos))
+    total = time.perf_counter() - inicio
+
+    latencias = sorted(t for t, _, _ in resultados)
+    return {
+        'rota': nome,
+        'requisicoes': requisicoes,
+        'vazao_rps': requisicoes / total,
+        'p50_ms': percentil(latencias, 50) * 1000,
+        'p95_ms': percentil(latencias, 95) * 1000,
+        'p99_ms': percentil(latencias, 99) * 1000,
+        'chamadas_por_req': sum(c for _, _, c in resultados) / requisicoes,
+        'erros': sum(1 for _, status, _ in resultados if status >= 400),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--escala', type=float, default=1.0, help='tamanho da escola (1 = 30 salas, 4.000 ocorrências)')
+    parser.add_argument('--latencia-ms', type=float, default=5.0, help='latência por chamada ao Supabase')
+    parser.add_argument('--requisicoes', type=int, default=200, help='requisições por rota')
+    parser.add_argument('--concorrencia', type=int, default=8)
+    parser.add_argument('--rotas', default=','.join(ROTAS), help='lista separada por vírgulas')
+    parser.add_argument('--json', help='grava os resultados neste arquivo')
+    args = parser.parse_args()
+
+    logging.getLogger().setLevel(logging.WARNING)
+    dados = gerar_dados(args.escala)
+    executor = Executor(dados, args.latencia_ms / 1000)
+    print(f"escala={args.escala} ({len(dados['d_alunos'])} alunos, {len(dados['ocorrencias'])} ocorrências, "
+          f"{len(dados['f_frequencia'])} frequências), latência={args.latencia_ms}ms, concorrência={args.concorrencia}")
+    print(f"{'rota':<24} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'chamadas':>9} {'erros':>6}")
+
+    resultados = []
+    for nome in args.rotas.split(','):
+        res = medir_rota(executor, nome.strip(), args.requisicoes, args.concorrencia)
+        resultados.append(res)
+        print(f"{res['rota']:<24} {res['vazao_rps']:>8.1f} {res['p50_ms']:>8.1f} {res['p95_ms']:>8.1f} "
+              f"{res['p99_ms']:>8.1f} {res['chamadas_por_req']:>9.1f} {res['erros']:>6}")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'parametros': vars(args), 'resultados': resultados}, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,81 @@
+"""
+Benchmark da agregação de /api/relatorio_estatistico.
+
+Compara a carga por linha (uma Contribuicao por ocorrência, em Python puro)
+com a carga colunar (NumPy) usada por EstatisticasOcorrencias.reconstruir().
+Os dados são sintéticos e gerados em memória — não acessa o Supabase.
+
+Uso:
+    python benchmarks/bench_estatisticas.py [10000 100000 1000000]
+"""
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+os.environ.setdefault('SUPABASE_URL', 'http://localhost')
+os.environ.setdefault('SUPABASE_KEY', 'benchmark')
+
+from app import EstatisticasOcorrencias, DEFAULT_AUTOTEXT  # noqa: E402
+
+TAMANHOS_PADRAO = (10_000, 100_000, 1_000_000)
+N_SALAS = 30
+N_TUTORES = 40
+
+# Mapas de nomes como os da rota (ids em texto), para que por_sala e por_tutor entrem na comparação
+SALAS_MAP = {str(i): f'Sala {i}' for i in range(1, N_SALAS + 1)}
+TUTORES_MAP = {str(i): f'Tutor {i}' for i in range(1, N_TUTORES + 1)}
+
+
+def gerar_ocorrencias(n, seed=42):
+    r = random.Random(seed)
+    textos = ['', None, 'Conversa com o aluno', DEFAULT_AUTOTEXT]
+    linhas = []
+    for numero in range(1, n + 1):
+        mes, dia = r.randint(1, 12), r.randint(1, 28)
+        linhas.append({
+            'numero': numero,
+            'data_hora': f'2025-{mes:02d}-{dia:02d}T{r.randint(7, 17):02d}:{r.randint(0, 59):02d}:00',
+            'status': r.choice(('Aberta', 'Finalizada')),
+            'tipo': r.choice(('Comportamental', 'Pedagógica', None)),
+            'sala_id': r.randint(1, N_SALAS),
+            'tutor_id': r.choice((None, *range(1, N_TUTORES + 1))),
+            'solicitado_tutor': r.choice(('SIM', 'NÃO')),
+            'solicitado_coordenacao': r.choice(('SIM', 'NÃO')),
+            'solicitado_gestao': r.choice(('SIM', 'NÃO')),
+            'atendimento_tutor': r.choice(textos),
+            'atendimento_coordenacao': r.choice(textos),
+            'atendimento_gestao': r.choice(textos),
+            'dt_atendimento_gestao': r.choice((None, f'2026-{mes:02d}-{dia:02d}T{r.randint(7, 17):02d}:00:00')),
+        })
+    return linhas
+
+
+def medir(linhas, colunar, repeticoes=3):
+    melhor = None
+    for _ in range(repeticoes):
+        estatisticas = EstatisticasOcorrencias(intervalo_reconstrucao=3600)
+        inicio = time.perf_counter()
+        estatisticas.carregar(linhas, colunar=colunar)
+        decorrido = time.perf_counter() - inicio
+        melhor = decorrido if melhor is None else min(melhor, decorrido)
+    return melhor, estatisticas
+
+
+def main(tamanhos):
+    print(f"{'linhas':>10} {'por linha (s)':>14} {'colunar (s)':>12} {'ganho':>7}")
+    for n in tamanhos:
+        linhas = gerar_ocorrencias(n)
+        repeticoes = 1 if n >= 1_000_000 else 3
+        t_linha, ref = medir(linhas, colunar=False, repeticoes=repeticoes)
+        t_colunar, col = medir(linhas, colunar=True, repeticoes=repeticoes)
+        esperado = ref.relatorio(SALAS_MAP, TUTORES_MAP)
+        obtido = col.relatorio(SALAS_MAP, TUTORES_MAP)
+        for secao in esperado:
+            assert esperado[secao] == obtido[secao], f'resultados divergentes em {secao}'
+        print(f'{n:>10} {t_linha:>14.3f} {t_colunar:>12.3f} {t_linha / t_colunar:>6.1f}x')
+
+
+if __name__ == '__main__':
+    main([int(a) for a in sys.argv[1:]] or TAMANHOS_PADRAO)
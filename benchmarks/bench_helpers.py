@@ -0,0 +1,208 @@
+"""
+Micro-benchmark das funções por linha das listagens de ocorrências.
+
+Mede `_to_bool`, `formatar_data_hora`, `calcular_dias_resposta`,
+`reconciliar_ocorrencia` (derivação do status), `_formatar_ocorrencia_listagem`
+e a carga de EstatisticasOcorrencias sobre 1 mil a 1 milhão de ocorrências
+sintéticas (as mesmas do bench_estatisticas.py).
+
+Cada caso/tamanho roda num processo Python novo (sem cache, heap ou JIT de
+especialização herdados dos casos anteriores), com o coletor de lixo desligado
+durante a medição. Cada repetição mede o caso (repetido até somar
+AMOSTRA_MINIMA_SEGUNDOS, para os tamanhos pequenos) e, logo em seguida, um laço
+de referência em Python puro; o valor normalizado é a mediana das razões
+caso/referência, para que a linha de base gravada numa máquina sirva de
+comparação em outra e uma oscilação de carga da máquina afete os dois lados.
+Em `comparar`, um caso acima da tolerância é medido de novo antes de contar
+como regressão.
+
+Uso:
+    python benchmarks/bench_helpers.py executar  [--tamanhos 1000 10000]
+    python benchmarks/bench_helpers.py registrar [--baseline benchmarks/baseline_helpers.json]
+    python benchmarks/bench_helpers.py comparar  [--tolerancia 0.2]   # sai com código 1 se houver regressão
+"""
+import argparse
+import gc
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+
+AQUI = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(AQUI, '..'))
+sys.path.insert(0, AQUI)
+os.environ.setdefault('SUPABASE_URL', 'http://localhost')
+os.environ.setdefault('SUPABASE_KEY', 'benchmark')
+
+from app import (  # noqa: E402
+    EstatisticasOcorrencias, _formatar_ocorrencia_listagem, _to_bool, calcular_dias_resposta,
+    formatar_data_hora, reconciliar_ocorrencia,
+)
+from bench_estatisticas import gerar_ocorrencias  # noqa: E402
+
+TAMANHOS_PADRAO = (1_000, 10_000, 100_000, 1_000_000)
+BASELINE_PADRAO = os.path.join(AQUI, 'baseline_helpers.json')
+AMOSTRA_MINIMA_SEGUNDOS = 0.05
+
+
+def _todos(funcao):
+    def executar(linhas):
+        for linha in linhas:
+            funcao(linha)
+    return executar
+
+
+def _to_bool_campos(linha):
+    _to_bool(linha['solicitado_tutor'])
+    _to_bool(linha['solicitado_coordenacao'])
+    _to_bool(linha['solicitado_gestao'])
+
+
+def _carregar_estatisticas(linhas):
+    EstatisticasOcorrencias(intervalo_reconstrucao=3600).carregar(linhas)
+
+
+# nome -> função que processa a lista inteira de ocorrências
+CASOS = {
+    'to_bool': _todos(_to_bool_campos),
+    'formatar_data_hora': _todos(lambda o: formatar_data_hora(o['data_hora'])),
+    'calcular_dias_resposta': _todos(lambda o: calcular_dias_resposta(o['data_hora'], o['dt_atendimento_gestao'])),
+    'reconciliar_ocorrencia': _todos(reconciliar_ocorrencia),
+    'formatar_listagem': _todos(_formatar_ocorrencia_listagem),
+    'estatisticas_carregar': _carregar_estatisticas,
+}
+
+
+def _laco_referencia(_):
+    """Laço fixo em Python puro: a "unidade" de velocidade desta máquina/intérprete."""
+    total = 0
+    for i in range(1_000_000):
+        total += i % 7
+
+
+def _cronometrar(funcao, linhas, voltas=1):
+    """Tempo médio de `voltas` execuções seguidas, sem o GC no meio da medição."""
+    gc.collect()
+    gc.disable()
+    try:
+        inicio = time.perf_counter()
+        for _ in range(voltas):
+            funcao(linhas)
+        return (time.perf_counter() - inicio) / voltas
+    finally:
+        gc.enable()
+
+
+def medir_caso(caso, n, repeticoes):
+    """Executado no processo filho: mede o caso contra a referência e imprime o resultado em JSON."""
+    linhas = gerar_ocorrencias(n)
+    funcao = CASOS[caso]
+    aquecimento = _cronometrar(funcao, linhas)
+    voltas = max(1, int(AMOSTRA_MINIMA_SEGUNDOS / max(aquecimento, 1e-9)))
+    tempos, unidades = [], []
+    for _ in range(repeticoes):
+        tempos.append(_cronometrar(funcao, linhas, voltas))
+        unidades.append(_cronometrar(_laco_referencia, None))
+    print(json.dumps({
+        'segundos': statistics.median(tempos),
+        'referencia_segundos': statistics.median(unidades),
+        'normalizado': statistics.median(t / u for t, u in zip(tempos, unidades)),
+    }))
+
+
+def _repeticoes(n):
+    return 3 if n >= 1_000_000 else 5 if n >= 100_000 else 9
+
+
+def medir_em_processo(caso, n):
+    """Roda medir_caso num interpretador novo e devolve o JSON que ele imprimiu."""
+    saida = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), 'medir-caso', caso, str(n), str(_repeticoes(n))],
+        check=True, capture_output=True, text=True,
+    ).stdout
+    return json.loads(saida.strip().splitlines()[-1])
+
+
+def executar(tamanhos, casos):
+    resultados = {}
+    referencias = []
+    print(f"{'caso':<24} {'linhas':>9} {'tempo (s)':>10} {'ns/linha':>10} {'normalizado':>12}")
+    for n in tamanhos:
+        for caso in casos:
+            medida = medir_em_processo(caso, n)
+            tempo, normalizado = medida['segundos'], medida['normalizado']
+            referencias.append(medida['referencia_segundos'])
+            resultados[f'{caso}/{n}'] = {'segundos': tempo, 'normalizado': normalizado}
+            print(f"{caso:<24} {n:>9} {tempo:>10.4f} {tempo / n * 1e9:>10.0f} {normalizado:>12.4f}")
+    unidade = statistics.median(referencias)
+    print(f"referência (mediana): {unidade * 1000:.1f} ms")
+    return {
+        'python': platform.python_version(),
+        'maquina': platform.machine(),
+        'referencia_segundos': unidade,
+        'resultados': resultados,
+    }
+
+
+def comparar(atual, baseline, tolerancia):
+    """Imprime a variação de cada caso e devolve a lista dos que regrediram."""
+    regressoes = []
+    print(f"\n{'caso':<34} {'baseline':>10} {'atual':>10} {'variação':>9}")
+    for chave, valor in atual['resultados'].items():
+        anterior = baseline['resultados'].get(chave)
+        if anterior is None:
+            print(f"{chave:<34} {'—':>10} {valor['normalizado']:>10.4f} {'novo':>9}")
+            continue
+        variacao = valor['normalizado'] / anterior['normalizado'] - 1
+        marca = '  REGRESSÃO' if variacao > tolerancia else ''
+        print(f"{chave:<34} {anterior['normalizado']:>10.4f} {valor['normalizado']:>10.4f} {variacao:>+8.1%}{marca}")
+        if variacao > tolerancia:
+            regressoes.append(chave)
+    return regressoes
+
+
+def main():
+    if sys.argv[1:2] == ['medir-caso']:  # uso interno de executar(): um caso por processo
+        medir_caso(sys.argv[2], int(sys.argv[3]), int(sys.argv[4]))
+        return
+
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('comando', choices=('executar', 'registrar', 'comparar'))
+    parser.add_argument('--tamanhos', type=int, nargs='+', default=list(TAMANHOS_PADRAO))
+    parser.add_argument('--casos', nargs='+', choices=list(CASOS), default=list(CASOS))
+    parser.add_argument('--baseline', default=BASELINE_PADRAO)
+    parser.add_argument('--tolerancia', type=float, default=0.2, help='piora relativa aceita (0.2 = 20%%)')
+    args = parser.parse_args()
+
+    atual = executar(args.tamanhos, args.casos)
+
+    if args.comando == 'registrar':
+        with open(args.baseline, 'w') as f:
+            json.dump(atual, f, indent=2, sort_keys=True)
+            f.write('\n')
+        print(f"\nLinha de base gravada em {args.baseline}")
+    elif args.comando == 'comparar':
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressoes = comparar(atual, baseline, args.tolerancia)
+        if regressoes:
+            # Confirma num processo novo; fica a melhor das duas medidas de cada caso
+            print(f"\nMedindo de novo: {', '.join(regressoes)}")
+            for chave in regressoes:
+                caso, n = chave.rsplit('/', 1)
+                medida = medir_em_processo(caso, int(n))
+                if medida['normalizado'] < atual['resultados'][chave]['normalizado']:
+                    atual['resultados'][chave] = {'segundos': medida['segundos'], 'normalizado': medida['normalizado']}
+            confirmacao = {**atual, 'resultados': {c: atual['resultados'][c] for c in regressoes}}
+            regressoes = comparar(confirmacao, baseline, args.tolerancia)
+        if regressoes:
+            print(f"\n{len(regressoes)} caso(s) mais lentos que a linha de base além de {args.tolerancia:.0%}")
+            sys.exit(1)
+        print("\nSem regressões.")
+
+
+if __name__ == '__main__':
+    main()
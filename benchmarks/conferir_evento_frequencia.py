@@ -0,0 +1,78 @@
+"""
+Confere que /api/salvar_atraso e /api/salvar_saida_antecipada gravam a mesma
+linha de f_frequencia pela função registrar_evento_frequencia do banco (rpc) e
+pelo caminho antigo do app (leitura + upsert, quando a função não existe).
+
+Roda cada caso nos dois modos contra o SupabaseFake — com a função SQL
+reproduzida em supabase_fake.FUNCOES_SQL — e compara a linha resultante, o
+status devolvido e o nº de chamadas ao Supabase. Não acessa a rede.
+
+Uso:
+    python benchmarks/conferir_evento_frequencia.py
+"""
+import logging
+import os
+import sys
+
+AQUI = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(AQUI, '..'))
+sys.path.insert(0, AQUI)
+os.environ.setdefault('SUPABASE_URL', 'http://localhost')
+os.environ.setdefault('SUPABASE_KEY', 'benchmark')
+os.environ.setdefault('RECONCILIACAO_INTERVALO_SEGUNDOS', '0')
+os.environ.setdefault('SUPABASE_AQUECIMENTO_SEGUNDOS', '0')
+
+import app  # noqa: E402
+from supabase_fake import FUNCOES_SQL, SupabaseFake  # noqa: E402
+
+ROTAS = {'atraso': '/api/salvar_atraso', 'saida': '/api/salvar_saida_antecipada'}
+# Status já gravado no dia antes dos eventos (None = sem registro)
+STATUS_INICIAIS = (None, 'P', 'F', 'PA', 'PS', 'PAS')
+SEQUENCIAS = (('atraso',), ('saida',), ('atraso', 'saida'), ('saida', 'atraso'), ('atraso', 'atraso'))
+
+ALUNO, SALA, DATA = 1, 10, '2025-03-10'
+
+
+def executar(status_inicial, eventos, com_rpc):
+    """Aplica os eventos; retorna (linha final sem id, status devolvidos, chamadas ao Supabase)."""
+    dados = {'f_frequencia': []}
+    if status_inicial:
+        dados['f_frequencia'].append({'id': 1, 'fk_aluno_id': ALUNO, 'fk_sala_id': SALA, 'data': DATA,
+                                      'status': status_inicial, 'hora_atraso': '07:15', 'motivo_atraso': 'anterior'})
+    fake = app.supabase = SupabaseFake(dados, funcoes=FUNCOES_SQL if com_rpc else {})
+    app._rpc_ausentes.clear()
+    cliente = app.app.test_client()
+    mensagens = []
+    for i, evento in enumerate(eventos):
+        resposta = cliente.post(ROTAS[evento], json={
+            'aluno_id': ALUNO, 'sala_id': SALA, 'data': DATA, 'hora': f'0{7 + i}:40',
+            'motivo': f'{evento} {i}', 'responsavel': 'Mãe', 'telefone': '11 90000-0000',
+        })
+        assert resposta.status_code == 201, resposta.get_json()
+        mensagens.append(resposta.get_json()['message'])
+    linhas = fake.dados['f_frequencia']
+    assert len(linhas) == 1, linhas
+    linha = {c: v for c, v in linhas[0].items() if c != 'id' and v is not None}
+    return linha, mensagens, len(fake.chamadas)
+
+
+def main():
+    logging.getLogger().setLevel(logging.ERROR)
+    chamadas = {True: 0, False: 0}
+    casos = 0
+    for status_inicial in STATUS_INICIAIS:
+        for eventos in SEQUENCIAS:
+            resultado = {com_rpc: executar(status_inicial, eventos, com_rpc) for com_rpc in (True, False)}
+            (linha_rpc, msgs_rpc, n_rpc), (linha_antiga, msgs_antigas, n_antigas) = resultado[True], resultado[False]
+            caso = f"{status_inicial or 'sem registro'} + {' + '.join(eventos)}"
+            assert linha_rpc == linha_antiga, f'{caso}: linhas divergentes\n  rpc:    {linha_rpc}\n  antigo: {linha_antiga}'
+            assert msgs_rpc == msgs_antigas, f'{caso}: status divergentes {msgs_rpc} != {msgs_antigas}'
+            print(f"{caso:<30} -> {linha_rpc['status']:<4} chamadas: rpc {n_rpc}, antigo {n_antigas}")
+            chamadas[True] += n_rpc
+            chamadas[False] += n_antigas
+            casos += 1
+    print(f'{casos} casos iguais nos dois caminhos; chamadas ao Supabase: rpc {chamadas[True]}, antigo {chamadas[False]}')
+
+
+if __name__ == '__main__':
+    main()
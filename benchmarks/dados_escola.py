@@ -0,0 +1,102 @@
+"""
+Dados sintéticos com o tamanho de uma escola, para alimentar o SupabaseFake.
+
+Com escala=1: 30 salas de 35 alunos, 80 funcionários, 4.000 ocorrências e um
+bimestre (40 dias letivos) de frequência — cerca de 42 mil linhas em
+f_frequencia. As proporções seguem as tabelas usadas pelo app.py.
+
+Uso:
+    from dados_escola import gerar_dados
+    dados = gerar_dados(escala=0.5)
+"""
+import random
+from datetime import date, timedelta
+
+ALUNOS_POR_SALA = 35
+DIAS_LETIVOS = 40
+DATA_INICIAL = date(2025, 3, 3)
+DISCIPLINAS = ('Matemática', 'Português', 'História', 'Geografia', 'Ciências', 'Inglês',
+               'Artes', 'Educação Física', 'Física', 'Química', 'Biologia', 'Filosofia')
+STATUS_FREQUENCIA_PESOS = (('P', 88), ('F', 8), ('PA', 2), ('PS', 1.5), ('PAS', 0.5))
+TEXTOS_ATENDIMENTO = ('', None, 'Conversa com o aluno', 'Responsável contatado')
+
+
+def dias_letivos(n=DIAS_LETIVOS, inicio=DATA_INICIAL):
+    """As `n` primeiras datas úteis (seg–sex) a partir de `inicio`, em ISO."""
+    dias, atual = [], inicio
+    while len(dias) < n:
+        if atual.weekday() < 5:
+            dias.append(atual.isoformat())
+        atual += timedelta(days=1)
+    return dias
+
+
+def gerar_dados(escala=1.0, seed=42):
+    r = random.Random(seed)
+    n_salas = max(1, round(30 * escala))
+    n_ocorrencias = max(1, round(4000 * escala))
+
+    salas = [{'id': i, 'sala': f'{1 + (i - 1) % 9}º Ano {chr(65 + (i - 1) // 9)}',
+              'nivel_ensino': 'Fundamental' if (i - 1) % 9 < 6 else 'Médio'}
+             for i in range(1, n_salas + 1)]
+    funcionarios = [{'id': i, 'nome': f'Professor {i:03d}', 'funcao': 'Professor', 'is_tutor': i % 3 == 0,
+                     'email': f'professor{i}@escola.sp.gov.br'} for i in range(1, 81)]
+    tutores = [f['id'] for f in funcionarios if f['is_tutor']]
+    disciplinas = [{'id': nome[:3].upper() + str(i), 'nome': nome} for i, nome in enumerate(DISCIPLINAS)]
+
+    alunos = []
+    for sala in salas:
+        for _ in range(ALUNOS_POR_SALA):
+            i = len(alunos) + 1
+            alunos.append({'id': i, 'ra': f'{100000000 + i:012d}', 'nome': f'Aluno {i:05d}',
+                           'sala_id': sala['id'], 'tutor_id': r.choice(tutores) if r.random() < 0.8 else None})
+
+    tutores_por_id = {f['id']: f['nome'] for f in funcionarios}
+    ocorrencias = []
+    for numero in range(1, n_ocorrencias + 1):
+        aluno = r.choice(alunos)
+        mes, dia = r.randint(2, 11), r.randint(1, 28)
+        finalizada = r.random() < 0.6
+        ocorrencias.append({
+            'numero': numero,
+            'data_hora': f'2025-{mes:02d}-{dia:02d}T{r.randint(7, 17):02d}:{r.randint(0, 59):02d}:00',
+            'status': 'Finalizada' if finalizada else 'Aberta',
+            'tipo': r.choice(('Comportamental', 'Pedagógica', 'Disciplinar')),
+            'aluno_id': aluno['id'], 'aluno_nome': aluno['nome'], 'sala_id': aluno['sala_id'],
+            'tutor_id': aluno['tutor_id'], 'tutor_nome': tutores_por_id.get(aluno['tutor_id']),
+            'professor_id': r.randint(1, len(funcionarios)),
+            'descricao': 'Aluno não realizou a atividade proposta e atrapalhou a aula.',
+            'solicitado_professor': 'SIM',
+            'solicitado_tutor': r.choice(('SIM', 'NÃO')),
+            'solicitado_coordenacao': r.choice(('SIM', 'NÃO')),
+            'solicitado_gestao': r.choice(('SIM', 'NÃO')),
+            'atendimento_professor': 'Orientação em sala',
+            'atendimento_tutor': r.choice(TEXTOS_ATENDIMENTO) if not finalizada else 'Conversa com o aluno',
+            'atendimento_coordenacao': r.choice(TEXTOS_ATENDIMENTO),
+            'atendimento_gestao': r.choice(TEXTOS_ATENDIMENTO),
+            'dt_atendimento_tutor': None,
+            'dt_atendimento_coordenacao': None,
+            'dt_atendimento_gestao': f'2025-{mes:02d}-{min(dia + 3, 28):02d}T10:00:00' if finalizada else None,
+        })
+
+    status, pesos = zip(*STATUS_FREQUENCIA_PESOS)
+    frequencia = []
+    for data in dias_letivos():
+        for aluno in alunos:
+            frequencia.append({'id': len(frequencia) + 1, 'fk_aluno_id': aluno['id'], 'fk_sala_id': aluno['sala_id'],
+                               'data': data, 'status': r.choices(status, pesos)[0]})
+
+    agenda = [{'id': i + 1, 'fk_sala_id': 1 + i % n_salas, 'data_referencia': '2025-03-03', 'dia_semana': 'SEG',
+               'ordem_aula': 1 + i // n_salas, 'tema_aula': 'Revisão', 'tipo_aula': 'Normal',
+               'fk_disciplina_id': disciplinas[i % len(disciplinas)]['id'], 'fk_professor_id': 1 + i % len(funcionarios)}
+              for i in range(n_salas * 6)]
+
+    return {
+        'd_salas': salas,
+        'd_funcionarios': funcionarios,
+        'd_disciplinas': disciplinas,
+        'd_alunos': alunos,
+        'ocorrencias': ocorrencias,
+        'f_frequencia': frequencia,
+        'f_agenda_aulas': agenda,
+    }
@@ -0,0 +1,476 @@
+"""Substituto local, em memória, do cliente Supabase usado pelo app.py.
+
+Implementa o subconjunto do query builder do postgrest-py que o app utiliza
+(`select` com recursos embutidos, filtros, `order`, `range`, `upsert` com
+`on_conflict`, `single`, `maybe_single` e `rpc`), permitindo executar as rotas
+sem um projeto Supabase real e injetar latência para medir desempenho.
+
+Uso:
+    import app
+    from supabase_fake import SupabaseFake
+    app.supabase = SupabaseFake(dados={"d_salas": [{"id": 1, "sala": "1A", "nivel_ensino": "EM"}]}, latencia=0.005)
+"""
+
+import copy
+import re
+import threading
+import time
+
+
+class FakeAPIError(Exception):
+    """Equivalente ao postgrest.APIError: carrega `message` e `code`."""
+
+    def __init__(self, message, code=None):
+        super().__init__(message)
+        self.message = message
+        self.code = code
+
+
+class RespostaFake:
+    def __init__(self, data, count=None):
+        self.data = data
+        self.count = count
+
+
+# Chave primária de cada tabela (padrão: 'id')
+CHAVES_PRIMARIAS = {
+    'ocorrencias': 'numero',
+}
+
+# Relações usadas em selects embutidos: (tabela, coluna) -> tabela referenciada (por 'id')
+RELACOES = {
+    ('ocorrencias', 'professor_id'): 'd_funcionarios',
+    ('ocorrencias', 'sala_id'): 'd_salas',
+    ('ocorrencias', 'aluno_id'): 'd_alunos',
+    ('ocorrencias', 'tutor_id'): 'd_funcionarios',
+    ('d_alunos', 'sala_id'): 'd_salas',
+    ('d_alunos', 'tutor_id'): 'd_funcionarios',
+    ('f_agenda_aulas', 'fk_disciplina_id'): 'd_disciplinas',
+    ('f_agenda_aulas', 'fk_professor_id'): 'd_funcionarios',
+    ('f_agenda_aulas', 'fk_sala_id'): 'd_salas',
+    ('f_frequencia', 'fk_aluno_id'): 'd_alunos',
+    ('f_frequencia', 'fk_sala_id'): 'd_salas',
+}
+
+
+def _dividir_topo(texto, sep=','):
+    """Divide `texto` em `sep`, ignorando separadores dentro de parênteses ou aspas."""
+    partes, atual, nivel, aspas = [], [], 0, False
+    for ch in texto:
+        if ch == '"':
+            aspas = not aspas
+        elif not aspas and ch == '(':
+            nivel += 1
+        elif not aspas and ch == ')':
+            nivel -= 1
+        if ch == sep and nivel == 0 and not aspas:
+            partes.append(''.join(atual).strip())
+            atual = []
+        else:
+            atual.append(ch)
+    if ''.join(atual).strip():
+        partes.append(''.join(atual).strip())
+    return partes
+
+
+def _coagir(valor_filtro, valor_linha):
+    """Converte o valor do filtro para o tipo da coluna antes de comparar."""
+    if isinstance(valor_filtro, str) and len(valor_filtro) >= 2 and valor_filtro[0] == valor_filtro[-1] == '"':
+        valor_filtro = valor_filtro[1:-1]
+    if valor_linha is None or valor_filtro is None:
+        return valor_filtro
+    if isinstance(valor_linha, bool):
+        if isinstance(valor_filtro, str):
+            return valor_filtro.lower() in ('true', 't', '1')
+        return bool(valor_filtro)
+    if isinstance(valor_linha, (int, float)) and not isinstance(valor_filtro, (int, float)):
+        try:
+            return type(valor_linha)(valor_filtro)
+        except (TypeError, ValueError):
+            return valor_filtro
+    if isinstance(valor_linha, str) and not isinstance(valor_filtro, str):
+        return str(valor_filtro)
+    return valor_filtro
+
+
+def _comparar(op, valor_linha, valor_filtro):
+    if op == 'is':
+        alvo = None if str(valor_filtro).lower() == 'null' else _coagir(valor_filtro, True)
+        return valor_linha is alvo or valor_linha == alvo
+    if op == 'in':
+        if isinstance(valor_filtro, str):
+            valor_filtro = [v.strip() for v in valor_filtro.strip('()').split(',') if v.strip()]
+        return any(valor_linha == _coagir(v, valor_linha) for v in valor_filtro)
+    alvo = _coagir(valor_filtro, valor_linha)
+    if op == 'eq':
+        return valor_linha == alvo
+    if op == 'neq':
+        return valor_linha != alvo
+    if valor_linha is None or alvo is None:
+        return False
+    if op == 'gt':
+        return valor_linha > alvo
+    if op == 'gte':
+        return valor_linha >= alvo
+    if op == 'lt':
+        return valor_linha < alvo
+    if op == 'lte':
+        return valor_linha <= alvo
+    if op in ('like', 'ilike'):
+        padrao = '^' + re.escape(str(alvo)).replace('%', '.*').replace('\\*', '.*') + '$'
+        return re.match(padrao, str(valor_linha), re.IGNORECASE if op == 'ilike' else 0) is not None
+    raise FakeAPIError(f"Operador não suportado pelo fake: {op}")
+
+
+def _compilar_logico(expr):
+    """Compila uma expressão `or(...)`/`and(...)` do PostgREST em uma função de linha."""
+    expr = expr.strip()
+    negado = False
+    if expr.startswith('not.'):
+        negado, expr = True, expr[4:]
+    for modo in ('or', 'and'):
+        if expr.startswith(modo + '(') and expr.endswith(')'):
+            filhos = [_compilar_logico(p) for p in _dividir_topo(expr[len(modo) + 1:-1])]
+            combinar = any if modo == 'or' else all
+            funcao = lambda linha, f=filhos, c=combinar: c(x(linha) for x in f)
+            return (lambda linha: not funcao(linha)) if negado else funcao
+    coluna, op, valor = expr.split('.', 2)
+    if op == 'not':
+        op, valor = valor.split('.', 1)
+        negado = not negado
+    funcao = lambda linha: _comparar(op, linha.get(coluna), valor)
+    return (lambda linha: not funcao(linha)) if negado else funcao
+
+
+class _Negacao:
+    """Implementa `builder.not_.<filtro>(...)`."""
+
+    def __init__(self, builder):
+        self._builder = builder
+
+    def __getattr__(self, nome):
+        op = nome.rstrip('_')
+
+        def aplicar(coluna, valor):
+            self._builder._filtros.append(lambda linha: not _comparar(op, linha.get(coluna), valor))
+            return self._builder
+        return aplicar
+
+
+class ConsultaFake:
+    def __init__(self, cliente, tabela):
+        self._cliente = cliente
+        self._tabela = tabela
+        self._operacao = 'select'
+        self._colunas = '*'
+        self._count = None
+        self._payload = None
+        self._on_conflict = ''
+        self._default_to_null = True
+        self._filtros = []
+        self._ordem = []
+        self._inicio = 0
+        self._limite = None
+        self._modo_unico = None
+
+    # --- operações -------------------------------------------------------
+    def select(self, colunas='*', count=None, **_):
+        self._colunas = colunas
+        self._count = count
+        return self
+
+    def insert(self, payload, **_):
+        self._operacao, self._payload = 'insert', payload
+        return self
+
+    def upsert(self, payload, on_conflict='', default_to_null=True, **_):
+        self._operacao, self._payload = 'upsert', payload
+        self._on_conflict = on_conflict
+        self._default_to_null = default_to_null
+        return self
+
+    def update(self, payload, **_):
+        self._operacao, self._payload = 'update', payload
+        return self
+
+    def delete(self, **_):
+        self._operacao = 'delete'
+        return self
+
+    # --- filtros ---------------------------------------------------------
+    def _filtro(self, op, coluna, valor):
+        self._filtros.append(lambda linha: _comparar(op, linha.get(coluna), valor))
+        return self
+
+    def eq(self, coluna, valor):
+        return self._filtro('eq', coluna, valor)
+
+    def neq(self, coluna, valor):
+        return self._filtro('neq', coluna, valor)
+
+    def gt(self, coluna, valor):
+        return self._filtro('gt', coluna, valor)
+
+    def gte(self, coluna, valor):
+        return self._filtro('gte', coluna, valor)
+
+    def lt(self, coluna, valor):
+        return self._filtro('lt', coluna, valor)
+
+    def lte(self, coluna, valor):
+        return self._filtro('lte', coluna, valor)
+
+    def like(self, coluna, valor):
+        return self._filtro('like', coluna, valor)
+
+    def ilike(self, coluna, valor):
+        return self._filtro('ilike', coluna, valor)
+
+    def is_(self, coluna, valor):
+        return self._filtro('is', coluna, valor)
+
+    def in_(self, coluna, valores):
+        return self._filtro('in', coluna, list(valores))
+
+    def or_(self, filtros, **_):
+        self._filtros.append(_compilar_logico(f"or({filtros})"))
+        return self
+
+    @property
+    def not_(self):
+        return _Negacao(self)
+
+    # --- modificadores ---------------------------------------------------
+    def order(self, coluna, desc=False, nullsfirst=None, **_):
+        for c in coluna.split(','):
+            self._ordem.append((c.strip(), desc))
+        return self
+
+    def limit(self, n, **_):
+        self._limite = n
+        return self
+
+    def range(self, inicio, fim, **_):
+        self._inicio = inicio
+        self._limite = fim - inicio + 1
+        return self
+
+    def single(self):
+        self._modo_unico = 'single'
+        return self
+
+    def maybe_single(self):
+        self._modo_unico = 'maybe'
+        return self
+
+    # --- execução --------------------------------------------------------
+    def execute(self):
+        inicio = time.perf_counter()
+        if self._cliente.latencia:
+            time.sleep(self._cliente.latencia)
+        with self._cliente._lock:
+            resposta = getattr(self, '_executar_' + self._operacao)()
+        linhas = resposta.data if resposta is not None else None
+        qtd = len(linhas) if isinstance(linhas, list) else (0 if linhas is None else 1)
+        self._cliente._registrar(self._tabela, self._operacao, qtd, time.perf_counter() - inicio)
+        return resposta
+
+    def _linhas_filtradas(self):
+        linhas = self._cliente._tabela(self._tabela)
+        return [l for l in linhas if all(f(l) for f in self._filtros)]
+
+    def _executar_select(self):
+        linhas = self._linhas_filtradas()
+        for coluna, desc in reversed(self._ordem):
+            linhas.sort(key=lambda l: (l.get(coluna) is None, l.get(coluna) if l.get(coluna) is not None else 0), reverse=desc)
+        total = len(linhas)
+        fim = None if self._limite is None else self._inicio + self._limite
+        linhas = linhas[self._inicio:fim]
+        dados = [self._cliente._projetar(self._tabela, l, self._colunas) for l in linhas]
+        return self._finalizar(dados, total if self._count else None)
+
+    def _finalizar(self, dados, count=None):
+        if self._modo_unico == 'single':
+            if len(dados) != 1:
+                raise FakeAPIError("JSON object requested, multiple (or no) rows returned", 'PGRST116')
+            return RespostaFake(dados[0], count)
+        if self._modo_unico == 'maybe':
+            if not dados:
+                return None
+            if len(dados) > 1:
+                raise FakeAPIError("Cannot coerce the result to a single JSON object", '406')
+            return RespostaFake(dados[0], count)
+        return RespostaFake(dados, count)
+
+    def _executar_insert(self):
+        novos = self._payload if isinstance(self._payload, list) else [self._payload]
+        tabela = self._cliente._tabela(self._tabela)
+        inseridos = []
+        for registro in novos:
+            linha = self._cliente._nova_linha(self._tabela, registro)
+            tabela.append(linha)
+            inseridos.append(copy.deepcopy(linha))
+        return RespostaFake(inseridos)
+
+    def _executar_upsert(self):
+        novos = self._payload if isinstance(self._payload, list) else [self._payload]
+        pk = CHAVES_PRIMARIAS.get(self._tabela, 'id')
+        chaves = [c.strip() for c in self._on_conflict.split(',') if c.strip()] or [pk]
+        tabela = self._cliente._tabela(self._tabela)
+        colunas_lote = set().union(*(r.keys() for r in novos)) if novos else set()
+        indice = {tuple(l.get(c) for c in chaves): l for l in tabela}
+        resultado = []
+        for registro in novos:
+            if self._default_to_null:
+                registro = {c: registro.get(c) for c in colunas_lote}
+            chave = tuple(registro.get(c) for c in chaves)
+            existente = indice.get(chave)
+            if existente is not None:
+                existente.update(registro)
+                resultado.append(copy.deepcopy(existente))
+            else:
+                linha = self._cliente._nova_linha(self._tabela, registro)
+                tabela.append(linha)
+                indice[chave] = linha
+                resultado.append(copy.deepcopy(linha))
+        return RespostaFake(resultado)
+
+    def _executar_update(self):
+        alterados = []
+        for linha in self._linhas_filtradas():
+            linha.update(self._payload)
+            alterados.append(copy.deepcopy(linha))
+        return self._finalizar(alterados)
+
+    def _executar_delete(self):
+        removidos = self._linhas_filtradas()
+        ids = {id(l) for l in removidos}
+        tabela = self._cliente._tabela(self._tabela)
+        tabela[:] = [l for l in tabela if id(l) not in ids]
+        return RespostaFake([copy.deepcopy(l) for l in removidos])
+
+
+class ChamadaRPCFake:
+    def __init__(self, cliente, funcao, parametros):
+        self._cliente = cliente
+        self._funcao = funcao
+        self._parametros = parametros or {}
+
+    def execute(self):
+        inicio = time.perf_counter()
+        implementacao = self._cliente.funcoes.get(self._funcao)
+        if implementacao is None:
+            raise FakeAPIError(f"Could not find the function public.{self._funcao}", 'PGRST202')
+        if self._cliente.latencia:
+            time.sleep(self._cliente.latencia)
+        with self._cliente._lock:
+            dados = implementacao(self._cliente, **self._parametros)
+        self._cliente._registrar('rpc/' + self._funcao, 'rpc', 1, time.perf_counter() - inicio)
+        return RespostaFake(dados)
+
+
+class SupabaseFake:
+    """Cliente Supabase em memória.
+
+    `dados` mapeia tabela -> lista de linhas; `latencia` (segundos) é aplicada a
+    cada `execute()`; `funcoes` mapeia nome -> callable(cliente, **params) para `rpc`.
+    `ao_executar(tabela, operacao, linhas, duracao)` é chamado após cada chamada.
+    """
+
+    def __init__(self, dados=None, latencia=0.0, funcoes=None, ao_executar=None):
+        self.dados = {t: [dict(l) for l in linhas] for t, linhas in (dados or {}).items()}
+        self.latencia = latencia
+        self.funcoes = dict(funcoes or {})
+        self.ao_executar = ao_executar
+        self.chamadas = []
+        self._lock = threading.RLock()
+        self._sequencias = {}
+
+    def table(self, tabela):
+        return ConsultaFake(self, tabela)
+
+    from_ = table
+
+    def rpc(self, funcao, parametros=None, **_):
+        return ChamadaRPCFake(self, funcao, parametros)
+
+    # --- uso interno -----------------------------------------------------
+    def _tabela(self, tabela):
+        return self.dados.setdefault(tabela, [])
+
+    def _registrar(self, tabela, operacao, linhas, duracao):
+        self.chamadas.append((tabela, operacao))
+        if self.ao_executar:
+            self.ao_executar(tabela, operacao, linhas, duracao)
+
+    def _nova_linha(self, tabela, registro):
+        pk = CHAVES_PRIMARIAS.get(tabela, 'id')
+        linha = dict(registro)
+        if linha.get(pk) is None:
+            if tabela not in self._sequencias:
+                existentes = [l.get(pk) for l in self._tabela(tabela) if isinstance(l.get(pk), int)]
+                self._sequencias[tabela] = max(existentes, default=0)
+            self._sequencias[tabela] += 1
+            linha[pk] = self._sequencias[tabela]
+        return linha
+
+    def _buscar_por_id(self, tabela, valor):
+        pk = CHAVES_PRIMARIAS.get(tabela, 'id')
+        for linha in self._tabela(tabela):
+            if linha.get(pk) == valor:
+                return linha
+        return None
+
+    def _projetar(self, tabela, linha, colunas):
+        resultado = {}
+        for item in _dividir_topo(colunas):
+            if item == '*':
+                resultado.update(copy.deepcopy(linha))
+                continue
+            alias = None
+            if ':' in item.split('(')[0]:
+                alias, item = item.split(':', 1)
+            if '(' in item:
+                coluna, sub = item[:-1].split('(', 1)
+                coluna = coluna.split('!')[0]
+                destino = RELACOES.get((tabela, coluna))
+                if destino is None:
+                    raise FakeAPIError(f"Could not find a relationship between '{tabela}' and '{coluna}'", 'PGRST200')
+                referenciada = self._buscar_por_id(destino, linha.get(coluna))
+                resultado[alias or coluna] = (
+                    self._projetar(destino, referenciada, sub) if referenciada is not None else None
+                )
+            else:
+                resultado[alias or item] = copy.deepcopy(linha.get(item))
+        return resultado
+
+
+# --- Funções do banco (supabase/migrations) --------------------------------
+# Reproduzem o SQL das migrações, não o app.py: servem para comparar o caminho
+# via rpc com o caminho antigo do app. Uso: SupabaseFake(dados, funcoes=FUNCOES_SQL)
+
+def registrar_evento_frequencia(cliente, p_evento, p_aluno_id, p_sala_id, p_data, p_hora, p_motivo,
+                                p_responsavel=None, p_telefone=None):
+    """20261018120000_registrar_evento_frequencia.sql: INSERT ... ON CONFLICT (fk_aluno_id, data) DO UPDATE."""
+    if p_evento not in ('atraso', 'saida'):
+        raise FakeAPIError(f"Evento de frequência inválido: {p_evento}", '22023')
+    atraso = p_evento == 'atraso'
+    campos = {f'hora_{p_evento}': p_hora, f'motivo_{p_evento}': p_motivo,
+              f'responsavel_{p_evento}': p_responsavel, f'telefone_{p_evento}': p_telefone}
+    tabela = cliente._tabela('f_frequencia')
+    linha = next((l for l in tabela if l.get('fk_aluno_id') == p_aluno_id and l.get('data') == p_data), None)
+    if linha is None:
+        tabela.append(cliente._nova_linha('f_frequencia', {
+            'fk_aluno_id': p_aluno_id, 'fk_sala_id': p_sala_id, 'data': p_data,
+            'status': 'PA' if atraso else 'PS', **campos,
+        }))
+        return 'PA' if atraso else 'PS'
+    combinam = ('PS', 'PAS') if atraso else ('PA', 'PAS')
+    linha.update(campos, fk_sala_id=p_sala_id,
+                 status='PAS' if linha.get('status') in combinam else ('PA' if atraso else 'PS'))
+    return linha['status']
+
+
+FUNCOES_SQL = {
+    'registrar_evento_frequencia': registrar_evento_frequencia,
+}
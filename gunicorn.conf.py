@@ -0,0 +1,24 @@
+# Configuração do gunicorn (lida automaticamente do diretório de trabalho pelo start.sh)
+import os
+
+# Threads por worker (worker gthread). Cada painel de ocorrências com o fluxo
+# /api/ocorrencias_eventos aberto prende uma thread enquanto espera eventos, por
+# isso o app aceita no máximo EVENTOS_MAX_CONEXOES fluxos por worker (padrão:
+# threads // 4) e responde 503 aos demais, que recarregam a lista e tentam de
+# novo em 30-60 s.
+# Dimensionamento: painéis ao vivo = workers (WEB_CONCURRENCY) x EVENTOS_MAX_CONEXOES;
+# threads livres para o resto = workers x (threads - EVENTOS_MAX_CONEXOES).
+# Ex.: 2 workers x 8 threads -> 4 painéis ao vivo e 12 threads para as rotas comuns.
+# Para mais painéis, aumente workers ou threads (o limite acompanha GUNICORN_THREADS)
+# em vez de subir só EVENTOS_MAX_CONEXOES.
+# /api/gerar_pdf_ocorrencias também prende uma thread enquanto espera o PDF; acima
+# de PDF_ESPERAS_SINCRONAS_MAX esperas por worker (padrão: threads // 4) responde
+# 202 com o job na fila e a tela acompanha até o download.
+threads = int(os.environ.get("GUNICORN_THREADS", "8"))
+
+
+def post_worker_init(worker):
+    # O app já foi importado neste worker: cria o pool de conexões do Supabase
+    # e abre a primeira conexão antes de aceitar requisições
+    from app import supabase
+    supabase.aquecer()
@@ -1,2 +1,6 @@
-gunicorn --bind 0.0.0.0:$PORT app:app
-
+#!/bin/sh
+# SERVIDOR=asgi: uvicorn com as leituras principais assíncronas (ver asgi.py)
+if [ "$SERVIDOR" = "asgi" ]; then
+    exec uvicorn asgi:app --host 0.0.0.0 --port $PORT --workers ${WEB_CONCURRENCY:-2}
+fi
+exec gunicorn --bind 0.0.0.0:$PORT app:app
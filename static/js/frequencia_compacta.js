@@ -0,0 +1,39 @@
+const CAMPOS_DETALHES_FREQUENCIA = [
+    "hora_atraso", "motivo_atraso", "responsavel_atraso", "telefone_atraso",
+    "hora_saida", "motivo_saida", "responsavel_saida", "telefone_saida"
+];
+
+// Decodifica a resposta de /api/relatorio_frequencia_detalhada?formato=compacto.
+// Retorna o mesmo formato da rota sem o parâmetro: { dias_mes, dias_uteis, relatorio: [{ id, nome, dias: [{ data, status, detalhes }] }] }
+function decodificarFrequenciaCompacta(compacto) {
+    const [ano, mes] = compacto.mes_ano.split("-");
+    const diasUteis = [];
+    for (let dia = 1; dia <= compacto.dias_mes; dia++) {
+        diasUteis.push(`${ano}-${mes}-${String(dia).padStart(2, "0")}`);
+    }
+
+    const esparsos = new Map();
+    compacto.detalhes.forEach(d => esparsos.set(`${d.aluno_id}:${d.dia}`, d));
+
+    const relatorio = compacto.alunos.map(aluno => ({
+        id: aluno.id,
+        nome: aluno.nome,
+        dias: diasUteis.map((data, i) => {
+            const codigo = aluno.codigos[i];
+            const extra = esparsos.get(`${aluno.id}:${i + 1}`) || {};
+            let detalhes = null;
+            if (extra.detalhes) {
+                // A tabela esparsa omite os campos vazios
+                detalhes = {};
+                CAMPOS_DETALHES_FREQUENCIA.forEach(c => { detalhes[c] = extra.detalhes[c] ?? null; });
+            }
+            return {
+                data: data,
+                status: codigo === "*" ? extra.status : compacto.legenda[codigo],
+                detalhes: detalhes
+            };
+        })
+    }));
+
+    return { dias_mes: compacto.dias_mes, dias_uteis: diasUteis, relatorio: relatorio };
+}
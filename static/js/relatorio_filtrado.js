@@ -1,3 +1,12 @@
+// 202: o servidor deixou o PDF na fila; acompanha o job e baixa quando terminar
+async function baixarJobPdf(job) {
+    while (job.status === "pendente") {
+        await new Promise(r => setTimeout(r, 1000));
+        job = await (await fetch(job.url_status)).json();
+    }
+    return fetch(job.url_download);  // 409/404 se o job falhou
+}
+
 document.addEventListener("DOMContentLoaded", function () {
     const selectSala = document.getElementById("sala");
     const selectAluno = document.getElementById("aluno");
@@ -94,11 +103,12 @@ document.addEventListener("DOMContentLoaded", function () {
                     alert("Selecione ao menos uma ocorrência!");
                     return;
                 }
-                const res = await fetch("/api/gerar_pdf_ocorrencias", {
+                let res = await fetch("/api/gerar_pdf_ocorrencias", {
                     method: "POST",
                     headers: { "Content-Type": "application/json" },
                     body: JSON.stringify({ numeros: selecionadas })
                 });
+                if (res.status === 202) res = await baixarJobPdf(await res.json());
                 if (res.ok) {
                     const blob = await res.blob();
                     const url = window.URL.createObjectURL(blob);
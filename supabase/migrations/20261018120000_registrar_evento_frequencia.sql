@@ -0,0 +1,67 @@
+-- Registra atraso ou saída antecipada em f_frequencia numa única instrução atômica.
+--
+-- O status é combinado dentro do INSERT ... ON CONFLICT DO UPDATE, com a linha
+-- travada pelo próprio Postgres: um atraso e uma saída gravados ao mesmo tempo
+-- para o mesmo aluno/dia resultam em PAS, sem perder nenhum dos dois.
+-- Regra (espelhada em _mesclar_status_frequencia, no app.py):
+--   atraso: PS/PAS -> PAS; qualquer outro (P, F, PA ou sem registro) -> PA
+--   saida:  PA/PAS -> PAS; qualquer outro (P, F, PS ou sem registro) -> PS
+-- Retorna o status resultante.
+
+create or replace function public.registrar_evento_frequencia(
+    p_evento text,
+    p_aluno_id public.f_frequencia.fk_aluno_id%type,
+    p_sala_id public.f_frequencia.fk_sala_id%type,
+    p_data public.f_frequencia.data%type,
+    p_hora public.f_frequencia.hora_atraso%type,
+    p_motivo public.f_frequencia.motivo_atraso%type,
+    p_responsavel public.f_frequencia.responsavel_atraso%type default null,
+    p_telefone public.f_frequencia.telefone_atraso%type default null
+) returns text
+language plpgsql
+as $$
+declare
+    v_atraso boolean := p_evento = 'atraso';
+    v_status text;
+begin
+    if p_evento is null or p_evento not in ('atraso', 'saida') then
+        raise exception 'Evento de frequência inválido: %', p_evento using errcode = '22023';
+    end if;
+
+    insert into public.f_frequencia as f (
+        fk_aluno_id, fk_sala_id, data, status,
+        hora_atraso, motivo_atraso, responsavel_atraso, telefone_atraso,
+        hora_saida, motivo_saida, responsavel_saida, telefone_saida
+    ) values (
+        p_aluno_id, p_sala_id, p_data, case when v_atraso then 'PA' else 'PS' end,
+        case when v_atraso then p_hora end,
+        case when v_atraso then p_motivo end,
+        case when v_atraso then p_responsavel end,
+        case when v_atraso then p_telefone end,
+        case when not v_atraso then p_hora end,
+        case when not v_atraso then p_motivo end,
+        case when not v_atraso then p_responsavel end,
+        case when not v_atraso then p_telefone end
+    )
+    on conflict (fk_aluno_id, data) do update set
+        fk_sala_id = excluded.fk_sala_id,
+        status = case
+            when v_atraso and f.status in ('PS', 'PAS') then 'PAS'
+            when not v_atraso and f.status in ('PA', 'PAS') then 'PAS'
+            else excluded.status
+        end,
+        hora_atraso        = case when v_atraso then excluded.hora_atraso        else f.hora_atraso end,
+        motivo_atraso      = case when v_atraso then excluded.motivo_atraso      else f.motivo_atraso end,
+        responsavel_atraso = case when v_atraso then excluded.responsavel_atraso else f.responsavel_atraso end,
+        telefone_atraso    = case when v_atraso then excluded.telefone_atraso    else f.telefone_atraso end,
+        hora_saida         = case when not v_atraso then excluded.hora_saida         else f.hora_saida end,
+        motivo_saida       = case when not v_atraso then excluded.motivo_saida       else f.motivo_saida end,
+        responsavel_saida  = case when not v_atraso then excluded.responsavel_saida  else f.responsavel_saida end,
+        telefone_saida     = case when not v_atraso then excluded.telefone_saida     else f.telefone_saida end
+    returning f.status into v_status;
+
+    return v_status;
+end;
+$$;
+
+grant execute on function public.registrar_evento_frequencia to anon, authenticated, service_role;
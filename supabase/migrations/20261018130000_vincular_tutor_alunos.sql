@@ -0,0 +1,52 @@
+-- Vincula um tutor a um conjunto de alunos, em uma ou mais salas, numa única transação.
+--
+-- Estado final: nas salas p_salas, os alunos vinculados a p_tutor_id passam a
+-- ser exatamente p_alunos. Quem estava com o tutor nessas salas e não está na
+-- lista é desvinculado; quem está na lista passa para o tutor (vindo de outro
+-- tutor ou sem tutor). Só as linhas que mudam são gravadas. Um aluno
+-- inexistente aborta a operação inteira, sem alterar nada.
+-- Espelhada no fallback de vincular_tutor_alunos, no app.py.
+-- Retorna {"vinculados": n, "desvinculados": n}.
+
+create or replace function public.vincular_tutor_alunos(
+    p_tutor_id bigint,
+    p_salas bigint[],
+    p_alunos bigint[]
+) returns json
+language plpgsql
+as $$
+declare
+    v_alunos bigint[] := coalesce(p_alunos, '{}');
+    v_inexistentes bigint[];
+    v_vinculados integer;
+    v_desvinculados integer;
+begin
+    if p_tutor_id is null then
+        raise exception 'Tutor não informado' using errcode = '22023';
+    end if;
+
+    select array_agg(x.id) into v_inexistentes
+      from unnest(v_alunos) as x(id)
+     where not exists (select 1 from public.d_alunos a where a.id = x.id);
+    if v_inexistentes is not null then
+        raise exception 'Alunos inexistentes: %', v_inexistentes using errcode = '22023';
+    end if;
+
+    update public.d_alunos
+       set tutor_id = null
+     where sala_id = any(coalesce(p_salas, '{}'))
+       and tutor_id = p_tutor_id
+       and id <> all(v_alunos);
+    get diagnostics v_desvinculados = row_count;
+
+    update public.d_alunos
+       set tutor_id = p_tutor_id
+     where id = any(v_alunos)
+       and tutor_id is distinct from p_tutor_id;
+    get diagnostics v_vinculados = row_count;
+
+    return json_build_object('vinculados', v_vinculados, 'desvinculados', v_desvinculados);
+end;
+$$;
+
+grant execute on function public.vincular_tutor_alunos to anon, authenticated, service_role;
@@ -0,0 +1,47 @@
+-- Sincroniza as disciplinas de uma ou mais salas pela diferença, numa única instrução.
+--
+-- p_vinculos é a lista completa desejada para as salas p_salas, no formato
+-- [{"fk_sala_id": 1, "fk_disciplina_id": ...}, ...] (os tipos vêm da própria
+-- tabela, via jsonb_populate_recordset). Só os vínculos que deixaram de existir
+-- são apagados e só os novos são inseridos; os demais não são tocados. Como
+-- tudo ocorre na mesma transação, nenhum leitor vê uma sala sem disciplinas no
+-- meio da troca. Salas em p_salas sem nenhum vínculo em p_vinculos ficam vazias.
+-- Espelhada no fallback de sincronizar_disciplinas_salas, no app.py.
+-- Retorna {"inseridos": n, "removidos": n}.
+
+create or replace function public.sincronizar_disciplinas_salas(
+    p_salas bigint[],
+    p_vinculos jsonb
+) returns json
+language plpgsql
+as $$
+declare
+    v_inseridos integer;
+    v_removidos integer;
+begin
+    with desejado as (
+        select distinct d.fk_sala_id, d.fk_disciplina_id
+          from jsonb_populate_recordset(null::public.vinculos_disciplina_sala, coalesce(p_vinculos, '[]')) d
+         where d.fk_sala_id = any(p_salas)
+    ), removidos as (
+        delete from public.vinculos_disciplina_sala v
+         where v.fk_sala_id = any(p_salas)
+           and not exists (select 1 from desejado d
+                            where d.fk_sala_id = v.fk_sala_id and d.fk_disciplina_id = v.fk_disciplina_id)
+        returning 1
+    ), inseridos as (
+        insert into public.vinculos_disciplina_sala (fk_sala_id, fk_disciplina_id)
+        select d.fk_sala_id, d.fk_disciplina_id
+          from desejado d
+         where not exists (select 1 from public.vinculos_disciplina_sala v
+                            where v.fk_sala_id = d.fk_sala_id and v.fk_disciplina_id = d.fk_disciplina_id)
+        returning 1
+    )
+    select (select count(*) from inseridos), (select count(*) from removidos)
+      into v_inseridos, v_removidos;
+
+    return json_build_object('inseridos', v_inseridos, 'removidos', v_removidos);
+end;
+$$;
+
+grant execute on function public.sincronizar_disciplinas_salas to anon, authenticated, service_role;
@@ -0,0 +1,88 @@
+-- Totais diários de f_frequencia por sala e status, mantidos por trigger.
+--
+-- /api/relatorio_frequencia e o resumo do relatório mensal consultam totais
+-- por período (escola, sala ou aluno). Em vez de cada worker do app guardar uma
+-- cópia da tabela para contar, o banco mantém uma linha por (sala, dia, status)
+-- atualizada a cada INSERT/UPDATE/DELETE em f_frequencia, e a função
+-- totais_frequencia soma o período pedido:
+--   escola/sala: soma de f_frequencia_totais_diarios (poucas linhas por dia)
+--   aluno:       contagem direta em f_frequencia pelo índice (fk_aluno_id, data)
+-- Linhas com fk_sala_id nulo não entram nos totais de escola/sala.
+
+create table if not exists public.f_frequencia_totais_diarios (
+    fk_sala_id public.f_frequencia.fk_sala_id%type not null,
+    data public.f_frequencia.data%type not null,
+    status text not null,
+    contagem integer not null default 0,
+    primary key (fk_sala_id, data, status)
+);
+
+create or replace function public.f_frequencia_totais_diarios_somar(
+    p_sala_id public.f_frequencia.fk_sala_id%type,
+    p_data public.f_frequencia.data%type,
+    p_status text,
+    p_delta integer
+) returns void
+language sql
+as $$
+    insert into public.f_frequencia_totais_diarios as t (fk_sala_id, data, status, contagem)
+    select p_sala_id, p_data, coalesce(p_status, ''), p_delta
+    where p_sala_id is not null and p_data is not null
+    on conflict (fk_sala_id, data, status) do update set contagem = t.contagem + excluded.contagem;
+$$;
+
+create or replace function public.f_frequencia_totais_diarios_trigger()
+returns trigger
+language plpgsql
+as $$
+begin
+    if tg_op in ('UPDATE', 'DELETE') then
+        perform public.f_frequencia_totais_diarios_somar(old.fk_sala_id, old.data, old.status, -1);
+    end if;
+    if tg_op in ('INSERT', 'UPDATE') then
+        perform public.f_frequencia_totais_diarios_somar(new.fk_sala_id, new.data, new.status, 1);
+    end if;
+    return null;
+end;
+$$;
+
+drop trigger if exists f_frequencia_totais_diarios on public.f_frequencia;
+create trigger f_frequencia_totais_diarios
+    after insert or delete or update of fk_sala_id, data, status on public.f_frequencia
+    for each row execute function public.f_frequencia_totais_diarios_trigger();
+
+-- Carga inicial (refaz do zero se a migração for reaplicada)
+truncate public.f_frequencia_totais_diarios;
+insert into public.f_frequencia_totais_diarios (fk_sala_id, data, status, contagem)
+select fk_sala_id, data, coalesce(status, ''), count(*)
+from public.f_frequencia
+where fk_sala_id is not null and data is not null
+group by fk_sala_id, data, coalesce(status, '');
+
+-- Contagem por status no período (datas inclusivas; nulas = sem limite).
+-- Com p_aluno_id conta os registros do aluno; senão os da sala (p_sala_id) ou da escola.
+create or replace function public.totais_frequencia(
+    p_sala_id public.f_frequencia.fk_sala_id%type default null,
+    p_aluno_id public.f_frequencia.fk_aluno_id%type default null,
+    p_data_inicial public.f_frequencia.data%type default null,
+    p_data_final public.f_frequencia.data%type default null
+) returns table (status text, total bigint)
+language sql
+stable
+as $$
+    select coalesce(f.status, ''), count(*)
+    from public.f_frequencia f
+    where p_aluno_id is not null
+      and f.fk_aluno_id = p_aluno_id
+      and (p_data_inicial is null or f.data >= p_data_inicial)
+      and (p_data_final is null or f.data <= p_data_final)
+    group by 1
+    union all
+    select t.status, sum(t.contagem)::bigint
+    from public.f_frequencia_totais_diarios t
+    where p_aluno_id is null
+      and (p_sala_id is null or t.fk_sala_id = p_sala_id)
+      and (p_data_inicial is null or t.data >= p_data_inicial)
+      and (p_data_final is null or t.data <= p_data_final)
+    group by 1;
+$$;
@@ -0,0 +1,58 @@
+"""Fixtures dos testes: o app.py rodando contra o SupabaseFake (benchmarks/supabase_fake.py).
+
+Nada acessa a rede. Os arquivos compartilhados entre workers (métricas,
+versões, eventos, cache de PDF) vão para um diretório temporário da sessão.
+"""
+import os
+import sys
+import tempfile
+
+RAIZ = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, RAIZ)
+sys.path.insert(0, os.path.join(RAIZ, 'benchmarks'))
+
+_TMP = tempfile.mkdtemp(prefix='gestao_testes_')
+for _nome, _padrao in {
+    'SUPABASE_URL': 'http://localhost', 'SUPABASE_KEY': 'testes',
+    'RECONCILIACAO_INTERVALO_SEGUNDOS': '0', 'SUPABASE_AQUECIMENTO_SEGUNDOS': '0',
+    'METRICAS_DIR': os.path.join(_TMP, 'metricas'), 'VERSOES_DIR': os.path.join(_TMP, 'versoes'),
+    'EVENTOS_DIR': os.path.join(_TMP, 'eventos'), 'PDF_CACHE_DIR': os.path.join(_TMP, 'pdf'),
+    'RECONCILIACAO_MARCA': os.path.join(_TMP, 'reconciliacao.marca'),
+}.items():
+    os.environ.setdefault(_nome, _padrao)
+
+import pytest  # noqa: E402
+
+import app as app_module  # noqa: E402
+from dados_escola import gerar_dados  # noqa: E402
+from supabase_fake import SupabaseFake  # noqa: E402
+
+
+@pytest.fixture
+def app():
+    return app_module
+
+
+@pytest.fixture
+def dados():
+    """Escola sintética pequena (as mesmas tabelas do bench_api.py)."""
+    return gerar_dados(0.1)
+
+
+@pytest.fixture
+def fake(dados):
+    """SupabaseFake com os dados da escola, instalado como `app.supabase`."""
+    anterior = app_module.supabase
+    app_module.supabase = SupabaseFake(dados)
+    app_module._rpc_ausentes.clear()
+    app_module.cache_dimensoes.invalidar(*app_module.CacheDimensoes.COLUNAS)
+    # Agregados em memória recomeçam vazios a cada teste
+    app_module.estatisticas_ocorrencias = app_module.EstatisticasOcorrencias(app_module.ESTATISTICAS_RECONSTRUCAO_SEGUNDOS)
+    app_module.totais_frequencia = app_module.TotaisFrequencia(app_module.FREQUENCIA_RECONSTRUCAO_SEGUNDOS)
+    yield app_module.supabase
+    app_module.supabase = anterior
+
+
+@pytest.fixture
+def cliente(fake):
+    return app_module.app.test_client()
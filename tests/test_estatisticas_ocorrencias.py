@@ -0,0 +1,62 @@
+"""Estatísticas de ocorrências: escritas durante a reconstrução e escritas de outros workers."""
+import pytest
+
+
+def _abertas(estatisticas):
+    return estatisticas.relatorio({}, {})['abertas']
+
+
+def _leituras(fake):
+    return sum(1 for tabela, op in fake.chamadas if tabela == 'ocorrencias' and op == 'select')
+
+
+@pytest.fixture
+def aberta(fake):
+    return next(o for o in fake.dados['ocorrencias'] if o['status'] == 'Aberta')
+
+
+def _finalizar(occ):
+    occ['status'] = 'Finalizada'
+    return dict(occ)
+
+
+def test_escrita_durante_a_reconstrucao_e_reaplicada(app, fake, aberta, monkeypatch):
+    estatisticas = app.estatisticas_ocorrencias
+    esperado = _abertas(estatisticas) - 1
+    buscar_todas = app.buscar_todas
+
+    def leitura_e_depois_escrita(consulta):
+        linhas = buscar_todas(consulta)  # leu a linha ainda aberta...
+        estatisticas.atualizar(_finalizar(aberta))  # ...e a escrita chega antes da troca
+        return linhas
+
+    monkeypatch.setattr(app, 'buscar_todas', leitura_e_depois_escrita)
+    assert estatisticas.relatorio({}, {}, forcar_reconstrucao=True)['abertas'] == esperado
+    monkeypatch.undo()
+    assert _abertas(estatisticas) == esperado
+
+
+def test_escrita_de_outro_worker_reconstroi_na_proxima_consulta(app, fake, aberta):
+    worker_a = app.EstatisticasOcorrencias(3600)
+    worker_b = app.EstatisticasOcorrencias(3600)
+    antes = _abertas(worker_a)
+    assert _abertas(worker_b) == antes
+
+    worker_a.atualizar(_finalizar(aberta))
+    leituras = _leituras(fake)
+
+    assert _abertas(worker_a) == antes - 1
+    assert _leituras(fake) == leituras  # a própria escrita não exige reler a tabela
+    assert _abertas(worker_b) == antes - 1
+    assert _leituras(fake) > leituras
+
+
+def test_invalidar_vale_para_os_outros_workers(app, fake, aberta):
+    worker_a = app.EstatisticasOcorrencias(3600)
+    worker_b = app.EstatisticasOcorrencias(3600)
+    antes = _abertas(worker_b)
+    _finalizar(aberta)  # alteração feita direto no banco (ex.: reconciliação em lote)
+
+    worker_a.invalidar()
+
+    assert _abertas(worker_b) == antes - 1
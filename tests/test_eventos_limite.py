@@ -0,0 +1,20 @@
+"""Fluxo de eventos (SSE): acima do limite por worker responde 503 em vez de prender mais uma thread."""
+import threading
+
+
+def test_acima_do_limite_responde_503_e_a_vaga_volta_ao_fechar(app, cliente, monkeypatch):
+    monkeypatch.setattr(app, '_conexoes_eventos', threading.BoundedSemaphore(1))
+
+    aberta = cliente.get('/api/ocorrencias_eventos', buffered=False)
+    assert aberta.status_code == 200 and aberta.mimetype == 'text/event-stream'
+
+    recusada = cliente.get('/api/ocorrencias_eventos')
+    assert recusada.status_code == 503
+    assert recusada.headers['Retry-After'] == str(app.EVENTOS_OCUPADO_RETRY_SEGUNDOS)
+    assert recusada.get_data(as_text=True).startswith('retry: ')
+
+    aberta.close()  # painel fechado: a vaga é liberada
+    reaberta = cliente.get('/api/ocorrencias_eventos', buffered=False)
+    assert reaberta.status_code == 200
+    reaberta.close()
+    assert app._conexoes_eventos.acquire(blocking=False)
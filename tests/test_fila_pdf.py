@@ -0,0 +1,44 @@
+"""Fila de PDFs: a varredura do cache não acontece a cada job enviado."""
+import os
+import time
+from concurrent.futures import Future
+
+
+class PoolImediato:
+    def submit(self, funcao, *args):
+        futuro = Future()
+        futuro.set_result(None)
+        return futuro
+
+
+def _fila(app, diretorio, monkeypatch):
+    fila = app.FilaPdfOcorrencias(str(diretorio), 1, 60)
+    monkeypatch.setattr(fila, '_pool', PoolImediato)
+    varreduras = []
+    original = fila._limpar_expirados
+    monkeypatch.setattr(fila, '_limpar_expirados', lambda: (varreduras.append(1), original()))
+    return fila, varreduras
+
+
+def test_uma_varredura_por_intervalo(app, tmp_path, monkeypatch):
+    fila, varreduras = _fila(app, tmp_path, monkeypatch)
+    for numero in range(20):  # o dossiê envia um job por aluno
+        fila.enviar(fila.chave([{'numero': numero}]), [])
+    assert len(varreduras) == 1
+
+    fila._limpar_em = time.monotonic() - 1  # intervalo vencido
+    fila.enviar(fila.chave([{'numero': 99}]), [])
+    assert len(varreduras) == 2
+
+
+def test_varredura_remove_so_os_expirados(app, tmp_path, monkeypatch):
+    fila, _ = _fila(app, tmp_path, monkeypatch)
+    antigo, recente = tmp_path / ('a' * 64 + '.pdf'), tmp_path / ('b' * 64 + '.pdf')
+    antigo.write_bytes(b'%PDF')
+    recente.write_bytes(b'%PDF')
+    vencido = time.time() - app.PDF_CACHE_TTL_SEGUNDOS - 60
+    os.utime(antigo, (vencido, vencido))
+
+    fila.enviar(fila.chave([{'numero': 1}]), [])
+
+    assert not antigo.exists() and recente.exists()
@@ -0,0 +1,49 @@
+"""Formato compacto da frequência mensal: a expansão devolve exatamente o formato antigo."""
+from calendar import monthrange
+from datetime import date
+
+import pytest
+
+
+def _formato_antigo(app, alunos, registros, ano, mes):
+    """Referência direta: um dict por aluno/dia, como a rota montava antes do formato compacto."""
+    por_dia = {(r['fk_aluno_id'], r['data']): r for r in registros}
+    datas = [date(ano, mes, d).isoformat() for d in range(1, monthrange(ano, mes)[1] + 1)]
+    relatorio = []
+    for aluno in alunos:
+        dias = []
+        for data in datas:
+            reg = por_dia.get((aluno['id'], data))
+            status = reg['status'] if reg else '?'
+            detalhes = ({c: reg.get(c) for c in app.CAMPOS_DETALHES_FREQUENCIA}
+                        if reg and status in app.STATUS_COM_DETALHES else None)
+            dias.append({'data': data, 'status': status, 'detalhes': detalhes})
+        relatorio.append({'id': aluno['id'], 'nome': aluno['nome'], 'dias': dias})
+    return {'dias_mes': len(datas), 'relatorio': relatorio, 'dias_uteis': datas}
+
+
+@pytest.mark.parametrize('ano, mes', [(2025, 2), (2024, 2), (2025, 3)])
+def test_ida_e_volta_sintetica(app, ano, mes):
+    alunos = [{'id': 1, 'nome': 'Ana'}, {'id': 2, 'nome': 'Bruno'}, {'id': 3, 'nome': 'Sem registros'}]
+    registros = [
+        {'fk_aluno_id': 1, 'data': f'{ano}-{mes:02d}-01', 'status': 'P'},
+        {'fk_aluno_id': 1, 'data': f'{ano}-{mes:02d}-02', 'status': 'PA', 'hora_atraso': '07:40', 'motivo_atraso': 'ônibus'},
+        {'fk_aluno_id': 1, 'data': f'{ano}-{mes:02d}-28', 'status': 'PAS', 'hora_atraso': '07:40', 'hora_saida': '11:00',
+         'responsavel_saida': 'Mãe', 'telefone_saida': None},
+        {'fk_aluno_id': 2, 'data': f'{ano}-{mes:02d}-03', 'status': 'F'},
+        {'fk_aluno_id': 2, 'data': f'{ano}-{mes:02d}-04', 'status': 'PS'},
+        {'fk_aluno_id': 2, 'data': f'{ano}-{mes:02d}-05', 'status': 'Justificada'},  # fora da legenda
+        {'fk_aluno_id': 99, 'data': f'{ano}-{mes:02d}-05', 'status': 'P'},  # aluno de outra sala
+    ]
+    compacto = app.frequencia_compacta(alunos, registros, ano, mes)
+    assert [len(a['codigos']) for a in compacto['alunos']] == [monthrange(ano, mes)[1]] * 3
+    assert app.expandir_frequencia_compacta(compacto) == _formato_antigo(app, alunos, registros, ano, mes)
+
+
+def test_ida_e_volta_com_dados_da_escola(app, dados):
+    alunos = sorted((a for a in dados['d_alunos'] if a['sala_id'] == dados['d_salas'][0]['id']), key=lambda a: a['nome'])
+    ids = {a['id'] for a in alunos}
+    registros = [r for r in dados['f_frequencia'] if r['fk_aluno_id'] in ids and r['data'].startswith('2025-03')]
+    assert registros
+    compacto = app.frequencia_compacta(alunos, registros, 2025, 3)
+    assert app.expandir_frequencia_compacta(compacto) == _formato_antigo(app, alunos, registros, 2025, 3)
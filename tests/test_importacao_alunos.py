@@ -0,0 +1,71 @@
+"""Importação de alunos por planilha: tutor em branco, CSV cp1252 e interrupção parcial (207)."""
+import io
+
+import pytest
+
+
+def _importar(cliente, conteudo, nome='alunos.csv'):
+    return cliente.post('/api/importar_alunos', data={'arquivo': (io.BytesIO(conteudo), nome)},
+                        content_type='multipart/form-data')
+
+
+def _alunos_por_ra(fake):
+    return {a['ra']: a for a in fake.dados['d_alunos']}
+
+
+def test_tutor_em_branco_mantem_o_cadastrado(cliente, fake):
+    com_tutor, sem_tutor = fake.dados['d_alunos'][0], next(a for a in fake.dados['d_alunos'][1:] if a['tutor_id'])
+    outro_tutor = next(f['id'] for f in fake.dados['d_funcionarios'] if f.get('is_tutor') and f['id'] != com_tutor['tutor_id'])
+    tutor_anterior = sem_tutor['tutor_id']
+    csv = (f"RA;Nome;Sala;Tutor\n"
+           f"{com_tutor['ra']};{com_tutor['nome']};{com_tutor['sala_id']};{outro_tutor}\n"
+           f"{sem_tutor['ra']};{sem_tutor['nome']};{sem_tutor['sala_id']};\n").encode()
+
+    resposta = _importar(cliente, csv)
+
+    assert resposta.status_code == 201, resposta.get_json()
+    alunos = _alunos_por_ra(fake)
+    assert alunos[com_tutor['ra']]['tutor_id'] == outro_tutor
+    assert alunos[sem_tutor['ra']]['tutor_id'] == tutor_anterior
+
+
+def test_csv_cp1252_mantem_acentos(cliente, fake):
+    sala = fake.dados['d_salas'][0]
+    csv = f"RA;Nome;Sala\n999000000001;João Araújo;{sala['sala']}\n".encode('cp1252')
+
+    resposta = _importar(cliente, csv)
+
+    assert resposta.status_code == 201, resposta.get_json()
+    aluno = _alunos_por_ra(fake)['999000000001']
+    assert (aluno['nome'], aluno['sala_id']) == ('João Araújo', sala['id'])
+
+
+def test_interrupcao_depois_de_um_bloco_responde_207(app, cliente, fake, monkeypatch):
+    monkeypatch.setattr(app, 'IMPORTACAO_ALUNOS_BLOCO', 2)
+    upsert_original = app.upsert_em_lotes
+    enviados = []
+
+    def upsert_que_cai_no_segundo_bloco(*args, **kwargs):
+        enviados.append(args[1])
+        if len(enviados) > 1:
+            raise ConnectionError('conexão perdida')
+        return upsert_original(*args, **kwargs)
+
+    monkeypatch.setattr(app, 'upsert_em_lotes', upsert_que_cai_no_segundo_bloco)
+    sala = fake.dados['d_salas'][0]['id']
+    csv = ("RA;Nome;Sala\n" + "".join(f"99900000000{i};Novo {i};{sala}\n" for i in range(5))).encode()
+
+    resposta = _importar(cliente, csv)
+
+    corpo = resposta.get_json()
+    assert resposta.status_code == 207 and corpo['interrompida']
+    assert corpo['salvos'] == 2
+    # o 2º bloco consta como não gravado; a 5ª linha nem chegou a ser lida
+    assert [r['status'] for r in corpo['relatorio']] == ['salvo', 'salvo', 'erro', 'erro']
+    assert {'999000000000', '999000000001'} <= set(_alunos_por_ra(fake))
+    assert '999000000002' not in _alunos_por_ra(fake)
+
+
+@pytest.mark.parametrize('cabecalho', ['RA;Nome', 'Nome;Sala'])
+def test_cabecalho_sem_coluna_obrigatoria_responde_400(cliente, fake, cabecalho):
+    assert _importar(cliente, f"{cabecalho}\n1;x\n".encode()).status_code == 400
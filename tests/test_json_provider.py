@@ -0,0 +1,31 @@
+"""O provider sobre o orjson escreve o mesmo JSON que o provider padrão do Flask."""
+import decimal
+import json
+import uuid
+from datetime import date, datetime, timedelta, timezone
+
+import pytest
+from flask.json.provider import DefaultJSONProvider
+
+VALORES = [
+    datetime(2025, 3, 10, 7, 15),
+    datetime(2025, 3, 10, 7, 15, tzinfo=timezone(timedelta(hours=-3))),
+    date(2025, 3, 10),
+    decimal.Decimal('7.50'),
+    uuid.UUID('12345678-1234-5678-1234-567812345678'),
+    {'b': [1, 2.5, None], 'a': 'ação'},
+]
+
+
+@pytest.mark.parametrize('valor', VALORES, ids=lambda v: type(v).__name__)
+def test_mesmo_json_que_o_flask(app, valor):
+    if not isinstance(app.app.json, app.ProvedorJsonRapido):
+        pytest.skip('orjson não instalado')
+    padrao = DefaultJSONProvider(app.app)
+    assert json.loads(app.app.json.dumps({'v': valor})) == json.loads(padrao.dumps({'v': valor}))
+
+
+def test_resposta_com_data_usa_data_http(app):
+    with app.app.test_request_context():
+        corpo = app.app.json.response({'gerado_em': datetime(2025, 3, 10, 7, 15)}).get_data(as_text=True)
+    assert json.loads(corpo) == {'gerado_em': 'Mon, 10 Mar 2025 07:15:00 GMT'}
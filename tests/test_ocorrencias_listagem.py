@@ -0,0 +1,33 @@
+"""Listagens de ocorrências abertas/finalizadas (status gravado x status derivado)."""
+from app import DEFAULT_AUTOTEXT, reconciliar_ocorrencia
+
+
+def _divergente(fake):
+    """Uma ocorrência gravada como Finalizada que pela regra atual está Aberta."""
+    occ = fake.dados['ocorrencias'][0]
+    occ.update(status='Finalizada', solicitado_gestao='SIM', atendimento_gestao=DEFAULT_AUTOTEXT)
+    assert reconciliar_ocorrencia(occ)[0] == 'Aberta'
+    return occ['numero']
+
+
+def _numeros(cliente, rota):
+    resposta = cliente.get(f'{rota}?limit=100000')
+    assert resposta.status_code == 200
+    return {o['numero']: o['status'] for o in resposta.get_json()}
+
+
+def test_status_divergente_continua_na_lista_do_status_gravado(cliente, fake):
+    numero = _divergente(fake)
+    finalizadas = _numeros(cliente, '/api/ocorrencias_finalizadas')
+    abertas = _numeros(cliente, '/api/ocorrencias_abertas')
+    assert finalizadas.get(numero) == 'Finalizada'
+    assert numero not in abertas
+
+
+def test_listas_cobrem_todas_as_ocorrencias(cliente, fake):
+    _divergente(fake)
+    abertas = _numeros(cliente, '/api/ocorrencias_abertas')
+    finalizadas = _numeros(cliente, '/api/ocorrencias_finalizadas')
+    assert not abertas.keys() & finalizadas.keys()
+    assert len(abertas) + len(finalizadas) == len(fake.dados['ocorrencias'])
+    assert set(abertas.values()) == {'Aberta'} and set(finalizadas.values()) == {'Finalizada'}
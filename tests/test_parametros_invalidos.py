@@ -0,0 +1,67 @@
+"""Parâmetros malformados nas listagens: 400 com JSON, nunca filtro ignorado nem 500."""
+import asyncio
+import base64
+
+import pytest
+
+ROTAS = ['/api/ocorrencias_abertas', '/api/ocorrencias_finalizadas', '/api/ocorrencias_todas', '/api/ocorrencias']
+
+PARAMETROS_INVALIDOS = [
+    'sala=abc',
+    'aluno=1x',
+    'limit=dez',
+    'data_inicial=2025-13-01',
+    'data_final=ontem',
+    'cursor=nao-e-base64',
+    'cursor=' + base64.urlsafe_b64encode(b'["2025-03-01 invalida", 5]').decode().rstrip('='),
+]
+
+
+@pytest.mark.parametrize('rota', ROTAS)
+@pytest.mark.parametrize('parametro', PARAMETROS_INVALIDOS)
+def test_listagens_respondem_400(cliente, fake, rota, parametro):
+    resposta = cliente.get(f'{rota}?{parametro}')
+    assert resposta.status_code == 400
+    assert 'error' in resposta.get_json()
+    assert not fake.chamadas  # nada foi consultado
+
+
+@pytest.mark.parametrize('parametro', [p for p in PARAMETROS_INVALIDOS if not p.startswith('limit=')])  # exportação ignora limit
+def test_exportacao_em_streaming_responde_400(cliente, parametro):
+    resposta = cliente.get(f'/api/ocorrencias?formato=ndjson&{parametro}')
+    assert resposta.status_code == 400
+
+
+@pytest.mark.parametrize('parametro', ['sala_id=abc&data=2025-03-10', 'sala_id=1&data=10/03/2025', 'sala_id=1'])
+def test_status_da_frequencia_responde_400(cliente, parametro):
+    assert cliente.get(f'/api/frequencia/status?{parametro}').status_code == 400
+
+
+def test_filtros_validos_continuam_filtrando(cliente, fake):
+    sala = fake.dados['ocorrencias'][0]['sala_id']
+    resposta = cliente.get(f'/api/ocorrencias_todas?sala={sala}&limit=5')
+    assert resposta.status_code == 200
+    corpo = resposta.get_json()
+    assert 0 < len(corpo) <= 5 and {o['sala_id'] for o in corpo} == {sala}
+
+
+def _get_asgi(aplicacao, caminho, query):
+    enviados = []
+
+    async def receber():
+        return {'type': 'http.request'}
+
+    async def enviar(mensagem):
+        enviados.append(mensagem)
+
+    escopo = {'type': 'http', 'method': 'GET', 'path': caminho, 'query_string': query.encode(), 'headers': []}
+    asyncio.run(aplicacao(escopo, receber, enviar))
+    return enviados[0]['status']
+
+
+@pytest.mark.parametrize('parametro', ['sala=abc', 'limit=dez', 'data_inicial=2025-13-01'])
+def test_modo_asgi_responde_400(app, fake, parametro):
+    asgi = pytest.importorskip('asgi')
+    aplicacao = asgi.AplicacaoAsgi(app.app)
+    aplicacao.cliente = fake  # o erro acontece ao montar a consulta, antes de qualquer await
+    assert _get_asgi(aplicacao, '/api/ocorrencias_abertas', parametro) == 400
@@ -0,0 +1,33 @@
+"""/api/gerar_pdf_ocorrencias: sem vaga para esperar (ou sem tempo), 202 com o job em vez de prender a thread."""
+import threading
+
+import pytest
+
+
+@pytest.fixture
+def fila_pendente(app, fake, monkeypatch):
+    esperas = []
+    monkeypatch.setattr(app.fila_pdf, 'enviar', lambda chave, ocorrencias: 'pendente')
+    monkeypatch.setattr(app.fila_pdf, 'aguardar', lambda chave, timeout: esperas.append(chave) or 'pendente')
+    monkeypatch.setattr(app, '_esperas_pdf', threading.BoundedSemaphore(1))
+    return esperas
+
+
+def _gerar(cliente, fake):
+    return cliente.post('/api/gerar_pdf_ocorrencias', json={'numeros': [fake.dados['ocorrencias'][0]['numero']]})
+
+
+def test_sem_vaga_responde_202_sem_esperar(app, cliente, fake, fila_pendente):
+    app._esperas_pdf.acquire()  # outra requisição já ocupa a vaga
+    resposta = _gerar(cliente, fake)
+    assert resposta.status_code == 202
+    corpo = resposta.get_json()
+    assert corpo['status'] == 'pendente' and corpo['url_download'].endswith(f"/{corpo['job_id']}/download")
+    assert fila_pendente == []
+
+
+def test_tempo_esgotado_responde_202_e_libera_a_vaga(app, cliente, fake, fila_pendente):
+    resposta = _gerar(cliente, fake)
+    assert resposta.status_code == 202
+    assert fila_pendente == [resposta.get_json()['job_id']]
+    assert app._esperas_pdf.acquire(blocking=False)  # a vaga voltou
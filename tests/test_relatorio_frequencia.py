@@ -0,0 +1,23 @@
+"""Filtros de /api/relatorio_frequencia: inválido é 400, não total da escola."""
+import pytest
+
+
+@pytest.mark.parametrize('parametro', [
+    'salaId=abc',
+    'alunoId=1x',
+    'dataInicial=2025-02-30',
+    'dataFinal=31/03/2025',
+    'dataInicial=2025-03-01T10:00',
+])
+def test_filtro_invalido_responde_400(cliente, fake, parametro):
+    resposta = cliente.get(f'/api/relatorio_frequencia?{parametro}')
+    assert resposta.status_code == 400
+    assert resposta.get_json()['status'] == 400
+
+
+def test_filtros_validos_restringem_o_escopo(cliente, fake):
+    sala = fake.dados['f_frequencia'][0]['fk_sala_id']
+    esperado = sum(1 for f in fake.dados['f_frequencia']
+                   if f['fk_sala_id'] == sala and '2025-03-01' <= f['data'] <= '2025-03-31')
+    corpo = cliente.get(f'/api/relatorio_frequencia?salaId={sala}&dataInicial=2025-03-01&dataFinal=2025-03-31').get_json()
+    assert (corpo['escopo'], corpo['id'], corpo['total_registros']) == ('sala', sala, esperado)
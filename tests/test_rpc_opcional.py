@@ -0,0 +1,46 @@
+"""Funções do banco opcionais: sem a migração o app usa o caminho antigo e volta a tentar depois."""
+import pytest
+from supabase_fake import FUNCOES_SQL
+
+EVENTO = {'aluno_id': 1, 'sala_id': 10, 'data': '2025-03-10', 'hora': '07:40', 'motivo': 'ônibus',
+          'responsavel': 'Mãe', 'telefone': '11 90000-0000'}
+
+
+def _rpcs(fake):
+    return sum(1 for _, op in fake.chamadas if op == 'rpc')
+
+
+def _salvar_atraso(cliente):
+    resposta = cliente.post('/api/salvar_atraso', json=EVENTO)
+    assert resposta.status_code == 201, resposta.get_json()
+
+
+def test_funcao_ausente_usa_caminho_antigo_e_volta_a_tentar(app, fake, cliente):
+    fake.funcoes.clear()
+    _salvar_atraso(cliente)
+    assert app.rpc_ausente('registrar_evento_frequencia')
+
+    fake.chamadas.clear()
+    _salvar_atraso(cliente)
+    assert _rpcs(fake) == 0  # dentro do intervalo, nem tenta a função
+
+    fake.funcoes.update(FUNCOES_SQL)  # migração aplicada
+    app._rpc_ausentes['registrar_evento_frequencia'] = 0  # intervalo vencido
+    _salvar_atraso(cliente)
+    assert _rpcs(fake) == 1
+    assert not app.rpc_ausente('registrar_evento_frequencia')
+
+
+def test_outros_erros_da_funcao_nao_viram_caminho_antigo(app, fake):
+    fake.funcoes['totais_frequencia'] = lambda cliente, **_: (_ for _ in ()).throw(ConnectionError('sem rede'))
+    with pytest.raises(ConnectionError):
+        app.chamar_rpc_opcional('totais_frequencia', {}, 'migracao.sql', 'contagem em memória')
+    assert not app.rpc_ausente('totais_frequencia')
+
+
+@pytest.mark.parametrize('eventos', [('atraso',), ('saida',), ('atraso', 'saida'), ('saida', 'atraso')])
+@pytest.mark.parametrize('status_inicial', [None, 'P', 'F', 'PA'])
+def test_rpc_e_caminho_antigo_gravam_a_mesma_linha(status_inicial, eventos):
+    conferir = pytest.importorskip('conferir_evento_frequencia')
+    com_rpc, antigo = (conferir.executar(status_inicial, eventos, rpc) for rpc in (True, False))
+    assert com_rpc[:2] == antigo[:2]
@@ -0,0 +1,90 @@
+"""Upsert em lotes: linhas recusadas são isoladas por bissecção; erros do lote inteiro sobem."""
+import pytest
+from supabase_fake import FakeAPIError
+
+
+@pytest.fixture
+def recusar(fake, monkeypatch):
+    """Faz o upsert falhar (no execute, como no PostgREST) quando o lote contém uma linha rejeitada."""
+    regra = {}
+    tabela_original = fake.table
+
+    def tabela(nome):
+        consulta = tabela_original(nome)
+        upsert = consulta.upsert
+
+        def upsert_com_restricao(payload, **kwargs):
+            upsert(payload, **kwargs)
+            if any(regra['rejeita'](r) for r in payload):
+                def falhar():
+                    fake.chamadas.append((nome, 'upsert'))
+                    raise FakeAPIError(*regra['erro'])
+                consulta.execute = falhar
+            return consulta
+
+        consulta.upsert = upsert_com_restricao
+        return consulta
+
+    monkeypatch.setattr(fake, 'table', tabela)
+
+    def configurar(rejeita, erro=('null value in column "nome" violates not-null constraint', '23502')):
+        regra.update(rejeita=rejeita, erro=erro)
+    return configurar
+
+
+def _upserts(fake):
+    return sum(1 for _, op in fake.chamadas if op == 'upsert')
+
+
+def _disciplinas(n):
+    return [{'id': 1000 + i, 'nome': f'Disciplina {i}' if i % 7 != 3 else None} for i in range(n)]
+
+
+def test_bisseccao_isola_so_as_linhas_recusadas(app, fake, recusar):
+    recusar(lambda r: r['nome'] is None)
+    registros = _disciplinas(20)  # ids 1003, 1010 e 1017 sem nome
+    antes = len(fake.dados['d_disciplinas'])
+
+    salvos, falhas = app._upsert_isolando_falhas('d_disciplinas', registros, 'id')
+
+    assert sorted(r['id'] for r, _ in falhas) == [1003, 1010, 1017]
+    assert all('not-null' in erro for _, erro in falhas)
+    assert sorted(r['id'] for r in salvos) == sorted(r['id'] for r in registros if r['nome'])
+    assert len(fake.dados['d_disciplinas']) == antes + 17
+
+
+def test_bisseccao_usa_poucas_chamadas(app, fake, recusar):
+    recusar(lambda r: r['nome'] is None)
+    registros = [{'id': 1000 + i, 'nome': None if i in (17, 200) else f'D{i}'} for i in range(256)]
+
+    salvos, falhas = app._upsert_isolando_falhas('d_disciplinas', registros, 'id')
+
+    assert (len(salvos), len(falhas)) == (254, 2)
+    assert _upserts(fake) <= 2 * 2 * 8 + 1  # ~2 chamadas por nível (log2 256 = 8) para cada linha ruim
+
+
+def test_lote_sem_erro_usa_uma_chamada(app, fake, recusar):
+    recusar(lambda r: False)
+    salvos, falhas = app._upsert_isolando_falhas('d_disciplinas', _disciplinas(3), 'id')
+    assert (len(salvos), falhas, _upserts(fake)) == (3, [], 1)
+
+
+@pytest.mark.parametrize('erro', [('canceling statement due to statement timeout', '57014'),
+                                  ('there is no unique or exclusion constraint matching the ON CONFLICT', '42P10'),
+                                  ('Service Unavailable', 503)])
+def test_erro_do_lote_inteiro_sobe_sem_dividir(app, fake, recusar, erro):
+    recusar(lambda r: True, erro)
+    with pytest.raises(FakeAPIError):
+        app._upsert_isolando_falhas('d_disciplinas', _disciplinas(8), 'id')
+    assert _upserts(fake) == 1
+
+
+def test_upsert_em_lotes_paralelos_junta_os_resultados(app, fake, recusar):
+    recusar(lambda r: r['nome'] is None)
+    registros = _disciplinas(20) + [{'id': 1000, 'nome': 'Repetida: vale a última'}]
+
+    salvos, falhas = app.upsert_em_lotes('d_disciplinas', registros, 'id', chave=lambda r: r['id'], tamanho=4, paralelismo=3)
+
+    assert sorted(r['id'] for r, _ in falhas) == [1003, 1010, 1017]
+    assert len(salvos) == 17
+    assert next(d for d in fake.dados['d_disciplinas'] if d['id'] == 1000)['nome'] == 'Repetida: vale a última'
@@ -0,0 +1,34 @@
+"""Vínculos de disciplinas por sala: corpo inválido é 400; a mesma disciplina como texto e número conta uma vez."""
+import pytest
+
+
+def _escritas(fake):
+    return [c for c in fake.chamadas if c[1] != 'select']
+
+
+@pytest.mark.parametrize('corpo', [
+    [1, 2],
+    {'salas': 'todas'},
+    {'salas': [1]},
+    {'sala_id': 'abc', 'disciplinas': [1]},
+    {'sala_id': 1, 'disciplinas': '1,2'},
+    {'disciplinas': [1]},
+])
+def test_disciplinas_corpo_invalido_responde_400(cliente, fake, corpo):
+    resposta = cliente.post('/api/vincular_disciplina_sala', json=corpo)
+    assert resposta.status_code == 400, resposta.get_json()
+    assert not _escritas(fake)
+
+
+def test_disciplinas_repetidas_como_texto_e_numero_contam_uma_vez(cliente, fake):
+    fake.dados['vinculos_disciplina_sala'] = [{'id': 1, 'fk_sala_id': 1, 'fk_disciplina_id': 5}]
+
+    corpo = cliente.post('/api/vincular_disciplina_sala', json={'sala_id': 1, 'disciplinas': ['5', 5, 6, '6']}).get_json()
+    assert (corpo['inseridos'], corpo['removidos']) == (1, 0)
+    assert sorted(int(v['fk_disciplina_id']) for v in fake.dados['vinculos_disciplina_sala']) == [5, 6]
+
+    corpo = cliente.post('/api/vincular_disciplina_sala', json={'sala_id': '1', 'disciplinas': [6, '5']}).get_json()
+    assert (corpo['inseridos'], corpo['removidos']) == (0, 0)
+
+    corpo = cliente.post('/api/vincular_disciplina_sala', json={'salas': [{'sala_id': 1, 'disciplinas': ['6']}]}).get_json()
+    assert (corpo['inseridos'], corpo['removidos']) == (0, 1)
@@ -0,0 +1,38 @@
+"""Vínculos de alunos por tutor: corpo inválido é 400; nas salas enviadas o tutor fica só com os alunos da lista."""
+import pytest
+
+
+def _escritas(fake):
+    return [c for c in fake.chamadas if c[1] != 'select']
+
+
+@pytest.mark.parametrize('corpo', [
+    [1],
+    {'tutor_id': 3, 'sala_id': 1, 'vinculos': {'aluno_id': 1}},
+    {'tutor_id': 3, 'sala_id': 1, 'vinculos': [1, 2]},
+    {'tutor_id': 3, 'sala_id': 1, 'vinculos': [], 'salas': 1},
+    {'tutor_id': 'abc', 'sala_id': 1, 'vinculos': []},
+    {'tutor_id': 3, 'sala_id': 1, 'vinculos': [{'aluno_id': 'x'}]},
+    {'sala_id': 1, 'vinculos': []},
+    {'tutor_id': 3, 'vinculos': []},
+])
+def test_tutor_corpo_invalido_responde_400(cliente, fake, corpo):
+    resposta = cliente.post('/api/vincular_tutor_aluno', json=corpo)
+    assert resposta.status_code == 400, resposta.get_json()
+    assert not _escritas(fake)
+
+
+def test_tutor_fica_so_com_os_alunos_enviados_na_sala(cliente, fake):
+    alunos_sala = [a for a in fake.dados['d_alunos'] if a['sala_id'] == 1]
+    tutor = alunos_sala[0]['tutor_id']
+    escolhidos = [alunos_sala[1]['id'], alunos_sala[2]['id']]
+    outra_sala = next(a for a in fake.dados['d_alunos'] if a['sala_id'] != 1)
+    outra_sala['tutor_id'] = tutor
+
+    resposta = cliente.post('/api/vincular_tutor_aluno', json={
+        'tutor_id': str(tutor), 'sala_id': 1, 'vinculos': [{'aluno_id': str(i), 'sala_id': 1} for i in escolhidos]})
+
+    assert resposta.status_code == 200, resposta.get_json()
+    por_id = {a['id']: a for a in fake.dados['d_alunos']}
+    assert sorted(a['id'] for a in por_id.values() if a['sala_id'] == 1 and a['tutor_id'] == tutor) == sorted(escolhidos)
+    assert por_id[outra_sala['id']]['tutor_id'] == tutor  # outras salas não mudam